@@ -0,0 +1,137 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from typing import List, Optional
+
+from app.auth.deps import get_current_admin
+from app.profiling import request_profiler, stack_sampler
+from app.schemas.admin import ProfilingSettings, ProfilingSettingsUpdate, ProfileSummary
+
+# Every route requires an admin
+router = APIRouter(dependencies=[Depends(get_current_admin)])
+
+def current_settings() -> ProfilingSettings:
+    return ProfilingSettings(
+        on_demand=request_profiler.enabled,
+        sampler=stack_sampler.running,
+        sampler_interval_ms=stack_sampler.interval * 1000,
+    )
+
+@router.get("/profiling", response_model=ProfilingSettings)
+async def get_profiling_settings():
+    """
+    Show whether on-demand profiling and the stack sampler are on.
+    
+    Returns:
+        ProfilingSettings: The current settings
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    return current_settings()
+
+@router.put("/profiling", response_model=ProfilingSettings)
+async def update_profiling_settings(settings: ProfilingSettingsUpdate):
+    """
+    Switch on-demand profiling and the stack sampler on or off at runtime.
+    
+    Args:
+        settings (ProfilingSettingsUpdate): The settings to change; omitted ones stay as they are
+        
+    Returns:
+        ProfilingSettings: The settings now in effect
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    if settings.on_demand is not None:
+        request_profiler.enabled = settings.on_demand
+    if settings.sampler_interval_ms is not None:
+        stack_sampler.interval = settings.sampler_interval_ms / 1000
+    if settings.sampler is True:
+        stack_sampler.start()
+    elif settings.sampler is False:
+        stack_sampler.stop()
+    return current_settings()
+
+@router.get("/profiles", response_model=List[ProfileSummary])
+async def list_profiles():
+    """
+    List the stored request profiles, newest first.
+    
+    Returns:
+        List[ProfileSummary]: Route, duration and time of each profile
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    return request_profiler.list()
+
+@router.get("/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str):
+    """
+    Get the cProfile report of a profiled request.
+    
+    Args:
+        profile_id (str): The id from the X-Profile-Id response header
+        
+    Returns:
+        str: The functions with the highest cumulative time
+        
+    Raises:
+        HTTPException: 404 if the profile is not (or no longer) stored
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    profile = request_profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return f"{profile['route']} ({profile['duration_ms']} ms)\n\n{profile['report']}"
+
+@router.get("/sampler")
+async def get_sampled_stacks(
+    route: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=1000)
+):
+    """
+    Get the hottest stacks found by the stack sampler.
+    
+    Args:
+        route (str): Only stacks of this route, e.g. "GET /bookmarks/"
+        limit (int): Number of stacks to return
+        
+    Returns:
+        dict: Sample counts per route and the most frequently sampled stacks
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    return stack_sampler.top(route=route, limit=limit)
+
+@router.get("/sampler/folded", response_class=PlainTextResponse)
+async def get_folded_stacks():
+    """
+    Get all sampled stacks in folded format, e.g. for flamegraph.pl.
+    
+    Returns:
+        str: One "frame;frame;frame count" line per stack
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    return stack_sampler.folded()
+
+@router.delete("/sampler", status_code=204)
+async def reset_sampler():
+    """
+    Discard the stacks sampled so far.
+    
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 403 if user is not an admin
+    """
+    stack_sampler.reset()
@@ -1,18 +1,92 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from app.dependencies import get_db
 from app.models.bookmark import Bookmark as BookmarkModel
-from app.schemas.bookmark import BookmarkCreate, Bookmark, BookmarkUpdate
+from app.schemas.bookmark import BookmarkCreate, Bookmark, BookmarkUpdate, BookmarkLookup, DuplicateMode, ExportFormat, TagCount, TagMode, BookmarkStats, SparseBookmark
 from app.auth.deps import get_current_user
 from app.models.user import User
+from app.config import DUPLICATE_BOOKMARK_MODE
+from app.export import ENCODERS, export_bookmarks
+from app.cache import bookmark_cache
+from app.singleflight import reads
+from app.stats import record_bookmark_created, record_bookmark_deleted, record_bookmark_url_changed, get_stats
+from app.event_log import log_event
+from app.bookmark_events import event_stream, parse_event_id, publish_bookmark, publish_change
+from app import repository
+from app.tags import set_bookmark_tags, release_bookmark_tags, filter_by_tags, normalize_tags, tag_counts, tag_names_by_bookmark
 
 router = APIRouter()
 
+# Most bookmarks one GET /bookmarks/?ids= request may ask for
+MAX_MULTI_GET_IDS = 500
+
+# Fields that can be selected with GET /bookmarks/?fields=
+BOOKMARK_FIELDS = tuple(Bookmark.model_fields)
+
+def parse_ids(ids: Optional[str]) -> Optional[List[int]]:
+    """
+    Parse a comma separated id list, dropping repeated ids.
+    """
+    if ids is None:
+        return None
+    try:
+        parsed = list(dict.fromkeys(int(part) for part in ids.split(",") if part.strip()))
+    except ValueError:
+        raise HTTPException(status_code=422, detail="ids must be a comma separated list of integers")
+    if len(parsed) > MAX_MULTI_GET_IDS:
+        raise HTTPException(status_code=422, detail=f"At most {MAX_MULTI_GET_IDS} ids can be requested at once")
+    return parsed
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Parse a comma separated list of Bookmark fields.
+    """
+    if fields is None:
+        return None
+    parsed = list(dict.fromkeys(part.strip() for part in fields.split(",") if part.strip()))
+    unknown = [field for field in parsed if field not in BOOKMARK_FIELDS]
+    if unknown or not parsed:
+        raise HTTPException(
+            status_code=422,
+            detail=f"fields must be a comma separated list of: {', '.join(BOOKMARK_FIELDS)}"
+        )
+    return parsed
+
+def load_bookmark_fields(
+    db: Session,
+    user_id: int,
+    fields: List[str],
+    ids: Optional[List[int]] = None,
+    tags: Optional[List[str]] = None,
+    match_all: bool = True
+) -> List[dict]:
+    """
+    Load the user's bookmarks with only the given fields (plus id).
+    Selects just those columns; tags are fetched only when requested.
+    """
+    columns = [getattr(BookmarkModel, field) for field in fields if field not in ("id", "tags")]
+    query = select(BookmarkModel.id, *columns).where(BookmarkModel.user_id == user_id)
+    if ids is not None:
+        query = query.where(BookmarkModel.id.in_(ids))
+    if tags:
+        query = filter_by_tags(query, user_id, tags, match_all=match_all)
+    rows = [dict(row._mapping) for row in db.execute(query.order_by(BookmarkModel.id))]
+    if "tags" in fields:
+        names = tag_names_by_bookmark(db, [row["id"] for row in rows])
+        for row in rows:
+            row["tags"] = names.get(row["id"], [])
+    return jsonable_encoder(rows)
+
 @router.post("/", response_model=Bookmark, status_code=201)
 async def create_bookmark(
     bookmark: BookmarkCreate,
+    response: Response,
+    on_duplicate: Optional[DuplicateMode] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -21,14 +95,36 @@ async def create_bookmark(
     
     Args:
         bookmark (BookmarkCreate): Bookmark data including title, description, and URL
+        on_duplicate (DuplicateMode): What to do if the URL is already saved
+            (defaults to DUPLICATE_BOOKMARK_MODE)
         
     Returns:
-        Bookmark: The created bookmark object
+        Bookmark: The created bookmark object, or the merged existing one (200)
         
     Raises:
+        HTTPException: 409 if the URL is already saved and duplicates are rejected
         HTTPException: 401 if user is not authenticated
     """
     bookmark_data = bookmark.model_dump()
+    mode = on_duplicate or DuplicateMode(DUPLICATE_BOOKMARK_MODE)
+    if mode != DuplicateMode.allow:
+        existing = repository.find_duplicate(db, current_user.id, str(bookmark_data["url"]))
+        if existing and mode == DuplicateMode.reject:
+            raise HTTPException(status_code=409, detail="Bookmark already exists")
+        if existing:
+            existing.title = bookmark_data["title"]
+            if bookmark_data["description"] is not None:
+                existing.description = bookmark_data["description"]
+            if bookmark_data["tags"]:
+                set_bookmark_tags(db, existing, [tag.name for tag in existing.tags] + bookmark_data["tags"])
+            db.commit()
+            bookmark_cache.invalidate(current_user.id, existing.id)
+            log_event("bookmark.merged", user_id=current_user.id, bookmark_id=existing.id)
+            db.refresh(existing)
+            publish_bookmark(current_user.id, "bookmark.updated", existing)
+            response.status_code = 200
+            return existing
+
     db_bookmark = BookmarkModel(
         title=bookmark_data["title"],
         description=bookmark_data["description"],
@@ -36,25 +132,235 @@ async def create_bookmark(
         user_id=current_user.id
     )
     db.add(db_bookmark)
+    set_bookmark_tags(db, db_bookmark, bookmark_data["tags"])
+    record_bookmark_created(db, db_bookmark)
     db.commit()
     db.refresh(db_bookmark)
+    log_event("bookmark.created", user_id=current_user.id, bookmark_id=db_bookmark.id)
+    publish_bookmark(current_user.id, "bookmark.created", db_bookmark)
     return db_bookmark
 
-@router.get("/", response_model=List[Bookmark])
+@router.get("/", response_model=List[SparseBookmark], response_model_exclude_unset=True)
 async def list_bookmarks(
+    tag: Optional[List[str]] = Query(None),
+    tag_mode: TagMode = TagMode.all,
+    ids: Optional[str] = None,
+    fields: Optional[str] = None,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     List all bookmarks for the current user.
     
+    Args:
+        tag (List[str]): Only list bookmarks with these tags (repeat the parameter for several)
+        tag_mode (TagMode): Require all of the tags or any of them
+        ids (str): Only these bookmarks, e.g. "1,2,3", returned in this order; unknown ids are left out
+        fields (str): Only return these fields, e.g. "id,url"; only their columns are queried
+        
+    Concurrent identical requests of the same user share one query. Bookmarks
+    requested by id are served from the bookmark cache when possible, the
+    others are loaded in one query.
+    
     Returns:
         List[Bookmark]: List of all bookmarks belonging to the current user
         
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 422 if ids or fields are malformed
+    """
+    user_id = current_user.id
+    tags = normalize_tags(tag)
+    id_list = parse_ids(ids)
+    field_list = parse_fields(fields)
+    match_all = tag_mode == TagMode.all
+    
+    cached = {}
+    if id_list is not None and not tags:
+        for bookmark_id in id_list:
+            payload = bookmark_cache.get(user_id, bookmark_id)
+            if payload is not None:
+                cached[bookmark_id] = payload
+    missing = [bookmark_id for bookmark_id in id_list if bookmark_id not in cached] if id_list is not None else None
+    
+    def load():
+        if field_list is not None:
+            return load_bookmark_fields(db, user_id, field_list, missing, tags, match_all)
+        cacheable = missing is not None and not tags
+        # Taken before the query: payloads of bookmarks changed meanwhile are not cached
+        generations = {
+            bookmark_id: bookmark_cache.generation(user_id, bookmark_id) for bookmark_id in missing or ()
+        }
+        bookmarks = repository.list_bookmarks(db, user_id, missing, tags, match_all)
+        payloads = [Bookmark.model_validate(bookmark).model_dump(mode="json") for bookmark in bookmarks]
+        if cacheable:
+            for payload in payloads:
+                bookmark_cache.set(user_id, payload["id"], payload, generations[payload["id"]])
+        return payloads
+    
+    if missing == []:
+        loaded = []
+    else:
+        key = (
+            "list_bookmarks", user_id, tuple(tags), tag_mode,
+            tuple(missing) if missing is not None else None,
+            tuple(field_list) if field_list is not None else None,
+        )
+        loaded = await reads.do(key, load)
+    
+    if id_list is None:
+        payloads = loaded
+    else:
+        found = {**cached, **{payload["id"]: payload for payload in loaded}}
+        payloads = [found[bookmark_id] for bookmark_id in id_list if bookmark_id in found]
+    if field_list is not None:
+        payloads = [{field: payload[field] for field in field_list} for payload in payloads]
+    return payloads
+
+@router.get("/tags", response_model=List[TagCount])
+async def list_tags(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List the current user's tags with the number of bookmarks carrying each.
+    
+    Counts are maintained on every bookmark write, so this does not aggregate
+    over the bookmark collection.
+    
+    Returns:
+        List[TagCount]: Tags in use, most used first
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+    """
+    return [TagCount(name=tag.name, count=tag.bookmark_count) for tag in tag_counts(db, current_user.id)]
+
+@router.get("/stats", response_model=BookmarkStats)
+async def bookmark_stats(
+    days: int = Query(7, ge=1, le=366),
+    top: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get statistics about the current user's bookmarks.
+    
+    Read from per-user aggregates that every bookmark write keeps up to date,
+    so the cost does not depend on the number of bookmarks.
+    
+    Args:
+        days (int): Size of the recent activity window in days, including today
+        top (int): Number of domains to return
+        
+    Returns:
+        BookmarkStats: Total count, most bookmarked domains and recent activity
+        
     Raises:
         HTTPException: 401 if user is not authenticated
     """
-    return db.query(BookmarkModel).filter(BookmarkModel.user_id == current_user.id).all()
+    return get_stats(db, current_user.id, top=top, days=days)
+
+@router.get("/export")
+async def export(
+    format: ExportFormat = ExportFormat.ndjson,
+    gzip: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export all bookmarks of the current user.
+    
+    The export is streamed from a server-side cursor, so memory use does not
+    grow with the number of bookmarks and the first bytes go out immediately.
+    
+    Args:
+        format (ExportFormat): html (Netscape bookmark file), csv or ndjson
+        gzip (bool): Compress the stream on the fly (Content-Encoding: gzip)
+        
+    Returns:
+        StreamingResponse: The exported bookmarks as an attachment
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated
+    """
+    _, media_type, extension = ENCODERS[format.value]
+    headers = {"Content-Disposition": f'attachment; filename="bookmarks.{extension}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_bookmarks(db, current_user.id, format.value, compress=gzip),
+        media_type=media_type,
+        headers=headers
+    )
+
+@router.get("/lookup", response_model=BookmarkLookup)
+async def lookup_bookmark(
+    url: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Check whether a URL is already saved by the current user.
+    
+    Args:
+        url (str): The URL to look up; compared in canonical form
+        
+    Returns:
+        BookmarkLookup: Whether the URL is saved and the matching bookmark if so
+        
+    Raises:
+        HTTPException: 422 if the URL can't be parsed (e.g. an invalid port)
+        HTTPException: 401 if user is not authenticated
+    """
+    try:
+        bookmark = repository.find_duplicate(db, current_user.id, url)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Invalid URL: {e}")
+    return BookmarkLookup(url=url, saved=bookmark is not None, bookmark=bookmark)
+
+@router.get("/events")
+async def bookmark_events(
+    last_event_id: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Stream changes to the current user's bookmarks as server-sent events.
+    
+    Emits "bookmark.created" and "bookmark.updated" events carrying the
+    bookmark, and "bookmark.deleted" events carrying its id, as they happen on
+    any worker - including imports, account deletion and crawler updates,
+    which run in separate processes and so need a change broker on a shared
+    bus to reach the stream. A comment line is sent every SSE_HEARTBEAT_SECONDS of silence.
+    The stream is closed after SSE_MAX_STREAM_SECONDS or when the client falls
+    too far behind; reconnecting with the Last-Event-ID header replays the
+    missed events, or sends a "reset" event if they are no longer kept and
+    the bookmarks have to be reloaded.
+    
+    Args:
+        last_event_id (str): Id of the last event received (Last-Event-ID header)
+        
+    Returns:
+        StreamingResponse: text/event-stream of change events
+        
+    Raises:
+        HTTPException: 422 if Last-Event-ID is not an event id
+        HTTPException: 401 if user is not authenticated
+    """
+    if last_event_id is not None:
+        try:
+            parse_event_id(last_event_id)
+        except ValueError:
+            raise HTTPException(status_code=422, detail="Last-Event-ID must be an event id")
+    # The stream outlives the request's database work; don't hold on to a
+    # pooled connection while it is open
+    db.close()
+    return StreamingResponse(
+        event_stream(current_user.id, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @router.get("/{bookmark_id}", response_model=Bookmark)
 async def get_bookmark(
@@ -65,6 +371,9 @@ async def get_bookmark(
     """
     Get a specific bookmark by ID.
     
+    Served from the bookmark cache when possible; writes invalidate it.
+    Concurrent cache misses for the same bookmark share one query.
+    
     Args:
         bookmark_id (int): The ID of the bookmark to retrieve
         
@@ -75,13 +384,26 @@ async def get_bookmark(
         HTTPException: 404 if bookmark is not found
         HTTPException: 401 if user is not authenticated
     """
-    bookmark = db.query(BookmarkModel).filter(
-        BookmarkModel.id == bookmark_id,
-        BookmarkModel.user_id == current_user.id
-    ).first()
-    if not bookmark:
+    user_id = current_user.id
+    cached = bookmark_cache.get(user_id, bookmark_id)
+    if cached is not None:
+        return cached
+    
+    def load():
+        # Taken before the query: a payload read before a concurrent update
+        # committed is not cached after that update invalidated the key
+        generation = bookmark_cache.generation(user_id, bookmark_id)
+        bookmark = repository.get_bookmark(db, bookmark_id, user_id)
+        if not bookmark:
+            return None
+        payload = Bookmark.model_validate(bookmark).model_dump(mode="json")
+        bookmark_cache.set(user_id, bookmark_id, payload, generation)
+        return payload
+    
+    payload = await reads.do(("get_bookmark", user_id, bookmark_id), load)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Bookmark not found")
-    return bookmark
+    return payload
 
 @router.put("/{bookmark_id}", response_model=Bookmark)
 async def update_bookmark(
@@ -93,6 +415,9 @@ async def update_bookmark(
     """
     Update a bookmark.
     
+    Changing the URL to one that is already saved answers 409 unless
+    DUPLICATE_BOOKMARK_MODE is "allow"; merging would delete the edited bookmark.
+    
     Args:
         bookmark_id (int): The ID of the bookmark to update
         bookmark_update (BookmarkUpdate): The updated bookmark data
@@ -102,23 +427,34 @@ async def update_bookmark(
         
     Raises:
         HTTPException: 404 if bookmark is not found
+        HTTPException: 409 if the new URL is already saved and duplicates are not allowed
         HTTPException: 401 if user is not authenticated
     """
-    db_bookmark = db.query(BookmarkModel).filter(
-        BookmarkModel.id == bookmark_id,
-        BookmarkModel.user_id == current_user.id
-    ).first()
+    db_bookmark = repository.get_bookmark(db, bookmark_id, current_user.id)
     if not db_bookmark:
         raise HTTPException(status_code=404, detail="Bookmark not found")
     
     update_data = bookmark_update.model_dump(exclude_unset=True)
+    if update_data.get("url") is not None and DuplicateMode(DUPLICATE_BOOKMARK_MODE) != DuplicateMode.allow:
+        if repository.find_duplicate(db, current_user.id, str(update_data["url"]), exclude_id=bookmark_id):
+            raise HTTPException(status_code=409, detail="Bookmark already exists")
+    
+    if "tags" in update_data:
+        set_bookmark_tags(db, db_bookmark, update_data.pop("tags") or [])
+    
+    old_url = db_bookmark.url
     for field, value in update_data.items():
         if field == "url" and value is not None:
             value = str(value)
         setattr(db_bookmark, field, value)
+    if db_bookmark.url != old_url:
+        record_bookmark_url_changed(db, db_bookmark, old_url)
     
     db.commit()
+    bookmark_cache.invalidate(current_user.id, bookmark_id)
+    log_event("bookmark.updated", user_id=current_user.id, bookmark_id=bookmark_id)
     db.refresh(db_bookmark)
+    publish_bookmark(current_user.id, "bookmark.updated", db_bookmark)
     return db_bookmark
 
 @router.delete("/{bookmark_id}", status_code=204)
@@ -137,13 +473,15 @@ async def delete_bookmark(
         HTTPException: 404 if bookmark is not found
         HTTPException: 401 if user is not authenticated
     """
-    bookmark = db.query(BookmarkModel).filter(
-        BookmarkModel.id == bookmark_id,
-        BookmarkModel.user_id == current_user.id
-    ).first()
+    bookmark = repository.get_bookmark(db, bookmark_id, current_user.id)
     if not bookmark:
         raise HTTPException(status_code=404, detail="Bookmark not found")
     
+    release_bookmark_tags(db, bookmark)
+    record_bookmark_deleted(db, bookmark)
     db.delete(bookmark)
     db.commit()
+    bookmark_cache.invalidate(current_user.id, bookmark_id)
+    log_event("bookmark.deleted", user_id=current_user.id, bookmark_id=bookmark_id)
+    publish_change(current_user.id, "bookmark.deleted", {"id": bookmark_id})
     return None
@@ -0,0 +1,229 @@
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+from typing import Iterator, List
+
+from app import job_files
+
+from app.dependencies import get_db
+from app.models.job import Job as JobModel, QUEUED, RUNNING, SUCCEEDED, FINISHED_STATES
+from app.models.user import User
+from app.schemas.job import Job
+from app.schemas.bookmark import ExportFormat
+from app.auth.deps import get_current_user
+from app.config import JOB_MAX_UPLOAD_BYTES
+from app.export import ENCODERS
+from app.jobs import enqueue, cancel_job
+
+router = APIRouter()
+
+# Uploads are read in chunks of this size to enforce JOB_MAX_UPLOAD_BYTES
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+def get_user_job(job_id: int, db: Session, current_user: User) -> JobModel:
+    job = db.query(JobModel).filter(
+        JobModel.id == job_id,
+        JobModel.user_id == current_user.id
+    ).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@router.get("/", response_model=List[Job])
+async def list_jobs(
+    limit: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    List the current user's jobs, newest first.
+    
+    Args:
+        limit (int): Maximum number of jobs to return
+    
+    Returns:
+        List[Job]: The jobs with their status and progress
+    
+    Raises:
+        HTTPException: 401 if user is not authenticated
+    """
+    return (
+        db.query(JobModel)
+        .filter(JobModel.user_id == current_user.id)
+        .order_by(JobModel.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+@router.post("/import", response_model=Job, status_code=202)
+async def import_bookmarks(
+    file: UploadFile = File(...),
+    format: ExportFormat = ExportFormat.html,
+    skip_duplicates: bool = True,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Import a bookmark file in the background.
+    
+    Args:
+        file (UploadFile): Netscape bookmark file (as exported by browsers), CSV or NDJSON
+        format (ExportFormat): Format of the file
+        skip_duplicates (bool): Skip URLs that are already saved
+    
+    Returns:
+        Job: The queued import job; poll GET /jobs/{job_id} for its progress
+    
+    Raises:
+        HTTPException: 401 if user is not authenticated
+        HTTPException: 413 if the file exceeds JOB_MAX_UPLOAD_BYTES
+    """
+    def chunks() -> Iterator[bytes]:
+        size = 0
+        while chunk := file.file.read(UPLOAD_CHUNK_BYTES):
+            size += len(chunk)
+            if size > JOB_MAX_UPLOAD_BYTES:
+                raise HTTPException(status_code=413, detail="Bookmark file is too large")
+            yield chunk
+
+    # Copied to the job file store chunk by chunk, off the event loop
+    name = job_files.new_file_name("import")
+    await run_in_threadpool(job_files.store.write, name, chunks())
+    return enqueue(
+        db,
+        "import_bookmarks",
+        user_id=current_user.id,
+        payload={"format": format.value, "skip_duplicates": skip_duplicates},
+        input_file=name,
+    )
+
+@router.post("/export", response_model=Job, status_code=202)
+async def export_bookmarks(
+    format: ExportFormat = ExportFormat.ndjson,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export all bookmarks of the current user to a file in the background.
+    
+    Args:
+        format (ExportFormat): html (Netscape bookmark file), csv or ndjson
+    
+    Returns:
+        Job: The queued export job; download the file from GET /jobs/{job_id}/output once it succeeded
+    
+    Raises:
+        HTTPException: 401 if user is not authenticated
+    """
+    return enqueue(db, "export_bookmarks", user_id=current_user.id, payload={"format": format.value})
+
+@router.post("/delete-account", response_model=Job, status_code=202)
+async def delete_account(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Delete the current user and all of their data in the background.
+    
+    The account is deactivated right away when the job starts. Requesting the
+    deletion again while it is pending returns the pending job.
+    
+    Returns:
+        Job: The queued deletion job
+    
+    Raises:
+        HTTPException: 401 if user is not authenticated
+    """
+    pending = db.query(JobModel).filter(
+        JobModel.user_id == current_user.id,
+        JobModel.kind == "delete_user",
+        JobModel.status.in_((QUEUED, RUNNING))
+    ).first()
+    if pending is not None:
+        return pending
+    return enqueue(db, "delete_user", user_id=current_user.id)
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Get the status, progress and result of a job.
+    
+    Args:
+        job_id (int): The ID of the job
+    
+    Returns:
+        Job: The job
+    
+    Raises:
+        HTTPException: 404 if the job is not found or belongs to another user
+        HTTPException: 401 if user is not authenticated
+    """
+    return get_user_job(job_id, db, current_user)
+
+@router.post("/{job_id}/cancel", response_model=Job)
+async def cancel(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Cancel a job.
+    
+    Queued jobs are cancelled immediately; running jobs stop at their next
+    checkpoint, keeping the work done so far.
+    
+    Args:
+        job_id (int): The ID of the job to cancel
+    
+    Returns:
+        Job: The job, with cancel_requested set
+    
+    Raises:
+        HTTPException: 404 if the job is not found or belongs to another user
+        HTTPException: 409 if the job has already finished
+        HTTPException: 401 if user is not authenticated
+    """
+    job = get_user_job(job_id, db, current_user)
+    if job.status in FINISHED_STATES:
+        raise HTTPException(status_code=409, detail=f"Job has already {job.status}")
+    return cancel_job(db, job)
+
+@router.get("/{job_id}/output")
+async def get_job_output(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Download the file produced by an export job.
+    
+    Args:
+        job_id (int): The ID of the export job
+    
+    Returns:
+        StreamingResponse: The exported bookmarks as a gzip encoded attachment
+    
+    Raises:
+        HTTPException: 404 if the job is not found or has no output
+        HTTPException: 409 if the job has not succeeded (yet)
+        HTTPException: 401 if user is not authenticated
+    """
+    job = get_user_job(job_id, db, current_user)
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail="Job has not succeeded")
+    if job.output_file is None:
+        raise HTTPException(status_code=404, detail="Job has no output")
+    _, media_type, extension = ENCODERS[job.payload["format"]]
+    return StreamingResponse(
+        job_files.read_chunks(job_files.store.open(job.output_file)),
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="bookmarks.{extension}"',
+            "Content-Encoding": "gzip",
+        }
+    )
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends
+
+from app.auth.deps import get_current_admin
+from app.loadshed import load_shedder
+from app.cache import bookmark_cache
+from app.singleflight import reads
+from app.models.user import User
+
+router = APIRouter()
+
+@router.get("/load")
+async def load_metrics(current_user: User = Depends(get_current_admin)):
+    """
+    Report the adaptive concurrency limiter state.
+    
+    Returns:
+        dict: Current limit, in-flight requests, pool wait and loop lag averages, shed count
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated, 403 if not an admin
+    """
+    return load_shedder.snapshot()
+
+@router.get("/cache")
+async def cache_metrics(current_user: User = Depends(get_current_admin)):
+    """
+    Report bookmark cache effectiveness and size.
+    
+    Returns:
+        dict: Hits, misses, hit ratio, cached entries and bytes held
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated, 403 if not an admin
+    """
+    return bookmark_cache.stats()
+
+@router.get("/coalescing")
+async def coalescing_metrics(current_user: User = Depends(get_current_admin)):
+    """
+    Report how many reads were answered by an identical in-flight read.
+    
+    Returns:
+        dict: Reads in flight, leader and follower counts, coalesced ratio
+        
+    Raises:
+        HTTPException: 401 if user is not authenticated, 403 if not an admin
+    """
+    return reads.stats()
@@ -4,6 +4,10 @@ from sqlalchemy.exc import IntegrityError
 from app.schemas.user import UserCreate, UserUpdate, User
 from app.models.user import User as UserModel
 from app.dependencies import get_db
+from app.cache import bookmark_cache
+from app.event_log import log_event
+from app.auth.routes import revoke_all_refresh_tokens
+from app import repository
 from typing import List
 
 router = APIRouter()
@@ -23,12 +27,12 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
         HTTPException: 400 if email or username is already registered
     """
     # Check if email exists
-    db_user = db.query(UserModel).filter(UserModel.email == user.email).first()
+    db_user = repository.get_user_by_email(db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Check if username exists
-    db_user = db.query(UserModel).filter(UserModel.username == user.username).first()
+    db_user = repository.get_user_by_username(db, user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already taken")
     
@@ -42,6 +46,7 @@ async def create_user(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    log_event("user.created", user_id=db_user.id)
     
     return db_user
 
@@ -72,7 +77,7 @@ async def read_user(user_id: int, db: Session = Depends(get_db)):
         HTTPException: 404 if user is not found
     """
     # Get single user by id
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    db_user = repository.get_user(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return db_user
@@ -94,32 +99,28 @@ async def update_user(user_id: int, user_update: UserUpdate, db: Session = Depen
         HTTPException: 400 if email or username is already taken by another user
         HTTPException: 400 if there's a conflict with existing data
     """
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    db_user = repository.get_user(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     # Check if new email or username already exists
     if user_update.email:
-        existing_user = db.query(UserModel).filter(
-            UserModel.email == user_update.email,
-            UserModel.id != user_id
-        ).first()
-        if existing_user:
+        existing_user = repository.get_user_by_email(db, user_update.email)
+        if existing_user and existing_user.id != user_id:
             raise HTTPException(status_code=400, detail="Email already registered by another user")
     
     if user_update.username:
-        existing_user = db.query(UserModel).filter(
-            UserModel.username == user_update.username,
-            UserModel.id != user_id
-        ).first()
-        if existing_user:
+        existing_user = repository.get_user_by_username(db, user_update.username)
+        if existing_user and existing_user.id != user_id:
             raise HTTPException(status_code=400, detail="Username already taken by another user")
     
     update_data = user_update.model_dump(exclude_unset=True)
     
-    # Handle password update separately to ensure it's hashed
+    # Handle password update separately to ensure it's hashed; sessions
+    # started with the old password end with it, in the same commit
     if "password" in update_data:
         db_user.set_password(update_data.pop("password"))
+        revoke_all_refresh_tokens(db, user_id)
     
     # Update other fields
     for field, value in update_data.items():
@@ -128,6 +129,7 @@ async def update_user(user_id: int, user_update: UserUpdate, db: Session = Depen
     try:
         db.commit()
         db.refresh(db_user)
+        log_event("user.updated", user_id=user_id, fields=sorted(user_update.model_dump(exclude_unset=True)))
         return db_user
     except IntegrityError:
         db.rollback()
@@ -147,10 +149,12 @@ async def delete_user(user_id: int, db: Session = Depends(get_db)):
     Raises:
         HTTPException: 404 if user is not found
     """
-    db_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+    db_user = repository.get_user(db, user_id)
     if db_user is None:
         raise HTTPException(status_code=404, detail="User not found")
     
     db.delete(db_user)
     db.commit()
+    bookmark_cache.invalidate_user(user_id)
+    log_event("user.deleted", user_id=user_id)
     return None
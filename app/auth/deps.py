@@ -8,6 +8,8 @@ from datetime import datetime
 from app.dependencies import get_db
 from app.models.user import User
 from app.config import SECRET_KEY, ALGORITHM
+from app.singleflight import reads
+from app import repository
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 
@@ -57,14 +59,27 @@ async def get_current_user(
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # Get the user from the database
-        user = db.query(User).filter(User.username == username).first()
+        # Get the user from the database; concurrent requests for the same
+        # user share one query and receive a detached User
+        def load():
+            user = repository.get_user_by_username(db, username)
+            if user is not None:
+                db.expunge(user)
+            return user
+        
+        user = await reads.do(("principal", username), load)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        if not user.is_active:
+            # Deactivated, e.g. while the account is being deleted
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Inactive user",
+            )
             
         return user
         
@@ -73,4 +88,15 @@ async def get_current_user(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Invalid token: {str(e)}",
             headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        ) 
+
+async def get_current_admin(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Require the authenticated user to be an administrator.
+    """
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin privileges required",
+        )
+    return current_user
@@ -1,16 +1,56 @@
-from datetime import timedelta
+import hashlib
+import hmac
+import logging
+from datetime import datetime, timedelta, UTC
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 
 from app.dependencies import get_db
 from app.models.user import User
-from app.config import ACCESS_TOKEN_EXPIRE_MINUTES
-from app.auth.security import create_access_token
+from app.models.refresh_token import RefreshToken
+from app.schemas.auth import Token, RefreshRequest
+from app.config import ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY
+from app.auth.security import create_access_token, create_refresh_token, hash_refresh_token
+from app.event_log import log_event
+from app import repository
 
 router = APIRouter()
 
-@router.post("/token")
+def username_digest(username: str) -> str:
+    """
+    Keyed hash of a submitted username for the event log. Failed logins are
+    often a password typed into the username field, so the value itself is
+    never logged; the digest still groups repeated attempts.
+    """
+    return hmac.new(SECRET_KEY.encode(), username.encode(), hashlib.sha256).hexdigest()[:16]
+
+def issue_tokens(db: Session, user: User) -> Token:
+    """
+    Create an access token and a stored refresh token for the user.
+    Does not commit; the caller commits together with any revocation.
+    """
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username},
+        expires_delta=access_token_expires
+    )
+    refresh_token, token_hash, expires_at = create_refresh_token()
+    db.add(RefreshToken(user_id=user.id, token_hash=token_hash, expires_at=expires_at))
+    return Token(access_token=access_token, refresh_token=refresh_token)
+
+def revoke_all_refresh_tokens(db: Session, user_id: int) -> None:
+    """
+    Revoke every active refresh token of a user.
+    """
+    db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.user_id == user_id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=datetime.now(UTC))
+    )
+
+@router.post("/token", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
@@ -21,24 +61,107 @@ async def login(
     1. Swagger UI (built into FastAPI)
     2. curl: curl -X POST "http://localhost:8000/auth/token" -d "username=your_username&password=your_password"
     3. Postman/Insomnia with form-data
+
+    The response also carries a refresh token; use /auth/refresh to renew
+    the access token instead of logging in again. Deactivated users get 403.
     """
     # Authenticate user
-    user = db.query(User).filter(User.username == form_data.username).first()
+    user = repository.get_user_by_username(db, form_data.username)
     if not user or not user.verify_password(form_data.password):
+        log_event(
+            "auth.login.failure",
+            level=logging.WARNING,
+            username_digest=username_digest(form_data.username),
+        )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    
-    # Create token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username},
-        expires_delta=access_token_expires
+    if not user.is_active:
+        log_event("auth.login.inactive", level=logging.WARNING, user_id=user.id)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Inactive user",
+        )
+
+    # Create tokens
+    tokens = issue_tokens(db, user)
+    db.commit()
+    log_event("auth.login.success", user_id=user.id)
+    return tokens
+
+@router.post("/refresh", response_model=Token)
+async def refresh(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchange a refresh token for a new access token and refresh token.
+
+    Refresh tokens are single use: the presented token is revoked and
+    replaced. Presenting an already revoked token is treated as theft and
+    revokes all of the user's refresh tokens.
+
+    Raises:
+        HTTPException: 401 if the refresh token is unknown, expired or revoked,
+            or its user has been deactivated
+    """
+    invalid_token = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    token = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == hash_refresh_token(request.refresh_token)
+    ).first()
+    if token is None:
+        raise invalid_token
+
+    if token.revoked_at is not None:
+        revoke_all_refresh_tokens(db, token.user_id)
+        db.commit()
+        log_event("auth.refresh.reuse", level=logging.WARNING, user_id=token.user_id)
+        raise invalid_token
+
+    now = datetime.now(UTC)
+    expires_at = token.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=UTC)  # SQLite drops the timezone
+    if expires_at <= now:
+        raise invalid_token
+
+    user = token.user
+    if not user.is_active:
+        raise invalid_token
+
+    # Revoke with a conditional UPDATE so that concurrent refreshes with the
+    # same token cannot both succeed
+    result = db.execute(
+        update(RefreshToken)
+        .where(RefreshToken.id == token.id, RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        raise invalid_token
+
+    tokens = issue_tokens(db, user)
+    db.commit()
+    log_event("auth.refresh", user_id=user.id)
+    return tokens
+
+@router.post("/revoke", status_code=204)
+async def revoke(request: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Revoke a refresh token, e.g. on logout. Unknown tokens are ignored.
+    """
+    db.execute(
+        update(RefreshToken)
+        .where(
+            RefreshToken.token_hash == hash_refresh_token(request.refresh_token),
+            RefreshToken.revoked_at.is_(None)
+        )
+        .values(revoked_at=datetime.now(UTC))
     )
-    
-    return {
-        "access_token": access_token,
-        "token_type": "bearer"
-    } 
\ No newline at end of file
+    db.commit()
+    return None
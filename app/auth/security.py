@@ -1,8 +1,11 @@
+import hashlib
+import hmac
+import secrets
 from datetime import datetime, timedelta, UTC
-from typing import Optional
+from typing import Optional, Tuple
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_DAYS
 
 # Create a CryptContext instance for password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -37,4 +40,24 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.now(UTC) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": int(expire.timestamp())})  # Convert to Unix timestamp
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt 
\ No newline at end of file
+    return encoded_jwt 
+
+def hash_refresh_token(token: str) -> bytes:
+    """
+    Hash a refresh token for storage and lookup.
+    
+    Refresh tokens are random, so a keyed HMAC is enough; unlike passwords
+    they don't need a slow hash like bcrypt.
+    """
+    return hmac.new(SECRET_KEY.encode("utf-8"), token.encode("utf-8"), hashlib.sha256).digest()
+
+def create_refresh_token() -> Tuple[str, bytes, datetime]:
+    """
+    Create a new opaque refresh token.
+    
+    Returns:
+        Tuple[str, bytes, datetime]: The token for the client, its hash for storage and its expiry
+    """
+    token = secrets.token_urlsafe(32)
+    expires_at = datetime.now(UTC) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    return token, hash_refresh_token(token), expires_at
@@ -0,0 +1,361 @@
+"""
+Bookmark change events, streamed to clients by GET /bookmarks/events.
+
+Every bookmark write publishes an event to the change broker - the API's,
+and those of background jobs (imports, account deletion) and the crawler -
+which numbers it per user, keeps it in a bounded per-user history and hands
+it to that user's open streams. The SSE event id is "<epoch>-<number>", the
+epoch being drawn whenever a history starts numbering from scratch (at boot
+or after a reset). A client reconnecting with Last-Event-ID gets the events
+it missed from the history, or a "reset" event telling it to reload its
+bookmarks if they are no longer there - including when its id comes from
+another epoch, whose numbers mean nothing to this history.
+
+The in-process broker serves a single worker. With several workers, every
+worker connects a broker to a shared bus (e.g. Redis pub/sub plus a stream
+for the history) so that a change made on one worker reaches streams held by
+the others. `LocalBus` is an in-memory stand-in for such a bus, for tests
+and local multi-broker setups; install a broker with `set_change_broker`.
+Job workers and the crawler run in processes of their own, so their events
+only reach the API's streams through such a shared bus.
+"""
+import asyncio
+import json
+import secrets
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session, selectinload
+
+from app.config import SSE_HEARTBEAT_SECONDS, SSE_HISTORY_SIZE, SSE_MAX_STREAM_SECONDS, SSE_QUEUE_SIZE
+from app.models.bookmark import Bookmark as BookmarkModel
+from app.schemas.bookmark import Bookmark
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    id: int
+    type: str  # bookmark.created, bookmark.updated or bookmark.deleted
+    data: dict
+    epoch: str = ""
+
+    @property
+    def event_id(self) -> str:
+        """
+        The SSE event id, "<epoch>-<id>".
+        """
+        return f"{self.epoch}-{self.id}"
+
+    def encode(self) -> bytes:
+        """
+        The event in the text/event-stream wire format.
+        """
+        return f"id: {self.event_id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n".encode()
+
+
+def parse_event_id(event_id: str) -> Tuple[str, int]:
+    """
+    Split an SSE event id into its epoch and number. An id without an epoch
+    (as sent before ids had one) gets an empty epoch, which matches none.
+
+    Raises:
+        ValueError: If the id does not end in a number
+    """
+    epoch, _, number = event_id.rpartition("-")
+    return epoch, int(number)
+
+
+def new_epoch() -> str:
+    return secrets.token_hex(4)
+
+
+Listener = Callable[[ChangeEvent], None]
+
+
+class EventHistory:
+    """
+    Per-user event numbering and the most recent events of each user.
+    """
+
+    def __init__(self, size: int = SSE_HISTORY_SIZE):
+        self.size = size
+        self.epoch = new_epoch()
+        self._last_ids: Dict[int, int] = defaultdict(int)
+        self._events: Dict[int, Deque[ChangeEvent]] = defaultdict(lambda: deque(maxlen=self.size))
+        self._lock = threading.Lock()
+
+    def append(self, user_id: int, type: str, data: dict) -> ChangeEvent:
+        with self._lock:
+            self._last_ids[user_id] += 1
+            event = ChangeEvent(self._last_ids[user_id], type, data, self.epoch)
+            self._events[user_id].append(event)
+            return event
+
+    def since(self, user_id: int, last_event_id: str) -> Optional[List[ChangeEvent]]:
+        """
+        The user's events after `last_event_id`, or None if some of them are
+        no longer kept (or the id was never handed out in this epoch).
+
+        Raises:
+            ValueError: If `last_event_id` is malformed
+        """
+        epoch, last_id = parse_event_id(last_event_id)
+        with self._lock:
+            if epoch != self.epoch:
+                return None
+            newest = self._last_ids.get(user_id, 0)
+            events = list(self._events.get(user_id, ()))
+        if last_id > newest:
+            return None
+        if last_id == newest:
+            return []
+        if not events or events[0].id > last_id + 1:
+            return None
+        return [event for event in events if event.id > last_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            # Numbering starts over, so earlier ids must not match
+            self.epoch = new_epoch()
+            self._last_ids.clear()
+            self._events.clear()
+
+
+class ChangeBroker(ABC):
+    """
+    Publishes bookmark change events and delivers them to listeners.
+    """
+
+    @abstractmethod
+    def publish(self, user_id: int, type: str, data: dict) -> ChangeEvent:
+        """
+        Number the event, keep it in the user's history and deliver it to the
+        user's listeners on every worker.
+        """
+
+    @abstractmethod
+    def history(self, user_id: int, last_event_id: str) -> Optional[List[ChangeEvent]]:
+        """
+        The user's events after the event id `last_event_id`, None if they
+        can't all be replayed.
+        """
+
+    @abstractmethod
+    def subscribe(self, user_id: int, listener: Listener) -> Callable[[], None]:
+        """
+        Call `listener` with each event of the user published from now on.
+        The listener may be called from any thread and must not block.
+
+        Returns:
+            Callable: Removes the listener again
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        Forget history and listeners.
+        """
+
+
+class InProcessBroker(ChangeBroker):
+    """
+    Broker for a single worker: history and listeners live in this process.
+    """
+
+    def __init__(self, history_size: int = SSE_HISTORY_SIZE):
+        self._history = EventHistory(history_size)
+        self._listeners: Dict[int, Set[Listener]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, user_id: int, type: str, data: dict) -> ChangeEvent:
+        event = self._history.append(user_id, type, data)
+        self.deliver(user_id, event)
+        return event
+
+    def history(self, user_id: int, last_event_id: str) -> Optional[List[ChangeEvent]]:
+        return self._history.since(user_id, last_event_id)
+
+    def deliver(self, user_id: int, event: ChangeEvent) -> None:
+        """
+        Hand an event to the listeners connected to this broker.
+        """
+        with self._lock:
+            listeners = list(self._listeners.get(user_id, ()))
+        for listener in listeners:
+            listener(event)
+
+    def subscribe(self, user_id: int, listener: Listener) -> Callable[[], None]:
+        with self._lock:
+            self._listeners[user_id].add(listener)
+
+        def unsubscribe():
+            with self._lock:
+                listeners = self._listeners.get(user_id)
+                if listeners is not None:
+                    listeners.discard(listener)
+                    if not listeners:
+                        del self._listeners[user_id]
+        return unsubscribe
+
+    def reset(self) -> None:
+        self._history.clear()
+        with self._lock:
+            self._listeners.clear()
+
+
+class LocalBus:
+    """
+    In-memory stand-in for a bus shared by the brokers of several workers.
+    It owns the event numbering, epoch and history, and fans events out to
+    every connected broker.
+    """
+
+    def __init__(self, history_size: int = SSE_HISTORY_SIZE):
+        self.history = EventHistory(history_size)
+        self.brokers: List["LocalBusBroker"] = []
+
+    def publish(self, user_id: int, type: str, data: dict) -> ChangeEvent:
+        event = self.history.append(user_id, type, data)
+        for broker in list(self.brokers):
+            broker.deliver(user_id, event)
+        return event
+
+
+class LocalBusBroker(InProcessBroker):
+    """
+    A worker's broker connected to a `LocalBus`.
+    """
+
+    def __init__(self, bus: LocalBus):
+        super().__init__()
+        self.bus = bus
+        bus.brokers.append(self)
+
+    def publish(self, user_id: int, type: str, data: dict) -> ChangeEvent:
+        return self.bus.publish(user_id, type, data)
+
+    def history(self, user_id: int, last_event_id: str) -> Optional[List[ChangeEvent]]:
+        return self.bus.history.since(user_id, last_event_id)
+
+    def reset(self) -> None:
+        self.bus.history.clear()
+        with self._lock:
+            self._listeners.clear()
+
+
+change_broker: ChangeBroker = InProcessBroker()
+
+
+def set_change_broker(broker: ChangeBroker) -> None:
+    """
+    Replace the broker, e.g. with one connected to a bus shared between workers.
+    """
+    global change_broker
+    change_broker = broker
+
+
+def publish_change(user_id: int, type: str, data: dict) -> None:
+    change_broker.publish(user_id, type, data)
+
+
+def publish_bookmark(user_id: int, type: str, bookmark: BookmarkModel) -> None:
+    """
+    Publish a change event carrying the bookmark as the API returns it.
+    """
+    publish_change(user_id, type, Bookmark.model_validate(bookmark).model_dump(mode="json"))
+
+
+def publish_bookmarks(db: Session, type: str, bookmark_ids: Iterable[int]) -> None:
+    """
+    Publish a change event for each of a batch of committed bookmarks,
+    loaded with their tags in one go.
+    """
+    bookmark_ids = list(bookmark_ids)
+    if not bookmark_ids:
+        return
+    bookmarks = db.execute(
+        select(BookmarkModel)
+        .where(BookmarkModel.id.in_(bookmark_ids))
+        .options(selectinload(BookmarkModel.tags))
+        .order_by(BookmarkModel.id)
+    ).scalars()
+    for bookmark in bookmarks:
+        publish_bookmark(bookmark.user_id, type, bookmark)
+
+
+HEARTBEAT = b": heartbeat\n\n"
+
+
+async def event_stream(
+    user_id: int,
+    last_event_id: Optional[str] = None,
+    broker: Optional[ChangeBroker] = None,
+    heartbeat: Optional[float] = None,
+    queue_size: Optional[int] = None,
+    max_duration: Optional[float] = None,
+) -> AsyncIterator[bytes]:
+    """
+    The user's change events in text/event-stream format.
+
+    Starts with the events after `last_event_id` (or a "reset" event if they
+    can't be replayed, e.g. as the id is from an earlier epoch), then follows
+    new events, with a comment line every `heartbeat` seconds of silence to
+    keep proxies from closing the connection. Events are buffered in a queue
+    of `queue_size`; a client too slow to keep up is disconnected once it
+    fills up, as is every client after `max_duration` seconds. Either way it
+    reconnects and resumes from its last event id. The limits default to the
+    SSE_* settings.
+    """
+    broker = broker or change_broker
+    heartbeat = heartbeat if heartbeat is not None else SSE_HEARTBEAT_SECONDS
+    queue_size = queue_size if queue_size is not None else SSE_QUEUE_SIZE
+    max_duration = max_duration if max_duration is not None else SSE_MAX_STREAM_SECONDS
+    loop = asyncio.get_running_loop()
+    queue: "asyncio.Queue[ChangeEvent]" = asyncio.Queue(maxsize=queue_size)
+    overflowed = False
+
+    def enqueue(event: ChangeEvent) -> None:
+        nonlocal overflowed
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            overflowed = True
+
+    # Subscribe before reading the history so that nothing falls in between
+    unsubscribe = broker.subscribe(user_id, lambda event: loop.call_soon_threadsafe(enqueue, event))
+    try:
+        # Sent right away so the client sees the stream open
+        yield HEARTBEAT
+        sent = 0
+        if last_event_id is not None:
+            missed = broker.history(user_id, last_event_id)
+            if missed is None:
+                yield b"event: reset\ndata: {}\n\n"
+            else:
+                for event in missed:
+                    yield event.encode()
+                    sent = event.id
+
+        deadline = time.monotonic() + max_duration
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = await asyncio.wait_for(queue.get(), min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                if time.monotonic() < deadline:
+                    yield HEARTBEAT
+                continue
+            if event.id > sent:
+                yield event.encode()
+                sent = event.id
+            if overflowed and queue.empty():
+                break
+    finally:
+        unsubscribe()
@@ -0,0 +1,223 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Set, Tuple
+
+from app.config import BOOKMARK_CACHE_MAX_ENTRIES, BOOKMARK_CACHE_MAX_BYTES, BOOKMARK_CACHE_TTL_SECONDS
+
+CacheKey = Tuple[int, int]  # (user_id, bookmark_id)
+
+# Invalidation counters are striped to keep their memory bounded; an
+# invalidation also voids the in-flight writes of other keys in its stripe,
+# which costs those nothing but a cache miss
+GENERATION_STRIPES = 4096
+
+
+class CacheBackend(ABC):
+    """
+    Storage for cached bookmark payloads, keyed by (user_id, bookmark_id).
+
+    Values are JSON encoded bytes. The in-process LRU below serves a single
+    worker, and only writes made through this process invalidate it: changes
+    by `manage crawl` or job workers show up once the entry expires after
+    BOOKMARK_CACHE_TTL_SECONDS. A shared backend (e.g. Redis or memcached)
+    installed with `set_cache_backend` in every process, workers included,
+    removes that delay.
+    """
+
+    @abstractmethod
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: CacheKey, value: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: CacheKey) -> None:
+        pass
+
+    @abstractmethod
+    def delete_user(self, user_id: int) -> None:
+        """Drop every entry belonging to the user."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        pass
+
+    @abstractmethod
+    def size(self) -> dict:
+        """Number of entries and bytes held."""
+
+
+class LRUCacheBackend(CacheBackend):
+    """
+    Least recently used cache bounded by entry count, total bytes and age.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = BOOKMARK_CACHE_MAX_ENTRIES,
+        max_bytes: int = BOOKMARK_CACHE_MAX_BYTES,
+        ttl: float = BOOKMARK_CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, Tuple[bytes, float]]" = OrderedDict()
+        self._by_user: Dict[int, Set[int]] = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _remove(self, key: CacheKey) -> None:
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+        user_keys = self._by_user.get(key[0])
+        if user_keys is not None:
+            user_keys.discard(key[1])
+            if not user_keys:
+                del self._by_user[key[0]]
+
+    def get(self, key: CacheKey) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if self._clock() >= expires:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: CacheKey, value: bytes) -> None:
+        if self.max_entries <= 0 or len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, self._clock() + self.ttl)
+            self._by_user.setdefault(key[0], set()).add(key[1])
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key: CacheKey) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def delete_user(self, user_id: int) -> None:
+        with self._lock:
+            for bookmark_id in list(self._by_user.get(user_id, ())):
+                self._remove((user_id, bookmark_id))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+            self._bytes = 0
+
+    def size(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes}
+
+
+class BookmarkCache:
+    """
+    Read-through cache of serialized bookmarks with hit ratio accounting.
+
+    A reader takes the key's `generation` before querying the database and
+    passes it to `set`; every invalidation bumps the generation, so a payload
+    read before a concurrent write committed and invalidated is dropped
+    instead of being cached for the full TTL.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Lookups run on the event loop and in the threadpool
+        self._counter_lock = threading.Lock()
+        self._key_generations = [0] * GENERATION_STRIPES
+        self._user_generations = [0] * GENERATION_STRIPES
+        self._generation_lock = threading.Lock()
+
+    @staticmethod
+    def _stripes(user_id: int, bookmark_id: int) -> Tuple[int, int]:
+        return hash((user_id, bookmark_id)) % GENERATION_STRIPES, hash(user_id) % GENERATION_STRIPES
+
+    def generation(self, user_id: int, bookmark_id: int) -> Tuple[int, int]:
+        """
+        Token to pass to `set`, taken before the bookmark is read.
+        """
+        with self._generation_lock:
+            return self._current(user_id, bookmark_id)
+
+    def _current(self, user_id: int, bookmark_id: int) -> Tuple[int, int]:
+        key_stripe, user_stripe = self._stripes(user_id, bookmark_id)
+        return self._key_generations[key_stripe], self._user_generations[user_stripe]
+
+    def get(self, user_id: int, bookmark_id: int) -> Optional[dict]:
+        value = self.backend.get((user_id, bookmark_id))
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return json.loads(value) if value is not None else None
+
+    def set(self, user_id: int, bookmark_id: int, payload: dict, generation: Optional[Tuple[int, int]] = None) -> None:
+        """
+        Cache a payload, unless the key was invalidated since `generation`.
+        """
+        value = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+        # Checked and written under the lock so an invalidation can't land in between
+        with self._generation_lock:
+            if generation is not None and generation != self._current(user_id, bookmark_id):
+                return
+            self.backend.set((user_id, bookmark_id), value)
+
+    def invalidate(self, user_id: int, bookmark_id: int) -> None:
+        key_stripe, _ = self._stripes(user_id, bookmark_id)
+        with self._generation_lock:
+            self._key_generations[key_stripe] += 1
+        self.backend.delete((user_id, bookmark_id))
+
+    def invalidate_user(self, user_id: int) -> None:
+        _, user_stripe = self._stripes(user_id, 0)
+        with self._generation_lock:
+            self._user_generations[user_stripe] += 1
+        self.backend.delete_user(user_id)
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._counter_lock:
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        stats = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
+        stats.update(self.backend.size())
+        return stats
+
+
+bookmark_cache = BookmarkCache(LRUCacheBackend())
+
+
+def set_cache_backend(backend: CacheBackend) -> None:
+    """
+    Replace the cache storage, e.g. with a backend shared between workers.
+    """
+    bookmark_cache.backend = backend
@@ -22,3 +22,92 @@ SECRET_KEY = os.getenv("SECRET_KEY", secrets.token_urlsafe(32))
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 
+# Rate limiting
+# Token bucket per authenticated user; set RATE_LIMIT_PER_MINUTE=0 to disable
+RATE_LIMIT_PER_MINUTE = int(os.getenv("RATE_LIMIT_PER_MINUTE", "120"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "60"))
+
+# Adaptive load shedding
+# The concurrency limit shrinks while DB pool wait time or event loop lag
+# stays above these thresholds and grows back once they recover
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "64"))
+MIN_CONCURRENT_REQUESTS = int(os.getenv("MIN_CONCURRENT_REQUESTS", "4"))
+LOAD_SHED_POOL_WAIT_MS = float(os.getenv("LOAD_SHED_POOL_WAIT_MS", "250"))
+LOAD_SHED_LOOP_LAG_MS = float(os.getenv("LOAD_SHED_LOOP_LAG_MS", "100"))
+LOAD_SHED_RETRY_AFTER_SECONDS = int(os.getenv("LOAD_SHED_RETRY_AFTER_SECONDS", "1"))
+
+# Duplicate bookmarks
+# What creating a bookmark for an already saved (canonical) URL does by default:
+# "allow" stores it again, "reject" answers 409, "merge" updates the saved one
+DUPLICATE_BOOKMARK_MODE = os.getenv("DUPLICATE_BOOKMARK_MODE", "allow")
+
+# Link crawler
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "20"))
+CRAWL_PER_HOST_CONCURRENCY = int(os.getenv("CRAWL_PER_HOST_CONCURRENCY", "2"))
+CRAWL_TIMEOUT_SECONDS = float(os.getenv("CRAWL_TIMEOUT_SECONDS", "10"))
+CRAWL_BATCH_SIZE = int(os.getenv("CRAWL_BATCH_SIZE", "200"))
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "BookmarkManagerBot/1.0")
+# URLs resolving to loopback, private or link-local addresses are refused
+# unless this is set (e.g. to check an intranet)
+CRAWL_ALLOW_PRIVATE_ADDRESSES = os.getenv("CRAWL_ALLOW_PRIVATE_ADDRESSES", "false").lower() == "true"
+
+# Bookmark read cache
+# In-process LRU in front of GET /bookmarks/{id}; set BOOKMARK_CACHE_MAX_ENTRIES=0 to disable.
+# Changes made by other processes (manage crawl, job workers) can't invalidate
+# it, so the TTL is how long they may take to show up
+BOOKMARK_CACHE_MAX_ENTRIES = int(os.getenv("BOOKMARK_CACHE_MAX_ENTRIES", "10000"))
+BOOKMARK_CACHE_MAX_BYTES = int(os.getenv("BOOKMARK_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+BOOKMARK_CACHE_TTL_SECONDS = float(os.getenv("BOOKMARK_CACHE_TTL_SECONDS", "30"))
+
+# Refresh tokens
+# Long lived, rotated on every use; renewing with one avoids a bcrypt password check
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+
+# Event logging
+# Structured JSON events written by a background thread; EVENT_LOG_FILE defaults to stdout
+EVENT_LOG_LEVEL = os.getenv("EVENT_LOG_LEVEL", "INFO")
+EVENT_LOG_FILE = os.getenv("EVENT_LOG_FILE")
+EVENT_LOG_QUEUE_SIZE = int(os.getenv("EVENT_LOG_QUEUE_SIZE", "10000"))
+# Fraction of events kept per event name, e.g. "auth.refresh=0.1,request.slow=0.5"
+EVENT_SAMPLE_RATES = os.getenv("EVENT_SAMPLE_RATES", "")
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "500"))
+
+# Background jobs
+# Run workers with `python -m app.manage worker`; leases of crashed workers
+# expire after JOB_LEASE_SECONDS without progress and the job is retried
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "3600"))
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "500"))
+JOB_MAX_UPLOAD_BYTES = int(os.getenv("JOB_MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Uploaded imports and produced exports; shared by the API and all workers
+JOB_FILES_DIR = os.getenv("JOB_FILES_DIR", "./data/jobs")
+
+# Profiling
+# Admins can profile a single request with the "X-Profile: 1" header or ?profile=1;
+# the continuous stack sampler aggregates hot stacks per route. Both can be
+# switched at runtime through /admin/profiling
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "true").lower() == "true"
+PROFILE_STORE_SIZE = int(os.getenv("PROFILE_STORE_SIZE", "20"))
+PROFILE_TOP_FUNCTIONS = int(os.getenv("PROFILE_TOP_FUNCTIONS", "40"))
+SAMPLER_ENABLED = os.getenv("SAMPLER_ENABLED", "false").lower() == "true"
+SAMPLER_INTERVAL_MS = float(os.getenv("SAMPLER_INTERVAL_MS", "20"))
+SAMPLER_MAX_STACKS = int(os.getenv("SAMPLER_MAX_STACKS", "5000"))
+
+# Bookmark partitioning
+# PostgreSQL only: with BOOKMARK_PARTITIONS > 0 the bookmarks table is hash
+# partitioned by user_id into that many partitions. Convert an existing table
+# with `python -m app.manage partition-bookmarks` before setting it
+BOOKMARK_PARTITIONS = int(os.getenv("BOOKMARK_PARTITIONS", "0"))
+
+# Bookmark change events
+# GET /bookmarks/events streams the user's bookmark changes as server-sent events.
+# A connection whose buffer fills up is closed; the client resumes with Last-Event-ID
+# from the per-user history. Streams end after SSE_MAX_STREAM_SECONDS so clients
+# reconnect with a fresh token and spread out over workers
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_HISTORY_SIZE = int(os.getenv("SSE_HISTORY_SIZE", "1000"))
+SSE_MAX_STREAM_SECONDS = float(os.getenv("SSE_MAX_STREAM_SECONDS", "600"))
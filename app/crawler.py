@@ -0,0 +1,375 @@
+"""
+Link health and metadata crawler.
+
+Walks bookmarks in id order, fetches their URLs concurrently and writes back
+the HTTP status, final URL after redirects and page title in bulk updates,
+publishing a change event for each checked bookmark. Run it with
+`python -m app.manage crawl`.
+
+Bookmark URLs are user input, and page metadata is written back where the
+user can read it, so the crawler only talks to public addresses: the host of
+the URL and of every redirect is resolved and refused if any of its addresses
+is loopback, private, link-local or otherwise not globally routable.
+"""
+import asyncio
+import ipaddress
+import socket
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, UTC
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import Session
+
+from app.bookmark_events import publish_bookmarks
+from app.models.bookmark import Bookmark, bookmark_key
+from app.cache import bookmark_cache
+from app.config import (
+    CRAWL_CONCURRENCY,
+    CRAWL_PER_HOST_CONCURRENCY,
+    CRAWL_TIMEOUT_SECONDS,
+    CRAWL_BATCH_SIZE,
+    CRAWL_USER_AGENT,
+    CRAWL_ALLOW_PRIVATE_ADDRESSES,
+)
+
+# Only the start of a page is read to find its metadata
+MAX_BODY_BYTES = 256 * 1024
+# Redirects followed per URL, each checked like the URL itself
+MAX_REDIRECTS = 10
+
+# Resolves a host name and port to IP addresses
+Resolver = Callable[[str, int], Awaitable[List[str]]]
+
+
+class BlockedAddress(Exception):
+    """Raised for a URL whose host is not a public address."""
+
+
+async def resolve(host: str, port: int) -> List[str]:
+    """
+    The addresses of a host, as the system resolver returns them.
+    """
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return [info[4][0] for info in infos]
+
+
+def is_public_address(address: str) -> bool:
+    """
+    Whether an IP address is globally routable (not loopback, private,
+    link-local, shared, reserved or multicast).
+    """
+    ip = ipaddress.ip_address(address.split("%", 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+class MetadataParser(HTMLParser):
+    """
+    Extract the <title> and meta description from the start of an HTML page.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title: Optional[str] = None
+        self.description: Optional[str] = None
+        self._in_title = False
+        self._title_parts: List[str] = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title" and self.title is None:
+            self._in_title = True
+        elif tag == "meta" and self.description is None:
+            attrs = dict(attrs)
+            if (attrs.get("name") or "").lower() == "description" and attrs.get("content"):
+                self.description = attrs["content"].strip()
+
+    def handle_endtag(self, tag):
+        if tag == "title" and self._in_title:
+            self._in_title = False
+            self.title = " ".join("".join(self._title_parts).split()) or None
+
+    def handle_data(self, data):
+        if self._in_title:
+            self._title_parts.append(data)
+
+
+@dataclass
+class CrawlResult:
+    bookmark_id: int
+    status: Optional[int] = None
+    final_url: Optional[str] = None
+    title: Optional[str] = None
+    description: Optional[str] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+@dataclass
+class CrawlStats:
+    fetched: int = 0
+    not_modified: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.perf_counter)
+    finished: Optional[float] = None
+
+    @property
+    def total(self) -> int:
+        return self.fetched + self.not_modified + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def throughput(self) -> float:
+        """URLs checked per second."""
+        return self.total / self.elapsed if self.elapsed > 0 else 0.0
+
+    def record(self, result: CrawlResult) -> None:
+        if result.error is not None:
+            self.failed += 1
+        elif result.not_modified:
+            self.not_modified += 1
+        else:
+            self.fetched += 1
+
+    def as_dict(self) -> dict:
+        return {
+            "total": self.total,
+            "fetched": self.fetched,
+            "not_modified": self.not_modified,
+            "failed": self.failed,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "urls_per_second": round(self.throughput, 2),
+        }
+
+
+# Fills in a missing description; conditional in SQL so that a description
+# the user saved while the page was being fetched is kept
+_FILL_DESCRIPTION = (
+    update(Bookmark.__table__)
+    .where(
+        Bookmark.__table__.c.id == bindparam("b_id"),
+        Bookmark.__table__.c.user_id == bindparam("b_user_id"),
+        or_(Bookmark.__table__.c.description.is_(None), Bookmark.__table__.c.description == ""),
+    )
+    .values(description=bindparam("b_description"))
+)
+
+
+class Crawler:
+    """
+    Fetch bookmark URLs under a global and a per-host concurrency limit.
+
+    Args:
+        client: HTTP client to use; one is created per crawl if omitted
+        concurrency: Maximum number of requests in flight overall
+        per_host: Maximum number of requests in flight per host
+        timeout: Per-request timeout in seconds
+        batch_size: Number of bookmarks loaded and written back at a time
+        allow_private: Also fetch URLs on loopback, private and link-local addresses
+        resolver: Resolves host names for the address check
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        concurrency: int = CRAWL_CONCURRENCY,
+        per_host: int = CRAWL_PER_HOST_CONCURRENCY,
+        timeout: float = CRAWL_TIMEOUT_SECONDS,
+        batch_size: int = CRAWL_BATCH_SIZE,
+        allow_private: bool = CRAWL_ALLOW_PRIVATE_ADDRESSES,
+        resolver: Resolver = resolve,
+    ):
+        self.client = client
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.batch_size = batch_size
+        self.allow_private = allow_private
+        self.resolver = resolver
+        self._global_limit: Optional[asyncio.Semaphore] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _global(self) -> asyncio.Semaphore:
+        # Created by crawl(); also on demand for fetch() called on its own
+        if self._global_limit is None:
+            self._global_limit = asyncio.Semaphore(self.concurrency)
+        return self._global_limit
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = (urlsplit(url).hostname or "").lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host)
+        return self._host_limits[host]
+
+    async def _check_address(self, url: httpx.URL) -> None:
+        """
+        Raise BlockedAddress unless every address of the URL's host is public.
+        """
+        if self.allow_private:
+            return
+        host = url.host
+        try:
+            addresses = [str(ipaddress.ip_address(host))]
+        except ValueError:
+            addresses = await self.resolver(host, url.port or (443 if url.scheme == "https" else 80))
+        if not addresses:
+            raise BlockedAddress(f"{host} has no address")
+        for address in addresses:
+            if not is_public_address(address):
+                raise BlockedAddress(f"{host} resolves to non-public address {address}")
+
+    async def _read_metadata(self, response: httpx.Response, result: CrawlResult) -> None:
+        result.status = response.status_code
+        result.final_url = str(response.url)
+        result.etag = response.headers.get("etag")
+        result.last_modified = response.headers.get("last-modified")
+        content_type = response.headers.get("content-type", "")
+        if response.status_code == 200 and "html" in content_type:
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) >= MAX_BODY_BYTES:
+                    break
+            parser = MetadataParser()
+            parser.feed(body.decode(response.encoding or "utf-8", errors="replace"))
+            result.title = parser.title
+            result.description = parser.description
+
+    async def fetch(self, client: httpx.AsyncClient, bookmark) -> CrawlResult:
+        """
+        Check a single bookmark URL.
+
+        Sends the stored ETag/Last-Modified as conditional headers and reads
+        at most MAX_BODY_BYTES of HTML to find the page metadata. Redirects
+        are followed one at a time, checking the address of each. Any error
+        is recorded in the result rather than raised, so that one bad URL
+        doesn't end the crawl.
+        """
+        result = CrawlResult(bookmark_id=bookmark.id)
+        headers = {}
+        if bookmark.etag:
+            headers["If-None-Match"] = bookmark.etag
+        if bookmark.last_modified:
+            headers["If-Modified-Since"] = bookmark.last_modified
+
+        try:
+            # Wait for the host first: a task queued behind its host's slots
+            # must not hold one of the global slots other hosts could be using
+            async with self._host_limit(bookmark.url), self._global():
+                request = client.build_request("GET", bookmark.url, headers=headers)
+                for _ in range(MAX_REDIRECTS + 1):
+                    await self._check_address(request.url)
+                    response = await client.send(request, stream=True, follow_redirects=False)
+                    try:
+                        if response.next_request is None:
+                            await self._read_metadata(response, result)
+                            break
+                        request = response.next_request
+                    finally:
+                        await response.aclose()
+                else:
+                    raise httpx.TooManyRedirects("Exceeded maximum allowed redirects", request=request)
+        except Exception as e:
+            result = CrawlResult(bookmark_id=bookmark.id, error=f"{type(e).__name__}: {e}"[:500])
+        return result
+
+    def _select_batch(self, db: Session, last_id: int, user_id: Optional[int], checked_before: Optional[datetime]):
+        query = db.query(
+            Bookmark.id, Bookmark.user_id, Bookmark.url, Bookmark.etag, Bookmark.last_modified,
+            Bookmark.description
+        ).filter(Bookmark.id > last_id, Bookmark.url.isnot(None))
+        if user_id is not None:
+            query = query.filter(Bookmark.user_id == user_id)
+        if checked_before is not None:
+            query = query.filter(or_(Bookmark.checked_at.is_(None), Bookmark.checked_at < checked_before))
+        return query.order_by(Bookmark.id).limit(self.batch_size).all()
+
+    @staticmethod
+    def _to_update(bookmark, result: CrawlResult, checked_at: datetime) -> dict:
+        values = {
+            **bookmark_key(bookmark),
+            "link_status": result.status,
+            "crawl_error": result.error,
+            "checked_at": checked_at,
+        }
+        if result.error is None and not result.not_modified:
+            values.update(
+                final_url=result.final_url,
+                page_title=result.title,
+                etag=result.etag,
+                last_modified=result.last_modified,
+            )
+        return values
+
+    async def crawl(
+        self,
+        db: Session,
+        user_id: Optional[int] = None,
+        recheck_after: Optional[timedelta] = None,
+    ) -> CrawlStats:
+        """
+        Check bookmarks in batches and write the results back.
+
+        Args:
+            db: Database session
+            user_id: Only check this user's bookmarks
+            recheck_after: Skip bookmarks checked more recently than this
+
+        Returns:
+            CrawlStats: Counts and throughput of the crawl
+        """
+        self._global_limit = asyncio.Semaphore(self.concurrency)
+        self._host_limits = {}
+        checked_before = datetime.now(UTC) - recheck_after if recheck_after else None
+        stats = CrawlStats()
+
+        client = self.client or httpx.AsyncClient(
+            timeout=self.timeout,
+            headers={"User-Agent": CRAWL_USER_AGENT},
+            limits=httpx.Limits(max_connections=self.concurrency),
+        )
+        try:
+            last_id = 0
+            while True:
+                batch = self._select_batch(db, last_id, user_id, checked_before)
+                if not batch:
+                    break
+                last_id = batch[-1].id
+
+                results = await asyncio.gather(*(self.fetch(client, bookmark) for bookmark in batch))
+                checked_at = datetime.now(UTC)
+                db.execute(update(Bookmark), [
+                    self._to_update(bookmark, result, checked_at)
+                    for bookmark, result in zip(batch, results)
+                ])
+                descriptions = [
+                    {"b_id": bookmark.id, "b_user_id": bookmark.user_id, "b_description": result.description}
+                    for bookmark, result in zip(batch, results)
+                    if result.error is None and result.description and not bookmark.description
+                ]
+                if descriptions:
+                    db.execute(_FILL_DESCRIPTION, descriptions)
+                db.commit()
+                for bookmark, result in zip(batch, results):
+                    bookmark_cache.invalidate(bookmark.user_id, bookmark.id)
+                    stats.record(result)
+                publish_bookmarks(db, "bookmark.updated", [bookmark.id for bookmark in batch])
+        finally:
+            if self.client is None:
+                await client.aclose()
+
+        stats.finished = time.perf_counter()
+        return stats
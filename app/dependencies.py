@@ -1,10 +1,20 @@
+import time
 from fastapi import Depends
 from sqlalchemy.orm import Session
 from app.database import SessionLocal
+from app.loadshed import load_shedder
 
 def get_db():
     db = SessionLocal()
     try:
+        # Check out the connection up front so the pool wait can feed load
+        # shedding; a checkout that times out is recorded too, as the
+        # strongest overload signal there is
+        start = time.perf_counter()
+        try:
+            db.connection()
+        finally:
+            load_shedder.record_pool_wait(time.perf_counter() - start)
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
\ No newline at end of file
@@ -0,0 +1,199 @@
+"""
+Structured event logging.
+
+Handlers call `log_event`, which only puts the log record on a bounded queue.
+A `QueueListener` thread formats the records as JSON lines and writes them,
+so request handlers never wait for file or stdout I/O.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+from datetime import datetime, UTC
+from typing import Dict, Iterable, Optional
+
+from app.config import (
+    EVENT_LOG_LEVEL,
+    EVENT_LOG_FILE,
+    EVENT_LOG_QUEUE_SIZE,
+    EVENT_SAMPLE_RATES,
+    SLOW_REQUEST_MS,
+)
+
+logger = logging.getLogger("app.events")
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse "event=rate,event=rate" into a dict.
+    """
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            event, rate = item.split("=", 1)
+            rates[event.strip()] = min(max(float(rate), 0.0), 1.0)
+    return rates
+
+
+class EventSampler:
+    """
+    Keep a configured fraction of each event; unlisted events are always kept.
+    """
+
+    def __init__(self, rates: Optional[Dict[str, float]] = None, rng: random.Random = None):
+        self.rates = rates or {}
+        self._random = (rng or random.Random()).random
+
+    def keep(self, event: str) -> bool:
+        rate = self.rates.get(event)
+        return rate is None or self._random() < rate
+
+
+sampler = EventSampler(parse_sample_rates(EVENT_SAMPLE_RATES))
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format event records as one JSON object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, UTC).isoformat(),
+            "level": record.levelname,
+            "event": record.getMessage(),
+        }
+        payload.update(getattr(record, "event_fields", {}))
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queue handler that drops records instead of blocking when the queue is full
+    and leaves all formatting to the listener thread.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Event records carry their data in `event_fields`, not in args, so they
+        # can be handed over as is
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_event_logging(handler: Optional[logging.Handler] = None) -> logging.handlers.QueueListener:
+    """
+    Route event records through a bounded queue to `handler`, written by a background thread.
+
+    Args:
+        handler: Destination handler; defaults to EVENT_LOG_FILE or stdout
+
+    Returns:
+        QueueListener: The started listener
+    """
+    global _queue_handler, _listener
+    shutdown_event_logging()
+
+    if handler is None:
+        handler = logging.FileHandler(EVENT_LOG_FILE) if EVENT_LOG_FILE else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=EVENT_LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+
+    logger.addHandler(_queue_handler)
+    logger.setLevel(EVENT_LOG_LEVEL)
+    logger.propagate = False
+    _listener.start()
+    return _listener
+
+
+def shutdown_event_logging() -> None:
+    """
+    Flush queued events and detach the queue handler.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _queue_handler is not None:
+        logger.removeHandler(_queue_handler)
+        _queue_handler = None
+    logger.propagate = True
+
+
+def dropped_events() -> int:
+    """
+    Number of events dropped because the queue was full.
+    """
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:
+    """
+    Emit a structured event, e.g. log_event("bookmark.created", user_id=1, bookmark_id=2).
+
+    Cheap when the level is disabled or the event is sampled out.
+    """
+    if logger.isEnabledFor(level) and sampler.keep(event):
+        # Build the record directly; logger.log would walk the stack to find the caller
+        record = logger.makeRecord(logger.name, level, "", 0, event, None, None, extra={"event_fields": fields})
+        logger.handle(record)
+
+
+class RequestTimingMiddleware:
+    """
+    ASGI middleware logging a "request.slow" event for requests slower than SLOW_REQUEST_MS.
+    Long-lived streams are listed in `exempt_paths`.
+    """
+
+    def __init__(self, app, threshold_ms: float = SLOW_REQUEST_MS, exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.threshold = threshold_ms / 1000
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            if duration > self.threshold:
+                log_event(
+                    "request.slow",
+                    level=logging.WARNING,
+                    method=scope["method"],
+                    path=scope["path"],
+                    status=status_code,
+                    duration_ms=round(duration * 1000, 1),
+                )
@@ -0,0 +1,128 @@
+"""
+Bookmark file parsing for imports.
+
+Reads the formats produced by the export (app/export.py): Netscape bookmark
+files as written by browsers, CSV with a header row and NDJSON. Files are
+read incrementally and rows are yielded lazily as dicts with title, url,
+description and tags; validation is left to the caller.
+"""
+import csv
+import io
+import json
+from collections import deque
+from html.parser import HTMLParser
+from typing import BinaryIO, Deque, Dict, Iterator, List, Optional, Union
+
+# Characters of an HTML file fed to the parser at a time
+HTML_CHUNK_CHARS = 64 * 1024
+
+
+class NetscapeBookmarkParser(HTMLParser):
+    """
+    Collect the links of a Netscape bookmark file (<DT><A HREF=...>title</A>,
+    optionally followed by <DD>description).
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.bookmarks: Deque[Dict] = deque()
+        self._current: Optional[Dict] = None
+        self._text: Optional[List[str]] = None
+        self._in_link = False
+
+    def _finish_text(self):
+        if self._current is not None and self._text is not None:
+            text = " ".join("".join(self._text).split())
+            if self._in_link:
+                self._current["title"] = text
+            elif text:
+                self._current["description"] = text
+        self._text = None
+        self._in_link = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "a":
+            self._finish_text()
+            attrs = dict(attrs)
+            tags = [name for name in (attrs.get("tags") or "").split(",") if name.strip()]
+            self._current = {"title": "", "url": attrs.get("href"), "description": None, "tags": tags}
+            self.bookmarks.append(self._current)
+            self._text = []
+            self._in_link = True
+        elif tag == "dd":
+            self._finish_text()
+            self._text = []
+        elif tag in ("dt", "dl", "h3"):
+            # The next entry or folder ends a pending description
+            self._finish_text()
+            if tag == "h3":
+                # Folder descriptions don't belong to the preceding link
+                self._current = None
+
+    def handle_endtag(self, tag):
+        if tag == "a" and self._in_link:
+            self._finish_text()
+
+    def handle_data(self, data):
+        if self._text is not None:
+            self._text.append(data)
+
+    def close(self):
+        super().close()
+        self._finish_text()
+
+
+def _text(stream: BinaryIO, encoding: str = "utf-8") -> io.TextIOWrapper:
+    return io.TextIOWrapper(stream, encoding=encoding, errors="replace", newline="")
+
+
+def _parse_html(stream: BinaryIO) -> Iterator[Dict]:
+    parser = NetscapeBookmarkParser()
+    text = _text(stream)
+    while chunk := text.read(HTML_CHUNK_CHARS):
+        parser.feed(chunk)
+        # Only the newest link can still receive a description
+        while len(parser.bookmarks) > 1:
+            yield parser.bookmarks.popleft()
+    parser.close()
+    yield from parser.bookmarks
+
+
+def _parse_csv(stream: BinaryIO) -> Iterator[Dict]:
+    for row in csv.DictReader(_text(stream, "utf-8-sig")):
+        tags = row.get("tags")
+        yield {
+            "title": row.get("title") or "",
+            "url": row.get("url"),
+            "description": row.get("description") or None,
+            "tags": [name for name in tags.split(",") if name.strip()] if tags else [],
+        }
+
+
+def _parse_ndjson(stream: BinaryIO) -> Iterator[Dict]:
+    for line in _text(stream):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            item = None
+        # Unparseable lines are passed on so that they are counted as invalid
+        yield item if isinstance(item, dict) else {}
+
+
+PARSERS = {
+    "html": _parse_html,
+    "csv": _parse_csv,
+    "ndjson": _parse_ndjson,
+}
+
+
+def parse_bookmarks(data: Union[bytes, BinaryIO], format: str) -> Iterator[Dict]:
+    """
+    Parse a bookmark file, given as bytes or an open binary file, in the given
+    format ("ndjson", "csv" or "html").
+    """
+    if isinstance(data, bytes):
+        data = io.BytesIO(data)
+    return PARSERS[format](data)
@@ -0,0 +1,114 @@
+"""
+Storage for the files background jobs read and write: uploaded imports and
+produced exports.
+
+Files are written and read in chunks, so neither the API nor a worker holds a
+whole file in memory, and the jobs table only keeps their names. The local
+directory store needs the API and all workers to share JOB_FILES_DIR (one
+host, or a network volume); other deployments implement JobFileStore on top
+of a blob store (e.g. S3) and install it with `set_job_file_store`.
+"""
+import os
+import uuid
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterable, Iterator
+
+from app.config import JOB_FILES_DIR
+
+# Size of the chunks files are copied in
+CHUNK_BYTES = 1024 * 1024
+
+
+class JobFileStore(ABC):
+    """
+    Named files, written once from a stream of chunks and read back as a file.
+    """
+
+    @abstractmethod
+    def write(self, name: str, chunks: Iterable[bytes]) -> int:
+        """
+        Store the chunks under `name`. A file is only visible once complete;
+        if `chunks` raises, nothing is stored and the exception propagates.
+
+        Returns:
+            int: Number of bytes written
+        """
+
+    @abstractmethod
+    def open(self, name: str) -> BinaryIO:
+        """
+        Open a stored file for reading.
+        """
+
+    @abstractmethod
+    def delete(self, name: str) -> None:
+        """
+        Remove a file; missing files are ignored.
+        """
+
+
+class LocalJobFileStore(JobFileStore):
+    """
+    Files in a local directory, written to a temporary name and then renamed.
+    """
+
+    def __init__(self, directory: str = JOB_FILES_DIR):
+        self.directory = directory
+
+    def _path(self, name: str) -> str:
+        if os.path.basename(name) != name:
+            raise ValueError(f"Invalid job file name {name!r}")
+        return os.path.join(self.directory, name)
+
+    def write(self, name: str, chunks: Iterable[bytes]) -> int:
+        path = self._path(name)
+        partial = f"{path}.part"
+        os.makedirs(self.directory, exist_ok=True)
+        size = 0
+        try:
+            with open(partial, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(partial, path)
+        except BaseException:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        return size
+
+    def open(self, name: str) -> BinaryIO:
+        return open(self._path(name), "rb")
+
+    def delete(self, name: str) -> None:
+        try:
+            os.remove(self._path(name))
+        except FileNotFoundError:
+            pass
+
+
+store: JobFileStore = LocalJobFileStore()
+
+
+def set_job_file_store(file_store: JobFileStore) -> None:
+    """
+    Replace the file storage, e.g. with a blob store shared by API and workers.
+    """
+    global store
+    store = file_store
+
+
+def new_file_name(kind: str) -> str:
+    """
+    A unique name for a new file, e.g. "input-3f2a...".
+    """
+    return f"{kind}-{uuid.uuid4().hex}"
+
+
+def read_chunks(f: BinaryIO, size: int = CHUNK_BYTES) -> Iterator[bytes]:
+    """
+    The contents of an open file in chunks; closes the file at the end.
+    """
+    with f:
+        while chunk := f.read(size):
+            yield chunk
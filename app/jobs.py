@@ -0,0 +1,598 @@
+"""
+Durable background jobs.
+
+Jobs are rows in the `jobs` table, so they survive restarts and need nothing
+besides the database. The API enqueues a job and answers right away; workers
+(`python -m app.manage worker`, any number, on any host) lease due jobs, run
+the handler registered for the job's kind and record the outcome.
+
+A lease expires unless the handler reports progress, so the job of a crashed
+worker is picked up again by another one. Failed attempts are retried with
+exponential backoff until the job runs out of attempts. Handlers commit their
+work together with their progress in `JobContext.checkpoint`, which lets a
+retried job resume where the previous attempt stopped and is also where
+cancellation takes effect.
+
+Uploaded and produced files are kept in the job file store (app/job_files.py)
+and streamed in chunks; the jobs table only holds their names.
+"""
+import itertools
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, UTC
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app import job_files
+from app.bookmark_events import publish_bookmarks, publish_change
+from app.cache import bookmark_cache
+from app.config import (
+    JOB_POLL_INTERVAL_SECONDS,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_RETRY_MAX_SECONDS,
+    JOB_BATCH_SIZE,
+)
+from app.database import SessionLocal
+from app.event_log import log_event
+from app.export import EXPORT_COLUMNS, encode_bookmarks, gzip_stream, with_tags
+from app.importer import parse_bookmarks
+from app.models.bookmark import Bookmark
+from app.models.job import Job, QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED
+from app.models.tag import bookmark_tags
+from app.models.user import User
+from app.schemas.bookmark import BookmarkCreate
+from app.stats import record_bookmarks_created, record_bookmarks_deleted
+from app.tags import release_tags_of_bookmarks, tag_new_bookmarks
+from app.urls import url_hash
+
+# Candidates a worker looks at before giving up on a claim round
+CLAIM_ATTEMPTS = 5
+
+
+class JobCancelled(Exception):
+    """Raised at a checkpoint when cancellation of the job was requested."""
+
+
+class LeaseLost(Exception):
+    """Raised at a checkpoint when the lease expired and another worker took the job."""
+
+
+HANDLERS: Dict[str, Callable[["JobContext"], Optional[dict]]] = {}
+# Called with a session and the job when a job of the kind fails for good
+FAILURE_HANDLERS: Dict[str, Callable[[Session, Job], None]] = {}
+
+
+def job_handler(kind: str, on_failure: Optional[Callable[[Session, Job], None]] = None):
+    """
+    Register the function running jobs of `kind`.
+
+    The handler receives a JobContext and returns the job's result (a JSON
+    serializable dict or None). Exceptions make the attempt fail. `on_failure`
+    undoes what a handler leaves behind once no attempt is left.
+    """
+    def register(fn):
+        HANDLERS[kind] = fn
+        if on_failure is not None:
+            FAILURE_HANDLERS[kind] = on_failure
+        return fn
+    return register
+
+
+def enqueue(
+    db: Session,
+    kind: str,
+    user_id: Optional[int] = None,
+    payload: Optional[dict] = None,
+    input_file: Optional[str] = None,
+    max_attempts: int = JOB_MAX_ATTEMPTS,
+) -> Job:
+    """
+    Persist a new job; a worker picks it up on its next poll.
+
+    Args:
+        db: Database session
+        kind: Name of a registered handler
+        user_id: The user the job acts for
+        payload: Handler parameters
+        input_file: Name of an uploaded file in the job file store, which
+            the job owns from now on
+        max_attempts: Attempts before the job is marked as failed
+
+    Returns:
+        Job: The queued job
+    """
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind {kind!r}")
+    job = Job(kind=kind, user_id=user_id, payload=payload or {}, input_file=input_file, max_attempts=max_attempts)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    log_event("job.enqueued", job_id=job.id, kind=kind, user_id=user_id)
+    return job
+
+
+def cancel_job(db: Session, job: Job) -> Job:
+    """
+    Cancel a queued job right away, or ask the worker of a running job to stop
+    at its next checkpoint. Finished jobs are left as they are.
+    """
+    now = datetime.now(UTC)
+    cancelled = db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == QUEUED)
+        .values(status=CANCELLED, cancel_requested=True, finished_at=now)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.execute(
+        update(Job)
+        .where(Job.id == job.id, Job.status == RUNNING)
+        .values(cancel_requested=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    db.refresh(job)
+    if cancelled and job.input_file:
+        job_files.store.delete(job.input_file)
+    return job
+
+
+def retry_delay(attempts: int) -> float:
+    """
+    Seconds to wait before the next attempt: exponential backoff with jitter,
+    so that jobs failing together don't all retry at the same moment.
+    """
+    ceiling = min(JOB_RETRY_MAX_SECONDS, JOB_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return random.uniform(ceiling / 2, ceiling)
+
+
+def _claimable(now: datetime):
+    return or_(
+        and_(Job.status == QUEUED, Job.run_at <= now),
+        # The worker holding the lease stopped reporting progress
+        and_(Job.status == RUNNING, Job.locked_until < now),
+    )
+
+
+def claim_job(db: Session, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> Optional[Job]:
+    """
+    Lease the next due job for `worker_id`.
+
+    On PostgreSQL the candidate is selected FOR UPDATE SKIP LOCKED, so
+    concurrent workers pass over rows another worker is claiming instead of
+    waiting for them. SQLite has no row locks and ignores the clause; there
+    the UPDATE, which only matches while the job is still claimable, decides
+    which worker wins and the others move on to the next candidate.
+
+    Returns:
+        Optional[Job]: The leased job, or None if nothing is due
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        now = datetime.now(UTC)
+        job_id = db.execute(
+            select(Job.id)
+            .where(_claimable(now))
+            .order_by(Job.run_at, Job.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        ).scalar()
+        if job_id is None:
+            db.rollback()
+            return None
+
+        result = db.execute(
+            update(Job)
+            .where(Job.id == job_id, _claimable(now))
+            .values(
+                status=RUNNING,
+                locked_by=worker_id,
+                locked_until=now + timedelta(seconds=lease_seconds),
+                attempts=Job.attempts + 1,
+                started_at=func.coalesce(Job.started_at, now),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+        if result.rowcount:
+            return db.get(Job, job_id)
+    return None
+
+
+class JobContext:
+    """
+    What a handler gets to work with: the session, the job and checkpoints.
+    """
+
+    def __init__(self, db: Session, job: Job, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS):
+        self.db = db
+        self.job = job
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        # Set by handlers producing a file: its name in the job file store
+        self.output_file: Optional[str] = None
+
+    def _owned(self):
+        return update(Job).where(
+            Job.id == self.job.id, Job.locked_by == self.worker_id, Job.status == RUNNING
+        ).execution_options(synchronize_session=False)
+
+    def checkpoint(
+        self,
+        progress: int,
+        total: Optional[int] = None,
+        result: Optional[dict] = None,
+        committed: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Record progress and renew the lease, committing the handler's pending
+        work in the same transaction. `committed` is called once it is
+        committed (also when cancellation is raised), e.g. to publish it.
+
+        Raises:
+            JobCancelled: Cancellation was requested; the work so far is committed
+            LeaseLost: Another worker took the job over; nothing is committed
+        """
+        values = {
+            "progress": progress,
+            "locked_until": datetime.now(UTC) + timedelta(seconds=self.lease_seconds),
+        }
+        if total is not None:
+            values["total"] = total
+        if result is not None:
+            values["result"] = result
+        if not self.db.execute(self._owned().values(**values)).rowcount:
+            self.db.rollback()
+            raise LeaseLost()
+        cancel_requested = self.db.execute(
+            select(Job.cancel_requested).where(Job.id == self.job.id)
+        ).scalar()
+        self.db.commit()
+        if committed is not None:
+            committed()
+        if cancel_requested:
+            raise JobCancelled()
+
+    def finish(self, status: str, **values) -> bool:
+        """
+        Move the job to its next state if this worker still holds the lease.
+        """
+        values.update(status=status, locked_by=None, locked_until=None)
+        finished = status in (SUCCEEDED, FAILED, CANCELLED)
+        if finished:
+            values["finished_at"] = datetime.now(UTC)
+        owned = self.db.execute(self._owned().values(**values)).rowcount
+        self.db.commit()
+        if owned and finished and self.job.input_file:
+            # No further attempt will read the upload
+            job_files.store.delete(self.job.input_file)
+        return bool(owned)
+
+
+def run_job(db: Session, job: Job, worker_id: str, lease_seconds: int = JOB_LEASE_SECONDS) -> str:
+    """
+    Run a leased job and record the outcome.
+
+    Returns:
+        str: The job's status afterwards (queued again when it will be retried)
+    """
+    ctx = JobContext(db, job, worker_id, lease_seconds)
+    job_id, kind, attempts, max_attempts = job.id, job.kind, job.attempts, job.max_attempts
+    start = time.perf_counter()
+
+    def event(name, level=logging.INFO, **fields):
+        log_event(
+            name, level=level, job_id=job_id, kind=kind, attempt=attempts,
+            duration_ms=round((time.perf_counter() - start) * 1000, 1), **fields
+        )
+
+    def fail(error: str) -> str:
+        if ctx.finish(FAILED, error=error) and kind in FAILURE_HANDLERS:
+            FAILURE_HANDLERS[kind](db, db.get(Job, job_id))
+        return FAILED
+
+    if attempts > max_attempts:
+        # Leases kept expiring, e.g. because the job crashes its worker
+        fail("Worker lease expired too often")
+        event("job.failed", level=logging.ERROR, error="lease expired")
+        return FAILED
+
+    handler = HANDLERS.get(kind)
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind {kind!r}")
+        result = handler(ctx)
+    except JobCancelled:
+        ctx.finish(CANCELLED)
+        event("job.cancelled")
+        return CANCELLED
+    except LeaseLost:
+        event("job.lease_lost", level=logging.WARNING)
+        return RUNNING
+    except Exception as e:
+        db.rollback()
+        error = f"{type(e).__name__}: {e}"
+        if db.get(Job, job_id).cancel_requested:
+            ctx.finish(CANCELLED, error=error)
+            event("job.cancelled")
+            return CANCELLED
+        if handler is None or attempts >= max_attempts:
+            fail(error)
+            event("job.failed", level=logging.ERROR, error=error)
+            return FAILED
+        delay = retry_delay(attempts)
+        ctx.finish(QUEUED, error=error, run_at=datetime.now(UTC) + timedelta(seconds=delay))
+        event("job.retry", level=logging.WARNING, error=error, retry_in_s=round(delay, 1))
+        return QUEUED
+
+    values = {"result": result}
+    if ctx.output_file is not None:
+        values["output_file"] = ctx.output_file
+    if not ctx.finish(SUCCEEDED, error=None, **values) and ctx.output_file is not None:
+        job_files.store.delete(ctx.output_file)
+    event("job.succeeded")
+    return SUCCEEDED
+
+
+class Worker:
+    """
+    Poll for due jobs and run them one at a time.
+
+    Run several worker processes for parallelism. `stop()` lets the current
+    job finish (or reach its next checkpoint) before the worker exits.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[], Session] = SessionLocal,
+        worker_id: Optional[str] = None,
+        poll_interval: float = JOB_POLL_INTERVAL_SECONDS,
+        lease_seconds: int = JOB_LEASE_SECONDS,
+    ):
+        self.session_factory = session_factory
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._stopping = threading.Event()
+
+    def run_once(self) -> Optional[str]:
+        """
+        Claim and run one job.
+
+        Returns:
+            Optional[str]: The job's status afterwards, None if no job was due
+        """
+        db = self.session_factory()
+        try:
+            job = claim_job(db, self.worker_id, self.lease_seconds)
+            if job is None:
+                return None
+            return run_job(db, job, self.worker_id, self.lease_seconds)
+        finally:
+            db.close()
+
+    def run(self, burst: bool = False) -> int:
+        """
+        Process jobs until stopped, or in burst mode until none is due.
+
+        Returns:
+            int: Number of attempts run
+        """
+        processed = 0
+        while not self._stopping.is_set():
+            if self.run_once() is not None:
+                processed += 1
+            elif burst:
+                break
+            else:
+                self._stopping.wait(self.poll_interval)
+        return processed
+
+    def stop(self) -> None:
+        self._stopping.set()
+
+
+def _batches(items: Iterable, size: int) -> Iterator[List]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+@job_handler("import_bookmarks")
+def import_bookmarks(ctx: JobContext) -> dict:
+    """
+    Import an uploaded bookmark file (payload: format, skip_duplicates).
+
+    The file is parsed while it is read, and each batch is committed with the
+    number of rows consumed so far, so a retry skips what an earlier attempt
+    already imported. The total is known once the whole file has been read.
+    """
+    db, job = ctx.db, ctx.job
+    user_id = job.user_id
+    skip_duplicates = job.payload.get("skip_duplicates", True)
+    counts = {"imported": 0, "duplicates": 0, "invalid": 0, **(job.result or {})}
+    done = job.progress
+    ctx.checkpoint(done)
+
+    with job_files.store.open(job.input_file) as f:
+        rows = parse_bookmarks(f, job.payload["format"])
+        # Rows imported by an earlier attempt are parsed again but skipped;
+        # the checkpoints keep the lease while that takes
+        for _ in _batches(itertools.islice(rows, done), JOB_BATCH_SIZE):
+            ctx.checkpoint(done)
+
+        for batch in _batches(rows, JOB_BATCH_SIZE):
+            valid = []
+            for row in batch:
+                try:
+                    valid.append(BookmarkCreate.model_validate(row))
+                except ValidationError:
+                    counts["invalid"] += 1
+
+            if skip_duplicates:
+                hashes = {str(data.url): url_hash(str(data.url)) for data in valid}
+                seen = set(db.execute(
+                    select(Bookmark.url_hash)
+                    .where(Bookmark.user_id == user_id, Bookmark.url_hash.in_(set(hashes.values())))
+                ).scalars())
+                unique = []
+                for data in valid:
+                    digest = hashes[str(data.url)]
+                    if digest in seen:
+                        counts["duplicates"] += 1
+                        continue
+                    seen.add(digest)
+                    unique.append(data)
+                valid = unique
+
+            tagged = [
+                (Bookmark(title=data.title, description=data.description, url=str(data.url), user_id=user_id), data.tags)
+                for data in valid
+            ]
+            db.add_all(bookmark for bookmark, _ in tagged)
+            db.flush()
+            tag_new_bookmarks(db, user_id, tagged)
+            record_bookmarks_created(db, [bookmark for bookmark, _ in tagged])
+            counts["imported"] += len(tagged)
+            done += len(batch)
+            ids = [bookmark.id for bookmark, _ in tagged]
+            ctx.checkpoint(done, result=counts, committed=lambda: publish_bookmarks(db, "bookmark.created", ids))
+
+    ctx.checkpoint(done, total=done)
+    return counts
+
+
+@job_handler("export_bookmarks")
+def export_bookmarks(ctx: JobContext) -> dict:
+    """
+    Write a user's bookmarks to a gzip compressed file in the job file store
+    (payload: format).
+
+    Pages are read by id instead of from one long-running cursor, as a
+    checkpoint commits between them, and compressed chunks go to the file as
+    they are produced.
+    """
+    db, job = ctx.db, ctx.job
+    user_id = job.user_id
+    total = db.execute(select(func.count()).select_from(Bookmark).where(Bookmark.user_id == user_id)).scalar()
+    ctx.checkpoint(0, total=total)
+    exported = 0
+
+    def rows():
+        nonlocal exported
+        last_id = 0
+        while True:
+            page = db.execute(
+                select(*(getattr(Bookmark, column) for column in EXPORT_COLUMNS))
+                .where(Bookmark.user_id == user_id, Bookmark.id > last_id)
+                .order_by(Bookmark.id)
+                .limit(JOB_BATCH_SIZE)
+            ).all()
+            if not page:
+                return
+            yield from page
+            exported += len(page)
+            last_id = page[-1].id
+            ctx.checkpoint(exported)
+
+    name = job_files.new_file_name("export")
+    size = job_files.store.write(name, gzip_stream(encode_bookmarks(with_tags(db, rows()), job.payload["format"])))
+    ctx.output_file = name
+    return {"exported": exported, "bytes": size}
+
+
+def _reactivate_user(db: Session, job: Job) -> None:
+    """
+    Give a user whose deletion stopped half way their account back, so they
+    can use it and request the deletion again.
+    """
+    user = db.get(User, job.user_id)
+    if user is not None:
+        user.is_active = True
+        db.commit()
+    bookmark_cache.invalidate_user(job.user_id)
+
+
+@job_handler("delete_user", on_failure=_reactivate_user)
+def delete_user(ctx: JobContext) -> dict:
+    """
+    Delete a user and all of their data in batches.
+
+    The account is deactivated first, which ends its sessions and refuses new
+    logins meanwhile, and reactivated if the job is cancelled or fails for
+    good. Each batch uncounts its bookmarks from the statistics and tag counts
+    in the same transaction, so a stopped deletion leaves them matching the
+    bookmarks that are left. The user's other jobs and their files are
+    removed with the user: job rows are not tied to the user row, and a new
+    account could otherwise end up with the same id.
+    """
+    db, job = ctx.db, ctx.job
+    user_id = job.user_id
+    deleted = job.progress
+    user = db.get(User, user_id)
+    if user is None:
+        return {"deleted_bookmarks": deleted}
+    user.is_active = False
+    remaining = db.execute(select(func.count()).select_from(Bookmark).where(Bookmark.user_id == user_id)).scalar()
+    ctx.checkpoint(deleted, total=deleted + remaining)
+
+    try:
+        while True:
+            batch = db.execute(
+                select(Bookmark.id, Bookmark.user_id, Bookmark.url, Bookmark.created_at)
+                .where(Bookmark.user_id == user_id)
+                .limit(JOB_BATCH_SIZE)
+            ).all()
+            if not batch:
+                break
+            ids = [row.id for row in batch]
+            record_bookmarks_deleted(db, batch)
+            release_tags_of_bookmarks(db, ids)
+            db.execute(delete(bookmark_tags).where(bookmark_tags.c.bookmark_id.in_(ids)))
+            db.execute(
+                delete(Bookmark)
+                .where(Bookmark.user_id == user_id, Bookmark.id.in_(ids))
+                .execution_options(synchronize_session=False)
+            )
+            deleted += len(ids)
+
+            def publish_deleted():
+                for bookmark_id in ids:
+                    publish_change(user_id, "bookmark.deleted", {"id": bookmark_id})
+
+            ctx.checkpoint(deleted, result={"deleted_bookmarks": deleted}, committed=publish_deleted)
+    except JobCancelled:
+        _reactivate_user(db, job)
+        raise
+
+    other_jobs = db.execute(
+        select(Job.id, Job.input_file, Job.output_file).where(Job.user_id == user_id, Job.id != job.id)
+    ).all()
+    db.execute(
+        delete(Job)
+        .where(Job.id.in_([other.id for other in other_jobs]))
+        .execution_options(synchronize_session=False)
+    )
+    # Tags, refresh tokens and statistics go with the user
+    db.delete(db.get(User, user_id))
+    db.commit()
+    for other in other_jobs:
+        for name in (other.input_file, other.output_file):
+            if name is not None:
+                job_files.store.delete(name)
+    bookmark_cache.invalidate_user(user_id)
+    log_event("user.deleted", user_id=user_id)
+    return {"deleted_bookmarks": deleted}
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import threading
+from typing import Iterable
+
+from app.config import (
+    MAX_CONCURRENT_REQUESTS,
+    MIN_CONCURRENT_REQUESTS,
+    LOAD_SHED_POOL_WAIT_MS,
+    LOAD_SHED_LOOP_LAG_MS,
+    LOAD_SHED_RETRY_AFTER_SECONDS,
+)
+
+# Weight of the newest sample in the moving averages
+EWMA_ALPHA = 0.2
+# Multiplicative decrease applied to the limit while overloaded
+DECREASE_FACTOR = 0.9
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD concurrency limit driven by DB pool wait time and event loop lag.
+
+    Every sample updates an exponential moving average. While either average
+    is above its threshold the limit shrinks multiplicatively, otherwise it
+    grows by one per sample up to `max_limit`. Requests arriving while
+    `in_flight` is at the limit are shed.
+    """
+
+    def __init__(
+        self,
+        min_limit: int = MIN_CONCURRENT_REQUESTS,
+        max_limit: int = MAX_CONCURRENT_REQUESTS,
+        pool_wait_threshold: float = LOAD_SHED_POOL_WAIT_MS / 1000,
+        loop_lag_threshold: float = LOAD_SHED_LOOP_LAG_MS / 1000,
+        retry_after: int = LOAD_SHED_RETRY_AFTER_SECONDS,
+    ):
+        self.min_limit = max(min_limit, 1)
+        self.max_limit = max(max_limit, self.min_limit)
+        self.pool_wait_threshold = pool_wait_threshold
+        self.loop_lag_threshold = loop_lag_threshold
+        self.retry_after = retry_after
+        self.limit = self.max_limit
+        self.in_flight = 0
+        self.pool_wait = 0.0
+        self.loop_lag = 0.0
+        self.shed_count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def overloaded(self) -> bool:
+        return self.pool_wait > self.pool_wait_threshold or self.loop_lag > self.loop_lag_threshold
+
+    def record_pool_wait(self, seconds: float) -> None:
+        """
+        Record how long a request waited for a pooled DB connection.
+        """
+        with self._lock:
+            self.pool_wait += EWMA_ALPHA * (seconds - self.pool_wait)
+            self._adjust()
+
+    def record_loop_lag(self, seconds: float) -> None:
+        """
+        Record how late the event loop woke up a sleeping task.
+        """
+        with self._lock:
+            self.loop_lag += EWMA_ALPHA * (seconds - self.loop_lag)
+            self._adjust()
+
+    def _adjust(self) -> None:
+        if self.overloaded:
+            self.limit = max(self.min_limit, int(self.limit * DECREASE_FACTOR))
+        else:
+            self.limit = min(self.max_limit, self.limit + 1)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= self.limit:
+                self.shed_count += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "overloaded": self.overloaded,
+                "pool_wait_ms": round(self.pool_wait * 1000, 3),
+                "loop_lag_ms": round(self.loop_lag * 1000, 3),
+                "shed_count": self.shed_count,
+            }
+
+
+load_shedder = AdaptiveConcurrencyLimiter()
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware answering 503 with `Retry-After` when the limiter is full.
+
+    Requests to `exempt_paths` bypass the limiter: long-lived streams would
+    otherwise hold a slot for as long as they are open.
+    """
+
+    def __init__(self, app, limiter: AdaptiveConcurrencyLimiter = load_shedder, exempt_paths: Iterable[str] = ()):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = frozenset(exempt_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.limiter.try_acquire():
+            body = json.dumps({"detail": "Server overloaded, retry later"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(self.limiter.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+
+async def monitor_loop_lag(limiter: AdaptiveConcurrencyLimiter = load_shedder, interval: float = 0.1) -> None:
+    """
+    Measure event loop lag by checking how late a fixed sleep wakes up.
+    Runs until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        limiter.record_loop_lag(max(loop.time() - start - interval, 0.0))
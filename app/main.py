@@ -1,14 +1,43 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import users, bookmarks
+from app.api import users, bookmarks, metrics, jobs, admin
 from app.auth import routes as auth_routes
 from app.database import engine
+from app.migrations import upgrade_schema
 from app.models import user
+from app.ratelimit import enforce_rate_limit
+from app.loadshed import LoadSheddingMiddleware, monitor_loop_lag
+from app.event_log import RequestTimingMiddleware, setup_event_logging, shutdown_event_logging
+from app.profiling import profile_request, stack_sampler
+from app.config import SAMPLER_ENABLED
 
-# Create database tables
+# Create database tables, and add columns introduced since they were created
 user.Base.metadata.create_all(bind=engine)
+upgrade_schema(engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_event_logging()
+    # Feed event loop lag into the load shedder while the app is running
+    lag_monitor = asyncio.create_task(monitor_loop_lag())
+    if SAMPLER_ENABLED:
+        stack_sampler.start()
+    yield
+    stack_sampler.stop()
+    lag_monitor.cancel()
+    shutdown_event_logging()
+
+app = FastAPI(lifespan=lifespan)
+
+# Server-sent event streams and exports stay open for minutes; they are
+# neither counted by the load shedder nor logged as slow requests
+STREAMING_PATHS = ("/bookmarks/events", "/bookmarks/export")
+
+# Shed load before any work is done for the request
+# (added first so CORS headers still wrap the 503 responses)
+app.add_middleware(LoadSheddingMiddleware, exempt_paths=STREAMING_PATHS)
 
 # Add CORS middleware
 app.add_middleware(
@@ -19,11 +48,31 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Log slow requests, including time spent in the other middleware
+app.add_middleware(RequestTimingMiddleware, exempt_paths=STREAMING_PATHS)
+
 # Include routers
-app.include_router(users.router, prefix="/users", tags=["users"])
-app.include_router(bookmarks.router, prefix="/bookmarks", tags=["bookmarks"])
-app.include_router(auth_routes.router, prefix="/auth", tags=["auth"])
+# (profile_request lets admins profile single requests, see app/profiling.py)
+app.include_router(users.router, prefix="/users", tags=["users"], dependencies=[Depends(profile_request)])
+app.include_router(
+    bookmarks.router,
+    prefix="/bookmarks",
+    tags=["bookmarks"],
+    dependencies=[Depends(profile_request), Depends(enforce_rate_limit)],
+)
+app.include_router(
+    jobs.router,
+    prefix="/jobs",
+    tags=["jobs"],
+    dependencies=[Depends(profile_request), Depends(enforce_rate_limit)],
+)
+app.include_router(auth_routes.router, prefix="/auth", tags=["auth"], dependencies=[Depends(profile_request)])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Bookmark Manager API"}
+
+# Let the stack sampler attribute samples to the routes above
+stack_sampler.attach(app)
@@ -0,0 +1,221 @@
+"""
+Maintenance commands.
+
+Usage:
+    python -m app.manage <command> [options]
+"""
+import argparse
+import asyncio
+import json
+import signal
+from datetime import datetime, timedelta, UTC
+
+from sqlalchemy import delete, or_, update
+from sqlalchemy.orm import Session
+
+from app.config import BOOKMARK_PARTITIONS
+from app.database import SessionLocal, engine
+from app.models.bookmark import Bookmark, bookmark_key
+from app.models.refresh_token import RefreshToken
+from app.models.user import User
+from app.urls import url_hash
+from app.crawler import Crawler
+from app.stats import rebuild_stats
+from app.jobs import Worker
+from app.partitioning import convert_to_partitioned
+from app.migrations import upgrade_schema
+from app.event_log import setup_event_logging, shutdown_event_logging
+
+
+def migrate() -> None:
+    """
+    Add columns and indexes introduced since the database was created.
+    """
+    for statement in upgrade_schema(engine):
+        print(statement)
+    print("Schema is up to date")
+
+
+def _url_hash_or_none(url: str):
+    # Legacy rows may hold URLs that can't be canonicalized (e.g. a bad
+    # port); they stay without a hash and are never reported as duplicates
+    try:
+        return url_hash(url) if url else None
+    except ValueError:
+        return None
+
+
+def backfill_url_hashes(db: Session, batch_size: int = 1000) -> int:
+    """
+    Compute the canonical URL hash for bookmarks saved before it existed.
+    Run `migrate` first to add the column.
+
+    Args:
+        db: Database session
+        batch_size: Number of bookmarks updated per transaction
+
+    Returns:
+        int: Number of bookmarks updated
+    """
+    updated = 0
+    last_id = 0
+    while True:
+        rows = (
+            db.query(Bookmark.id, Bookmark.user_id, Bookmark.url)
+            .filter(Bookmark.id > last_id, Bookmark.url_hash.is_(None))
+            .order_by(Bookmark.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            break
+        db.execute(update(Bookmark), [
+            {**bookmark_key(row), "url_hash": _url_hash_or_none(row.url)}
+            for row in rows
+        ])
+        db.commit()
+        updated += len(rows)
+        last_id = rows[-1].id
+    return updated
+
+
+def prune_refresh_tokens(db: Session, revoked_for: timedelta = timedelta(days=1)) -> int:
+    """
+    Delete expired refresh tokens and tokens revoked more than `revoked_for` ago.
+
+    Revoked tokens are kept for a while so that replaying one is still
+    recognized as reuse.
+
+    Returns:
+        int: Number of tokens deleted
+    """
+    now = datetime.now(UTC)
+    result = db.execute(
+        delete(RefreshToken).where(or_(
+            RefreshToken.expires_at <= now,
+            RefreshToken.revoked_at <= now - revoked_for,
+        ))
+    )
+    db.commit()
+    return result.rowcount
+
+
+def grant_admin(db: Session, username: str, revoke: bool = False) -> bool:
+    """
+    Give a user access to the /admin routes, or take it away.
+
+    Returns:
+        bool: Whether the user exists
+    """
+    result = db.execute(update(User).where(User.username == username).values(is_admin=not revoke))
+    db.commit()
+    return result.rowcount == 1
+
+
+def run_worker(burst: bool = False, poll_interval: float = None) -> None:
+    """
+    Run jobs until SIGINT/SIGTERM; the current job finishes (or reaches its
+    next checkpoint) before the worker exits.
+    """
+    options = {"poll_interval": poll_interval} if poll_interval else {}
+    worker = Worker(**options)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: worker.stop())
+    setup_event_logging()
+    try:
+        processed = worker.run(burst=burst)
+    finally:
+        shutdown_event_logging()
+    print(f"Worker {worker.worker_id} ran {processed} jobs")
+
+
+def partition_bookmarks(partitions: int, batch_size: int) -> None:
+    """
+    Convert the plain bookmarks table into a hash partitioned one (PostgreSQL).
+    """
+    try:
+        copied = convert_to_partitioned(
+            engine,
+            Bookmark.__table__,
+            partitions,
+            batch_size=batch_size,
+            progress=lambda done: print(f"Copied {done} bookmarks", flush=True),
+        )
+    except ValueError as e:
+        raise SystemExit(str(e))
+    print(f"Moved {copied} bookmarks into {partitions} partitions; the old table is kept as bookmarks_unpartitioned")
+    if partitions != BOOKMARK_PARTITIONS:
+        print(f"Set BOOKMARK_PARTITIONS={partitions} before restarting the application")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m app.manage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="Add columns and indexes missing from existing tables")
+
+    backfill = commands.add_parser("backfill-url-hashes", help="Hash URLs of existing bookmarks")
+    backfill.add_argument("--batch-size", type=int, default=1000)
+
+    crawl = commands.add_parser("crawl", help="Check bookmark links and fetch page titles")
+    crawl.add_argument("--user-id", type=int, help="Only crawl this user's bookmarks")
+    crawl.add_argument("--recheck-after-hours", type=float, help="Skip bookmarks checked more recently")
+    crawl.add_argument("--concurrency", type=int)
+    crawl.add_argument("--per-host", type=int)
+
+    commands.add_parser("prune-refresh-tokens", help="Delete expired and long revoked refresh tokens")
+
+    rebuild = commands.add_parser("rebuild-stats", help="Recompute per-user bookmark statistics")
+    rebuild.add_argument("--user-id", type=int, help="Only rebuild this user's statistics")
+    rebuild.add_argument("--batch-size", type=int, default=1000)
+
+    admin = commands.add_parser("grant-admin", help="Allow a user to use the admin routes")
+    admin.add_argument("username")
+    admin.add_argument("--revoke", action="store_true", help="Take admin rights away instead")
+
+    worker = commands.add_parser("worker", help="Run background jobs")
+    worker.add_argument("--burst", action="store_true", help="Exit once no job is due")
+    worker.add_argument("--poll-interval", type=float, help="Seconds between polls of an empty queue")
+
+    partition = commands.add_parser("partition-bookmarks", help="Hash partition the bookmarks table by user (PostgreSQL)")
+    partition.add_argument("--partitions", type=int, default=BOOKMARK_PARTITIONS or 16)
+    partition.add_argument("--batch-size", type=int, default=10000)
+
+    args = parser.parse_args(argv)
+    if args.command == "migrate":
+        migrate()
+        return
+    if args.command == "worker":
+        run_worker(args.burst, args.poll_interval)
+        return
+    if args.command == "partition-bookmarks":
+        partition_bookmarks(args.partitions, args.batch_size)
+        return
+    db = SessionLocal()
+    try:
+        if args.command == "backfill-url-hashes":
+            print(f"Updated {backfill_url_hashes(db, args.batch_size)} bookmarks")
+        elif args.command == "crawl":
+            options = {}
+            if args.concurrency:
+                options["concurrency"] = args.concurrency
+            if args.per_host:
+                options["per_host"] = args.per_host
+            recheck_after = timedelta(hours=args.recheck_after_hours) if args.recheck_after_hours else None
+            stats = asyncio.run(Crawler(**options).crawl(db, user_id=args.user_id, recheck_after=recheck_after))
+            print(json.dumps(stats.as_dict()))
+        elif args.command == "prune-refresh-tokens":
+            print(f"Deleted {prune_refresh_tokens(db)} refresh tokens")
+        elif args.command == "grant-admin":
+            if not grant_admin(db, args.username, args.revoke):
+                raise SystemExit(f"No user named {args.username!r}")
+            action = "Revoked admin rights of" if args.revoke else "Granted admin rights to"
+            print(f"{action} {args.username}")
+        elif args.command == "rebuild-stats":
+            print(f"Rebuilt statistics of {rebuild_stats(db, args.user_id, args.batch_size)} users")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
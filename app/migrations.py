@@ -0,0 +1,72 @@
+"""
+Schema upgrades for databases created by an earlier version.
+
+`Base.metadata.create_all` creates missing tables but never alters existing
+ones, so columns and indexes later added to an existing table are listed in
+UPGRADES. `upgrade_schema` adds whichever of them the database lacks; it runs
+at startup after create_all and as `python -m app.manage migrate`, and does
+nothing on an up to date (or freshly created) database.
+"""
+from typing import List, Optional, Sequence, Tuple
+
+from sqlalchemy import MetaData, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from app.database import Base
+
+# (table, columns, indexes), oldest first. New NOT NULL columns need a
+# server_default so that existing rows can be filled in.
+UPGRADES: List[Tuple[str, Sequence[str], Sequence[str]]] = [
+    # Canonical URL hash for duplicate detection, filled by backfill-url-hashes
+    ("bookmarks", ("url_hash",), ("ix_bookmarks_user_id_url_hash",)),
+    # Link health and page metadata, filled by the crawler
+    (
+        "bookmarks",
+        ("link_status", "final_url", "page_title", "etag", "last_modified", "crawl_error", "checked_at"),
+        (),
+    ),
+    # When a bookmark was saved, for the activity statistics; NULL for older rows
+    ("bookmarks", ("created_at",), ()),
+    # Administrators; existing users are not
+    ("users", ("is_admin",), ()),
+    # Job uploads and outputs moved from the table to the job file store
+    ("jobs", ("input_file", "output_file"), ()),
+]
+
+
+def upgrade_schema(engine: Engine, metadata: Optional[MetaData] = None) -> List[str]:
+    """
+    Add the columns and indexes in UPGRADES that existing tables lack.
+
+    Args:
+        engine: Engine of the database to upgrade
+        metadata: Metadata holding the tables (defaults to the models')
+
+    Returns:
+        list: The DDL statements that were run
+    """
+    metadata = metadata if metadata is not None else Base.metadata
+    applied = []
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table_name, columns, indexes in UPGRADES:
+            if not inspector.has_table(table_name):
+                continue  # create_all creates it with every column
+            table = metadata.tables[table_name]
+            existing_columns = {column["name"] for column in inspector.get_columns(table_name)}
+            existing_indexes = {index["name"] for index in inspector.get_indexes(table_name)}
+            statements = [
+                f"ALTER TABLE {table.name} ADD COLUMN {CreateColumn(table.c[name]).compile(dialect=conn.dialect)}"
+                for name in columns
+                if name not in existing_columns
+            ]
+            statements += [
+                str(CreateIndex(index).compile(dialect=conn.dialect))
+                for index in table.indexes
+                if index.name in indexes and index.name not in existing_indexes
+            ]
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            applied += statements
+    return applied
@@ -1,16 +1,70 @@
-from sqlalchemy import Column, Integer, String, ForeignKey
-from sqlalchemy.orm import relationship
+from datetime import datetime, UTC
+from sqlalchemy import Column, Integer, String, ForeignKey, LargeBinary, Index, DateTime
+from sqlalchemy.orm import foreign, relationship, validates
+from app.config import BOOKMARK_PARTITIONS
 from app.database import Base
+from app.models.tag import Tag, bookmark_tags
+from app.partitioning import BOOKMARKS_PARTITIONED, hash_partitioned
+from app.urls import url_hash
 
 class Bookmark(Base):
     __tablename__ = "bookmarks"
+    __table_args__ = (
+        # Duplicate detection looks bookmarks up by canonical URL hash per user
+        Index("ix_bookmarks_user_id_url_hash", "user_id", "url_hash"),
+        # See app/partitioning.py
+        {"postgresql_partition_by": "HASH (user_id)"} if BOOKMARKS_PARTITIONED else {},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     title = Column(String, index=True)
     description = Column(String, index=True)
     url = Column(String, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    
+    url_hash = Column(LargeBinary(32))
+    # Part of the primary key when the table is partitioned by it
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=BOOKMARKS_PARTITIONED)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+
+    # Link health, written by the crawler (app/crawler.py)
+    link_status = Column(Integer)  # HTTP status of the last check, NULL if unreachable
+    final_url = Column(String)  # URL after following redirects
+    page_title = Column(String)
+    etag = Column(String)
+    last_modified = Column(String)
+    crawl_error = Column(String)
+    checked_at = Column(DateTime(timezone=True))
+
     user = relationship("User", back_populates="bookmarks")
+    # Joins are spelled out as bookmark_tags has no foreign key to a
+    # partitioned bookmarks table
+    tags = relationship(
+        "Tag",
+        secondary=bookmark_tags,
+        primaryjoin=lambda: Bookmark.id == foreign(bookmark_tags.c.bookmark_id),
+        secondaryjoin=lambda: Tag.id == foreign(bookmark_tags.c.tag_id),
+        lazy="selectin",
+        order_by="Tag.name",
+    )
+
+    @validates("url")
+    def _set_url_hash(self, key, url):
+        """
+        Keep the canonical URL hash in sync whenever the URL is assigned.
+        """
+        self.url_hash = url_hash(url) if url is not None else None
+        # Conditional request validators belong to the previous URL
+        self.etag = None
+        self.last_modified = None
+        return url
+
+
+if BOOKMARKS_PARTITIONED:
+    hash_partitioned(Bookmark.__table__, BOOKMARK_PARTITIONS)
+
 
-    
+def bookmark_key(row) -> dict:
+    """
+    Primary key values of a bookmark row, as needed by bulk updates; includes
+    user_id when the table is partitioned.
+    """
+    return {column.key: getattr(row, column.key) for column in Bookmark.__table__.primary_key}
@@ -0,0 +1,49 @@
+from datetime import datetime, UTC
+from sqlalchemy import Boolean, Column, Integer, String, Text, DateTime, JSON, Index
+from app.database import Base
+
+# Job states; see app/jobs.py for the transitions
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers look for due queued jobs and expired leases
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String(32), nullable=False)
+    # Not a foreign key: a job deleting its own user outlives the user row
+    user_id = Column(Integer, index=True)
+    status = Column(String(16), nullable=False, default=QUEUED)
+    payload = Column(JSON, nullable=False, default=dict)
+    # Names of the uploaded input and the produced output in the job file
+    # store (app/job_files.py)
+    input_file = Column(String(64))
+    output_file = Column(String(64))
+    result = Column(JSON)
+
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+
+    # Earliest time a worker may pick the job up (pushed back between retries)
+    run_at = Column(DateTime(timezone=True), nullable=False, default=lambda: datetime.now(UTC))
+    # Lease held by the worker running the job; an expired lease means the
+    # worker died and another one may take the job over
+    locked_by = Column(String(64))
+    locked_until = Column(DateTime(timezone=True))
+
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(UTC))
+    started_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, ForeignKey, LargeBinary, DateTime
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # HMAC-SHA256 of the token; the token itself is never stored
+    token_hash = Column(LargeBinary(32), nullable=False, unique=True, index=True)
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    revoked_at = Column(DateTime(timezone=True))
+
+    user = relationship("User", back_populates="refresh_tokens")
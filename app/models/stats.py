@@ -0,0 +1,33 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Date
+from sqlalchemy.orm import relationship
+from app.database import Base
+
+# Per-user aggregates kept up to date by app/stats.py whenever bookmarks are
+# written, so that dashboards don't have to scan the bookmark collection
+
+class UserStats(Base):
+    __tablename__ = "user_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    bookmark_count = Column(Integer, nullable=False, default=0)
+
+    user = relationship("User", back_populates="stats")
+
+class DomainCount(Base):
+    __tablename__ = "user_domain_counts"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    domain = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+    user = relationship("User", back_populates="domain_counts")
+
+class ActivityBucket(Base):
+    __tablename__ = "user_activity_buckets"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    # Bookmarks added on this day that still exist
+    count = Column(Integer, nullable=False, default=0)
+
+    user = relationship("User", back_populates="activity_buckets")
@@ -0,0 +1,34 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Table, Index, UniqueConstraint
+from sqlalchemy.orm import relationship
+from app.database import Base
+from app.partitioning import BOOKMARKS_PARTITIONED
+
+# Association between bookmarks and tags; the primary key serves lookups by
+# bookmark, the extra index serves tag filters. A partitioned bookmarks table
+# can't be referenced by bookmark_id alone, so the foreign key is left out then
+bookmark_tags = Table(
+    "bookmark_tags",
+    Base.metadata,
+    Column(
+        "bookmark_id",
+        Integer,
+        *([] if BOOKMARKS_PARTITIONED else [ForeignKey("bookmarks.id", ondelete="CASCADE")]),
+        primary_key=True
+    ),
+    Column("tag_id", Integer, ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True),
+    Index("ix_bookmark_tags_tag_id_bookmark_id", "tag_id", "bookmark_id"),
+)
+
+class Tag(Base):
+    __tablename__ = "tags"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_tags_user_id_name"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(64), nullable=False)
+    # Number of the user's bookmarks carrying this tag, maintained on write
+    bookmark_count = Column(Integer, nullable=False, default=0)
+
+    user = relationship("User", back_populates="tags")
@@ -1,18 +1,32 @@
-from sqlalchemy import Boolean, Column, Integer, String
+from sqlalchemy import Boolean, Column, Integer, String, false
 from sqlalchemy.orm import relationship
 from app.database import Base
+# Register the mappers referenced by name in the relationships below
+import app.models.refresh_token  # noqa: F401
+import app.models.stats  # noqa: F401
 from app.auth.security import get_password_hash, verify_password
 
 class User(Base):
     __tablename__ = "users"
+    # Never hand out the id of a deleted user again (SQLite reuses the highest
+    # rowid otherwise); rows keyed by user id without a foreign key, such as
+    # jobs, must not reach a new account
+    __table_args__ = {"sqlite_autoincrement": True}
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     username = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # Grants access to /admin (see `python -m app.manage grant-admin`)
+    is_admin = Column(Boolean, default=False, server_default=false(), nullable=False)
     
     bookmarks = relationship("Bookmark", back_populates="user", cascade="all, delete-orphan")
+    tags = relationship("Tag", back_populates="user", cascade="all, delete-orphan")
+    refresh_tokens = relationship("RefreshToken", back_populates="user", cascade="all, delete-orphan")
+    stats = relationship("UserStats", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    domain_counts = relationship("DomainCount", back_populates="user", cascade="all, delete-orphan")
+    activity_buckets = relationship("ActivityBucket", back_populates="user", cascade="all, delete-orphan")
 
     def verify_password(self, plain_password: str) -> bool:
         """
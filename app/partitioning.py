@@ -0,0 +1,209 @@
+"""
+Hash partitioning of the bookmarks table on PostgreSQL.
+
+With BOOKMARK_PARTITIONS set, `bookmarks` is declared as a table partitioned
+by HASH (user_id), so each user's bookmarks live in one of a fixed number of
+smaller tables with their own indexes, vacuumed one at a time. Queries
+filtering on user_id only touch that user's partition.
+
+PostgreSQL requires the partition key in every unique constraint of a
+partitioned table. The primary key therefore becomes (id, user_id) and
+bookmark_tags has no foreign key to bookmarks; the code deleting bookmarks
+removes their tag links itself.
+
+SQLite always gets the plain table. An existing plain table is converted
+with `convert_to_partitioned` (`python -m app.manage partition-bookmarks`).
+"""
+from typing import Callable, List, Optional
+
+from sqlalchemy import DDL, Table, event, text
+from sqlalchemy.engine import Connection, Engine
+
+from app.config import BOOKMARK_PARTITIONS, DATABASE_URL
+
+BOOKMARKS_PARTITIONED = BOOKMARK_PARTITIONS > 0 and not DATABASE_URL.startswith("sqlite")
+
+
+def partition_name(table: str, remainder: int) -> str:
+    return f"{table}_p{remainder}"
+
+
+def partition_ddl(table: str, partitions: int) -> List[str]:
+    """
+    CREATE TABLE statements for the hash partitions of a table.
+    """
+    return [
+        f"CREATE TABLE {partition_name(table, remainder)} PARTITION OF {table} "
+        f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+        for remainder in range(partitions)
+    ]
+
+
+def hash_partitioned(table: Table, partitions: int) -> None:
+    """
+    Create the partitions of a table declared with `postgresql_partition_by`
+    whenever the table itself is created (PostgreSQL only).
+    """
+    for statement in partition_ddl(table.name, partitions):
+        event.listen(table, "after_create", DDL(statement).execute_if(dialect="postgresql"))
+
+
+def check_partition_key(conn: Connection, table: str, column: str) -> None:
+    """
+    Refuse to partition a table with rows lacking the partition key: the
+    partitioned copy's primary key includes it, so copying them would fail
+    half way through.
+
+    Raises:
+        ValueError: If some rows have no value in the column
+    """
+    missing = conn.execute(text(f"SELECT count(*) FROM {table} WHERE {column} IS NULL")).scalar()
+    if missing:
+        raise ValueError(f"{missing} rows of {table} have no {column}; assign or delete them first")
+
+
+def convert_to_partitioned(
+    engine: Engine,
+    table: Table,
+    partitions: int,
+    column: str = "user_id",
+    batch_size: int = 10000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Move the rows of a plain table into a hash partitioned copy in batches,
+    then swap the two tables.
+
+    The application keeps reading and writing meanwhile; the batches take no
+    table lock. A trigger mirrors every change of the plain table into the
+    copy and records the key of every row updated or deleted. A batch may
+    still copy a version of a row that a concurrent transaction changes
+    before the batch commits, so the final swap, which locks out readers and
+    writers briefly, copies the recorded rows once more from the plain
+    table. The plain table is kept as `<table>_unpartitioned` for going
+    back; drop it once the result has been checked.
+
+    Args:
+        engine: PostgreSQL engine
+        table: The table as currently declared (indexes and foreign keys are recreated from it)
+        partitions: Number of hash partitions
+        column: Partition key
+        batch_size: Rows copied per transaction
+        progress: Called with the number of rows copied so far after each batch
+
+    Returns:
+        int: Number of rows copied
+
+    Raises:
+        ValueError: If the engine is not PostgreSQL, or rows lack the partition key
+    """
+    if engine.dialect.name != "postgresql":
+        raise ValueError("Table partitioning needs PostgreSQL")
+    if partitions < 1:
+        raise ValueError("At least one partition is needed")
+
+    name = table.name
+    new = f"{name}_partitioned"
+    old = f"{name}_unpartitioned"
+    mirror = f"{name}_mirror"
+    changed = f"{name}_changed"
+
+    with engine.connect() as conn:
+        check_partition_key(conn, name, column)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE {new} (LIKE {name} INCLUDING DEFAULTS) PARTITION BY HASH ({column})"))
+        conn.execute(text(f"ALTER TABLE {new} ADD PRIMARY KEY (id, {column})"))
+        for statement in partition_ddl(new, partitions):
+            conn.execute(text(statement))
+        for fk in table.foreign_keys:
+            if fk.column.table.name != name:
+                conn.execute(text(
+                    f"ALTER TABLE {new} ADD FOREIGN KEY ({fk.parent.name}) "
+                    f"REFERENCES {fk.column.table.name} ({fk.column.name})"
+                ))
+        for index in table.indexes:
+            columns = ", ".join(c.name for c in index.columns)
+            conn.execute(text(f"CREATE INDEX {index.name}_new ON {new} ({columns})"))
+        conn.execute(text(f"CREATE TABLE {changed} AS SELECT id, {column} FROM {name} WITH NO DATA"))
+        # A batch copying the same row concurrently may win the insert; the
+        # row is recorded in the changed table then, and fixed up at the swap
+        conn.execute(text(f"""
+            CREATE FUNCTION {mirror}() RETURNS trigger LANGUAGE plpgsql AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {new} WHERE id = OLD.id AND {column} = OLD.{column};
+                    INSERT INTO {changed} VALUES (OLD.id, OLD.{column});
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {new} SELECT NEW.* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END
+            $$
+        """))
+        conn.execute(text(
+            f"CREATE TRIGGER {mirror} AFTER INSERT OR UPDATE OR DELETE ON {name} "
+            f"FOR EACH ROW EXECUTE FUNCTION {mirror}()"
+        ))
+
+    copied = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            upto = conn.execute(
+                text(f"SELECT max(id) FROM (SELECT id FROM {name} WHERE id > :last ORDER BY id LIMIT :limit) AS batch"),
+                {"last": last_id, "limit": batch_size},
+            ).scalar()
+            if upto is None:
+                break
+            # Rows the trigger already mirrored are skipped
+            copied += conn.execute(
+                text(f"INSERT INTO {new} SELECT * FROM {name} WHERE id > :last AND id <= :upto ON CONFLICT DO NOTHING"),
+                {"last": last_id, "upto": upto},
+            ).rowcount
+        last_id = upto
+        if progress is not None:
+            progress(copied)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {name} IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"DROP TRIGGER {mirror} ON {name}"))
+        conn.execute(text(f"DROP FUNCTION {mirror}()"))
+        # Rows changed during the copy may hold a stale version (or have come
+        # back after being deleted); take them from the plain table again
+        conn.execute(text(
+            f"DELETE FROM {new} USING {changed} "
+            f"WHERE {new}.id = {changed}.id AND {new}.{column} = {changed}.{column}"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {new} SELECT {name}.* FROM {name} "
+            f"JOIN (SELECT DISTINCT id, {column} FROM {changed}) AS changed_keys "
+            f"ON {name}.id = changed_keys.id AND {name}.{column} = changed_keys.{column}"
+        ))
+        conn.execute(text(f"DROP TABLE {changed}"))
+        # Foreign keys of other tables keep pointing at the plain table, and
+        # can't point at the partitioned one without the partition key
+        referencing = conn.execute(
+            text("SELECT conrelid::regclass::text, conname FROM pg_constraint WHERE confrelid = CAST(:table AS regclass)"),
+            {"table": name},
+        ).all()
+        for referencing_table, constraint in referencing:
+            conn.execute(text(f'ALTER TABLE {referencing_table} DROP CONSTRAINT "{constraint}"'))
+
+        conn.execute(text(f"ALTER TABLE {name} RENAME TO {old}"))
+        conn.execute(text(f"ALTER INDEX {name}_pkey RENAME TO {old}_pkey"))
+        for index in table.indexes:
+            conn.execute(text(f"ALTER INDEX {index.name} RENAME TO {index.name}_unpartitioned"))
+
+        conn.execute(text(f"ALTER TABLE {new} RENAME TO {name}"))
+        conn.execute(text(f"ALTER INDEX {new}_pkey RENAME TO {name}_pkey"))
+        for index in table.indexes:
+            conn.execute(text(f"ALTER INDEX {index.name}_new RENAME TO {index.name}"))
+        for remainder in range(partitions):
+            conn.execute(text(f"ALTER TABLE {partition_name(new, remainder)} RENAME TO {partition_name(name, remainder)}"))
+        # The id default still draws from the old sequence; keep it alive
+        # when the plain table is dropped
+        conn.execute(text(f"ALTER SEQUENCE {name}_id_seq OWNED BY {name}.id"))
+        conn.execute(text(f"ANALYZE {name}"))
+    return copied
@@ -0,0 +1,313 @@
+"""
+Request profiling.
+
+Two tools for finding out where the time of a slow route goes:
+
+- On-demand profiles: an admin adds the "X-Profile: 1" header (or
+  ?profile=1) to a request, which then runs under cProfile. The response
+  carries an X-Profile-Id header and the report is kept in a small in-memory
+  store, readable through /admin/profiles.
+- The stack sampler: a background thread that periodically looks at the
+  stacks of all threads and counts the stacks running inside a route's
+  endpoint. It has a low overhead and aggregates across all requests, so it
+  can stay on in production for a while.
+
+Both can be switched on and off at runtime through /admin/profiling.
+"""
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, UTC
+from types import CodeType
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy.orm import Session
+
+from app.auth.deps import get_current_user, oauth2_scheme
+from app.config import (
+    PROFILING_ENABLED,
+    PROFILE_STORE_SIZE,
+    PROFILE_TOP_FUNCTIONS,
+    SAMPLER_INTERVAL_MS,
+    SAMPLER_MAX_STACKS,
+)
+from app.dependencies import get_db
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+class RequestProfiler:
+    """
+    Run single requests under cProfile and keep the most recent reports.
+
+    Only one request is profiled at a time: the profiler is not limited to the
+    request's own task and would mix concurrently profiled requests. Other
+    requests running meanwhile can show up in a profile as well.
+    """
+
+    def __init__(self, enabled: bool = PROFILING_ENABLED, max_profiles: int = PROFILE_STORE_SIZE):
+        self.enabled = enabled
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def profile(self, route: str, user_id: Optional[int] = None) -> Iterator[Optional[str]]:
+        """
+        Profile the enclosed block; yields the profile id, or None if another
+        profile is running.
+        """
+        if not self._lock.acquire(blocking=False):
+            yield None
+            return
+        try:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler (e.g. a coverage tool) is active
+                yield None
+                return
+            profile_id = uuid.uuid4().hex[:12]
+            start = time.perf_counter()
+            try:
+                yield profile_id
+            finally:
+                profiler.disable()
+                self._store(profile_id, route, user_id, time.perf_counter() - start, profiler)
+        finally:
+            self._lock.release()
+
+    def _store(self, profile_id: str, route: str, user_id: Optional[int], duration: float, profiler) -> None:
+        report = io.StringIO()
+        stats = pstats.Stats(profiler, stream=report)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(PROFILE_TOP_FUNCTIONS)
+        self._profiles[profile_id] = {
+            "id": profile_id,
+            "route": route,
+            "user_id": user_id,
+            "created_at": datetime.now(UTC),
+            "duration_ms": round(duration * 1000, 1),
+            "report": report.getvalue(),
+        }
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[dict]:
+        """
+        Stored profiles without their reports, newest first.
+        """
+        return [
+            {key: value for key, value in profile.items() if key != "report"}
+            for profile in reversed(self._profiles.values())
+        ]
+
+    def clear(self) -> None:
+        self._profiles.clear()
+
+
+request_profiler = RequestProfiler()
+
+
+def _profile_requested(request: Request) -> bool:
+    flag = request.headers.get(PROFILE_HEADER) or request.query_params.get("profile")
+    return flag is not None and flag.lower() in ("1", "true", "yes")
+
+
+def route_name(route: APIRoute) -> str:
+    return f"{','.join(sorted(route.methods))} {route.path}"
+
+
+def _request_route(request: Request) -> str:
+    # Look the endpoint up in the app, as routes of included routers may be
+    # reported with the path they have inside their router
+    endpoint = request.scope.get("endpoint")
+    for route in request.app.routes:
+        if isinstance(route, APIRoute) and route.endpoint is endpoint:
+            return route_name(route)
+    return f"{request.method} {request.url.path}"
+
+
+async def profile_request(request: Request, response: Response, db: Session = Depends(get_db)):
+    """
+    Router dependency profiling the request when an admin asks for it.
+
+    Requests without the flag, and flagged requests of anyone but an admin,
+    run unchanged.
+    """
+    if not request_profiler.enabled or not _profile_requested(request):
+        yield
+        return
+    try:
+        user = await get_current_user(await oauth2_scheme(request), db)
+    except HTTPException:
+        user = None
+    if user is None or not user.is_admin:
+        yield
+        return
+
+    with request_profiler.profile(_request_route(request), user.id) as profile_id:
+        if profile_id is not None:
+            response.headers[PROFILE_ID_HEADER] = profile_id
+        yield
+
+
+def _frame_name(code: CodeType, module: str) -> str:
+    return f"{module}:{code.co_qualname}"
+
+
+def _nested_code(code: CodeType) -> Iterator[CodeType]:
+    """
+    A code object and those of the functions defined inside it, such as the
+    closures that handlers hand to the threadpool.
+    """
+    yield code
+    for const in code.co_consts:
+        if isinstance(const, CodeType):
+            yield from _nested_code(const)
+
+
+class StackSampler:
+    """
+    Sample the stacks of all threads at a fixed interval and count, per route,
+    the stacks found inside its endpoint.
+
+    Stacks are kept in folded form (outermost frame first, separated by ";"),
+    the input format of flame graph tools. Frames above the endpoint (server,
+    middleware, dependency resolution) are left out.
+    """
+
+    def __init__(
+        self,
+        interval_ms: float = SAMPLER_INTERVAL_MS,
+        max_stacks: int = SAMPLER_MAX_STACKS,
+    ):
+        self.interval = interval_ms / 1000
+        self.max_stacks = max_stacks
+        self.stacks: Counter = Counter()
+        self.route_samples: Counter = Counter()
+        self.samples = 0
+        self.dropped = 0
+        self._routes: Dict[CodeType, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+
+    def attach(self, app) -> None:
+        """
+        Learn the endpoint code objects of an app's routes.
+        """
+        routes = {}
+        for route in app.routes:
+            if isinstance(route, APIRoute):
+                for code in _nested_code(route.endpoint.__code__):
+                    routes[code] = route_name(route)
+        self._routes = routes
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stopping.wait(self.interval):
+            self.sample_once()
+
+    def sample_once(self) -> None:
+        """
+        Take one sample of every thread but the sampler's own.
+        """
+        own = self._thread.ident if self._thread is not None else None
+        found: List[Tuple[str, str]] = []
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            sample = self._attribute(frame)
+            if sample is not None:
+                found.append(sample)
+
+        with self._lock:
+            self.samples += 1
+            for route, stack in found:
+                self.route_samples[route] += 1
+                key = f"{route};{stack}"
+                if key in self.stacks or len(self.stacks) < self.max_stacks:
+                    self.stacks[key] += 1
+                else:
+                    self.dropped += 1
+
+    def _attribute(self, frame) -> Optional[Tuple[str, str]]:
+        """
+        The route and folded stack of a thread, if it is inside an endpoint.
+        """
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            route = self._routes.get(frame.f_code)
+            if route is not None:
+                names = [_frame_name(f.f_code, f.f_globals.get("__name__", "?")) for f in reversed(frames)]
+                return route, ";".join(names)
+            frame = frame.f_back
+        return None
+
+    def top(self, route: Optional[str] = None, limit: int = 20) -> dict:
+        """
+        The most frequently sampled stacks, optionally of one route.
+        """
+        with self._lock:
+            stacks = [
+                (stack, count) for stack, count in self.stacks.items()
+                if route is None or stack.split(";", 1)[0] == route
+            ]
+            routes = dict(self.route_samples.most_common())
+        stacks.sort(key=lambda item: item[1], reverse=True)
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "dropped": self.dropped,
+            "routes": routes,
+            "stacks": [{"stack": stack.split(";"), "count": count} for stack, count in stacks[:limit]],
+        }
+
+    def folded(self) -> str:
+        """
+        All stacks in folded format ("frame;frame;frame count" per line).
+        """
+        with self._lock:
+            return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def reset(self) -> None:
+        with self._lock:
+            self.stacks.clear()
+            self.route_samples.clear()
+            self.samples = 0
+            self.dropped = 0
+
+
+stack_sampler = StackSampler()
+
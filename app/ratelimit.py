@@ -0,0 +1,134 @@
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Tuple
+
+from fastapi import Depends, HTTPException, status
+
+from app.auth.deps import get_current_user
+from app.models.user import User
+from app.config import RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST
+
+
+class RateLimitBackend(ABC):
+    """
+    Storage for token buckets.
+
+    The in-process backend below is enough for a single worker. Deployments
+    running several workers plug in a shared backend (e.g. Redis) by
+    implementing `consume` atomically and passing it to `set_rate_limit_backend`.
+    """
+
+    @abstractmethod
+    def consume(self, key: str, rate: float, capacity: int) -> float:
+        """
+        Take one token from the bucket identified by `key`.
+
+        Args:
+            key: Bucket identifier
+            rate: Refill rate in tokens per second
+            capacity: Maximum number of tokens the bucket can hold
+
+        Returns:
+            float: 0.0 if a token was taken, otherwise seconds until one is available
+        """
+
+    @abstractmethod
+    def reset(self) -> None:
+        """
+        Forget all buckets.
+        """
+
+
+class InMemoryRateLimitBackend(RateLimitBackend):
+    """
+    Token buckets kept in a dict guarded by a lock.
+
+    A bucket that has refilled to capacity behaves exactly like a missing
+    one, so every `sweep_interval` seconds such buckets are dropped; the dict
+    only holds users active within the last refill period.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic, sweep_interval: float = 60.0):
+        self._clock = clock
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+        self.sweep_interval = sweep_interval
+        self._last_sweep = clock()
+
+    def consume(self, key: str, rate: float, capacity: int) -> float:
+        now = self._clock()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_interval:
+                self._evict_full(now, rate, capacity)
+            tokens, updated = self._buckets.get(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated) * rate)
+            if tokens >= 1.0:
+                self._buckets[key] = (tokens - 1.0, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1.0 - tokens) / rate
+
+    def _evict_full(self, now: float, rate: float, capacity: int) -> None:
+        self._buckets = {
+            key: (tokens, updated)
+            for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate < capacity
+        }
+        self._last_sweep = now
+
+    def reset(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiter on top of a pluggable backend.
+    """
+
+    def __init__(self, backend: RateLimitBackend, per_minute: int, burst: int):
+        self.backend = backend
+        self.per_minute = per_minute
+        self.burst = max(burst, 1)
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    def check(self, key: str) -> float:
+        """
+        Consume a token for `key`.
+
+        Returns:
+            float: 0.0 if the request is allowed, otherwise the retry delay in seconds
+        """
+        if not self.enabled:
+            return 0.0
+        return self.backend.consume(key, self.per_minute / 60.0, self.burst)
+
+
+rate_limiter = RateLimiter(InMemoryRateLimitBackend(), RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+
+
+def set_rate_limit_backend(backend: RateLimitBackend) -> None:
+    """
+    Replace the bucket storage, e.g. with a backend shared between workers.
+    """
+    rate_limiter.backend = backend
+
+
+async def enforce_rate_limit(current_user: User = Depends(get_current_user)) -> User:
+    """
+    Reject the request with 429 once the current user has used up their tokens.
+    Used as a router dependency, so it shares the resolved user with the route.
+    """
+    retry_after = rate_limiter.check(f"user:{current_user.id}")
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+    return current_user
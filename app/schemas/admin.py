@@ -0,0 +1,20 @@
+from datetime import datetime
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class ProfilingSettings(BaseModel):
+    on_demand: bool
+    sampler: bool
+    sampler_interval_ms: float
+
+class ProfilingSettingsUpdate(BaseModel):
+    on_demand: Optional[bool] = None
+    sampler: Optional[bool] = None
+    sampler_interval_ms: Optional[float] = Field(None, ge=1)
+
+class ProfileSummary(BaseModel):
+    id: str
+    route: str
+    user_id: Optional[int] = None
+    created_at: datetime
+    duration_ms: float
@@ -0,0 +1,9 @@
+from pydantic import BaseModel
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str = "bearer"
+    refresh_token: str
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
@@ -1,10 +1,27 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from datetime import date, datetime
+from enum import Enum
+from pydantic import BaseModel, HttpUrl, create_model, field_validator
+from typing import List, Optional
+
+class DuplicateMode(str, Enum):
+    allow = "allow"
+    reject = "reject"
+    merge = "merge"
+
+class ExportFormat(str, Enum):
+    html = "html"
+    csv = "csv"
+    ndjson = "ndjson"
+
+class TagMode(str, Enum):
+    all = "all"
+    any = "any"
 
 class BookmarkBase(BaseModel):
     title: str
     description: Optional[str] = None
     url: HttpUrl
+    tags: List[str] = []
 
 class BookmarkCreate(BookmarkBase):
     pass
@@ -13,10 +30,53 @@ class BookmarkUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     url: Optional[HttpUrl] = None
+    tags: Optional[List[str]] = None
 
 class Bookmark(BookmarkBase):
     id: int
     user_id: int
+    created_at: Optional[datetime] = None
+    link_status: Optional[int] = None
+    final_url: Optional[str] = None
+    page_title: Optional[str] = None
+    checked_at: Optional[datetime] = None
+
+    @field_validator("tags", mode="before")
+    @classmethod
+    def tag_names(cls, tags):
+        # ORM bookmarks carry Tag objects
+        return [getattr(tag, "name", tag) for tag in tags or []]
 
     class Config:
         from_attributes = True
+
+# Bookmark with every field optional, for responses limited with `fields=`;
+# only the fields present in the data are serialized. Derived from Bookmark so
+# that new fields are available to `fields=` without being listed twice.
+SparseBookmark = create_model(
+    "SparseBookmark",
+    **{name: (Optional[field.annotation], None) for name, field in Bookmark.model_fields.items()},
+)
+
+class BookmarkLookup(BaseModel):
+    url: str
+    saved: bool
+    bookmark: Optional[Bookmark] = None
+
+class TagCount(BaseModel):
+    name: str
+    count: int
+
+class DomainStat(BaseModel):
+    domain: str
+    count: int
+
+class ActivityStat(BaseModel):
+    day: date
+    count: int
+
+class BookmarkStats(BaseModel):
+    total: int
+    top_domains: List[DomainStat]
+    added_recently: int
+    activity: List[ActivityStat]
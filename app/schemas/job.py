@@ -0,0 +1,22 @@
+from datetime import datetime
+from pydantic import BaseModel
+from typing import Optional
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    status: str
+    progress: int
+    total: Optional[int] = None
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    error: Optional[str] = None
+    result: Optional[dict] = None
+    run_at: Optional[datetime] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,82 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable, TypeVar
+
+from fastapi.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+
+class _LeaderCancelled(Exception):
+    """Set on a flight whose leader was cancelled; its followers start over."""
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical reads.
+
+    The first caller for a key (the leader) runs the blocking function in the
+    threadpool; callers arriving with the same key while it runs (followers)
+    await the leader's result or exception instead of querying again. If the
+    leader is cancelled (e.g. its client disconnected), its followers are not:
+    they start over, one of them leading a new flight.
+    Results are not cached beyond the call, so a follower can only see data
+    that was current when the leader started.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], T]) -> T:
+        """
+        Run `fn` for `key` unless an identical call is already in flight.
+
+        Args:
+            key: Identifies identical reads, e.g. ("list_bookmarks", user_id)
+            fn: Blocking function computing the result; it must return data
+                that does not depend on the leader's session (plain values or
+                detached objects)
+
+        Returns:
+            The result of `fn`, shared by every caller of the flight
+        """
+        future = self._calls.get(key)
+        while future is not None:
+            self.followers += 1
+            try:
+                return await asyncio.shield(future)
+            except _LeaderCancelled:
+                self.followers -= 1
+                future = self._calls.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+        self.leaders += 1
+        try:
+            result = await run_in_threadpool(fn)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when there are no followers
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "coalesced_ratio": round(self.followers / calls, 4) if calls else 0.0,
+        }
+
+
+reads = SingleFlight()
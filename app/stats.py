@@ -0,0 +1,239 @@
+"""
+Incrementally maintained per-user bookmark statistics.
+
+The record_* functions are called by the bookmark write paths before they
+commit, so the aggregates change in the same transaction as the bookmarks.
+`rebuild_stats` recomputes everything from the bookmarks table.
+"""
+from collections import Counter
+from datetime import date, datetime, timedelta, UTC
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.models.stats import UserStats, DomainCount, ActivityBucket
+
+
+def domain_of(url: Optional[str]) -> str:
+    """
+    The host of a URL without a leading "www.", used to group bookmarks.
+    """
+    host = (urlsplit(url or "").hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def _day_of(created_at: Optional[datetime]) -> Optional[date]:
+    if created_at is None:
+        return None
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(UTC)
+    return created_at.date()
+
+
+def _increment(db: Session, model, count_column, keys: dict, delta: int) -> None:
+    """
+    Add `delta` to the counter row identified by `keys`, creating it if needed.
+    Uses UPDATE ... SET count = count + delta so concurrent writers don't lose updates.
+    """
+    conditions = [getattr(model, name) == value for name, value in keys.items()]
+    result = db.execute(
+        update(model)
+        .where(*conditions)
+        .values({count_column: getattr(model, count_column) + delta})
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount:
+        if delta < 0 and model is not UserStats:
+            db.execute(
+                delete(model)
+                .where(*conditions, getattr(model, count_column) <= 0)
+                .execution_options(synchronize_session=False)
+            )
+        return
+    if delta <= 0:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(model.__table__.insert().values(**keys, **{count_column: delta}))
+    except IntegrityError:
+        # A concurrent writer created the row first
+        _increment(db, model, count_column, keys, delta)
+
+
+def record_bookmark_created(db: Session, bookmark: Bookmark) -> None:
+    """
+    Count a new bookmark. Call after adding it to the session.
+    """
+    db.flush()
+    _apply(db, bookmark.user_id, bookmark.url, bookmark.created_at, 1)
+
+
+def record_bookmarks_created(db: Session, bookmarks: Iterable[Bookmark]) -> None:
+    """
+    Count a batch of new bookmarks with one counter update per distinct key.
+    """
+    db.flush()
+    _apply_batch(db, bookmarks, 1)
+
+
+def record_bookmarks_deleted(db: Session, bookmarks: Iterable) -> None:
+    """
+    Uncount a batch of bookmarks that is about to be deleted. Accepts
+    bookmarks or rows with their user_id, url and created_at.
+    """
+    _apply_batch(db, bookmarks, -1)
+
+
+def _apply_batch(db: Session, bookmarks: Iterable, sign: int) -> None:
+    totals, domains, days = Counter(), Counter(), Counter()
+    for bookmark in bookmarks:
+        totals[bookmark.user_id] += 1
+        domains[bookmark.user_id, domain_of(bookmark.url)] += 1
+        day = _day_of(bookmark.created_at)
+        if day is not None:
+            days[bookmark.user_id, day] += 1
+    for user_id, count in totals.items():
+        _increment(db, UserStats, "bookmark_count", {"user_id": user_id}, sign * count)
+    for (user_id, domain), count in domains.items():
+        _increment(db, DomainCount, "count", {"user_id": user_id, "domain": domain}, sign * count)
+    for (user_id, day), count in days.items():
+        _increment(db, ActivityBucket, "count", {"user_id": user_id, "day": day}, sign * count)
+
+
+def record_bookmark_deleted(db: Session, bookmark: Bookmark) -> None:
+    """
+    Uncount a bookmark that is about to be deleted.
+    """
+    _apply(db, bookmark.user_id, bookmark.url, bookmark.created_at, -1)
+
+
+def record_bookmark_url_changed(db: Session, bookmark: Bookmark, old_url: Optional[str]) -> None:
+    """
+    Move a bookmark between domains after its URL changed.
+    """
+    old_domain, new_domain = domain_of(old_url), domain_of(bookmark.url)
+    if old_domain != new_domain:
+        _increment(db, DomainCount, "count", {"user_id": bookmark.user_id, "domain": old_domain}, -1)
+        _increment(db, DomainCount, "count", {"user_id": bookmark.user_id, "domain": new_domain}, 1)
+
+
+def _apply(db: Session, user_id: int, url: Optional[str], created_at: Optional[datetime], delta: int) -> None:
+    _increment(db, UserStats, "bookmark_count", {"user_id": user_id}, delta)
+    _increment(db, DomainCount, "count", {"user_id": user_id, "domain": domain_of(url)}, delta)
+    day = _day_of(created_at)
+    if day is not None:
+        _increment(db, ActivityBucket, "count", {"user_id": user_id, "day": day}, delta)
+
+
+def get_stats(db: Session, user_id: int, top: int = 10, days: int = 7) -> dict:
+    """
+    Read a user's statistics from the aggregate tables.
+
+    Args:
+        db: Database session
+        user_id: The user
+        top: Number of domains to return
+        days: Size of the recent activity window, including today
+
+    Returns:
+        dict: total, top_domains, added_recently and per-day activity
+    """
+    total = db.execute(
+        select(UserStats.bookmark_count).where(UserStats.user_id == user_id)
+    ).scalar() or 0
+    top_domains = db.execute(
+        select(DomainCount.domain, DomainCount.count)
+        .where(DomainCount.user_id == user_id, DomainCount.count > 0)
+        .order_by(DomainCount.count.desc(), DomainCount.domain)
+        .limit(top)
+    ).all()
+    since = datetime.now(UTC).date() - timedelta(days=days - 1)
+    activity = db.execute(
+        select(ActivityBucket.day, ActivityBucket.count)
+        .where(ActivityBucket.user_id == user_id, ActivityBucket.day >= since, ActivityBucket.count > 0)
+        .order_by(ActivityBucket.day)
+    ).all()
+    return {
+        "total": total,
+        "top_domains": [{"domain": domain, "count": count} for domain, count in top_domains],
+        "added_recently": sum(count for _, count in activity),
+        "activity": [{"day": day, "count": count} for day, count in activity],
+    }
+
+
+def _store_user_stats(db: Session, user_id: int, total: int, domains: Counter, days: Counter) -> None:
+    db.add(UserStats(user_id=user_id, bookmark_count=total))
+    if domains:
+        db.execute(DomainCount.__table__.insert(), [
+            {"user_id": user_id, "domain": domain, "count": count} for domain, count in domains.items()
+        ])
+    if days:
+        db.execute(ActivityBucket.__table__.insert(), [
+            {"user_id": user_id, "day": day, "count": count} for day, count in days.items()
+        ])
+
+
+def _rebuild_user_stats(db: Session, user_id: int, batch_size: int) -> None:
+    # Deleting first locks the user's aggregate rows, so concurrent write
+    # paths wait for the rebuild instead of updating rows about to be replaced
+    for model in (UserStats, DomainCount, ActivityBucket):
+        db.execute(delete(model).where(model.user_id == user_id))
+
+    total, domains, days = 0, Counter(), Counter()
+    rows = db.execute(
+        select(Bookmark.url, Bookmark.created_at)
+        .where(Bookmark.user_id == user_id)
+        .execution_options(yield_per=batch_size)
+    )
+    # Aggregate while the cursor is open and write afterwards, as not every
+    # driver allows statements on a connection with an open server-side cursor
+    for row in rows:
+        total += 1
+        domains[domain_of(row.url)] += 1
+        day = _day_of(row.created_at)
+        if day is not None:
+            days[day] += 1
+
+    if total:
+        _store_user_stats(db, user_id, total, domains, days)
+
+
+def rebuild_stats(db: Session, user_id: Optional[int] = None, batch_size: int = 1000) -> int:
+    """
+    Recompute the aggregates from the bookmarks table, one user per transaction.
+
+    Memory holds one user's aggregates at a time, and each user's rows are
+    only locked while that user is rebuilt.
+
+    Args:
+        db: Database session
+        user_id: Only rebuild this user's statistics
+        batch_size: Users, and bookmarks of a user, fetched at a time
+
+    Returns:
+        int: Number of users whose statistics were rebuilt
+    """
+    if user_id is not None:
+        _rebuild_user_stats(db, user_id, batch_size)
+        db.commit()
+        return 1
+
+    rebuilt = 0
+    last_id = 0
+    while True:
+        user_ids = db.scalars(
+            select(User.id).where(User.id > last_id).order_by(User.id).limit(batch_size)
+        ).all()
+        if not user_ids:
+            break
+        for uid in user_ids:
+            _rebuild_user_stats(db, uid, batch_size)
+            db.commit()
+        rebuilt += len(user_ids)
+        last_id = user_ids[-1]
+    return rebuilt
@@ -0,0 +1,166 @@
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.models.bookmark import Bookmark
+from app.models.tag import Tag, bookmark_tags
+
+MAX_TAG_LENGTH = 64
+
+
+def normalize_tags(names: Iterable[str]) -> List[str]:
+    """
+    Lowercase and strip tag names, dropping empty and repeated ones.
+    """
+    normalized = []
+    for name in names or []:
+        name = " ".join(name.split()).lower()[:MAX_TAG_LENGTH]
+        if name and name not in normalized:
+            normalized.append(name)
+    return normalized
+
+
+def _get_or_create_tags(db: Session, user_id: int, names: List[str]) -> List[Tag]:
+    existing = {
+        tag.name: tag
+        for tag in db.query(Tag).filter(Tag.user_id == user_id, Tag.name.in_(names))
+    }
+    for name in names:
+        if name in existing:
+            continue
+        try:
+            # Savepoint, so losing a race against a concurrent insert only
+            # costs a re-read instead of the whole transaction
+            with db.begin_nested():
+                tag = Tag(user_id=user_id, name=name, bookmark_count=0)
+                db.add(tag)
+        except IntegrityError:
+            tag = db.query(Tag).filter(Tag.user_id == user_id, Tag.name == name).one()
+        existing[name] = tag
+    return [existing[name] for name in names]
+
+
+def _adjust_counts(db: Session, tag_ids: List[int], delta: int) -> None:
+    if tag_ids:
+        db.execute(
+            update(Tag)
+            .where(Tag.id.in_(tag_ids))
+            .values(bookmark_count=Tag.bookmark_count + delta)
+            .execution_options(synchronize_session="evaluate")
+        )
+
+
+def set_bookmark_tags(db: Session, bookmark: Bookmark, names: Iterable[str]) -> None:
+    """
+    Replace the tags of a bookmark and adjust the per-tag counts.
+    Does not commit; the caller commits together with the bookmark change.
+    """
+    names = normalize_tags(names)
+    current = {tag.name: tag for tag in bookmark.tags}
+    tags = _get_or_create_tags(db, bookmark.user_id, names) if names else []
+    db.flush()
+
+    added = [tag.id for tag in tags if tag.name not in current]
+    removed = [tag.id for name, tag in current.items() if name not in names]
+    _adjust_counts(db, added, 1)
+    _adjust_counts(db, removed, -1)
+    bookmark.tags = tags
+
+
+def tag_new_bookmarks(db: Session, user_id: int, tagged: Sequence[Tuple[Bookmark, Iterable[str]]]) -> None:
+    """
+    Tag a batch of newly flushed bookmarks of one user.
+
+    Unlike calling set_bookmark_tags per bookmark, this looks up the tags and
+    adjusts their counts once for the whole batch. Does not commit.
+    """
+    tagged = [(bookmark, normalize_tags(names)) for bookmark, names in tagged]
+    names = normalize_tags(name for _, bookmark_names in tagged for name in bookmark_names)
+    if not names:
+        return
+    tags = {tag.name: tag for tag in _get_or_create_tags(db, user_id, names)}
+    db.flush()
+
+    rows = []
+    usage = Counter()
+    for bookmark, bookmark_names in tagged:
+        for name in bookmark_names:
+            rows.append({"bookmark_id": bookmark.id, "tag_id": tags[name].id})
+            usage[tags[name].id] += 1
+    db.execute(bookmark_tags.insert(), rows)
+
+    by_delta = defaultdict(list)
+    for tag_id, delta in usage.items():
+        by_delta[delta].append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        _adjust_counts(db, tag_ids, delta)
+
+
+def release_bookmark_tags(db: Session, bookmark: Bookmark) -> None:
+    """
+    Decrement the counts of a bookmark's tags before it is deleted.
+    """
+    _adjust_counts(db, [tag.id for tag in bookmark.tags], -1)
+
+
+def release_tags_of_bookmarks(db: Session, bookmark_ids: Iterable[int]) -> None:
+    """
+    Decrement the counts of the tags of a batch of bookmarks before they are
+    deleted, with one update per distinct decrement.
+    """
+    usage = Counter(db.execute(
+        select(bookmark_tags.c.tag_id).where(bookmark_tags.c.bookmark_id.in_(list(bookmark_ids)))
+    ).scalars())
+    by_delta = defaultdict(list)
+    for tag_id, count in usage.items():
+        by_delta[-count].append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        _adjust_counts(db, tag_ids, delta)
+
+
+def tag_names_by_bookmark(db: Session, bookmark_ids: Iterable[int]) -> Dict[int, List[str]]:
+    """
+    The tag names of several bookmarks in one query, sorted like Bookmark.tags.
+    """
+    names: Dict[int, List[str]] = defaultdict(list)
+    bookmark_ids = list(bookmark_ids)
+    if bookmark_ids:
+        rows = db.execute(
+            select(bookmark_tags.c.bookmark_id, Tag.name)
+            .join(Tag, Tag.id == bookmark_tags.c.tag_id)
+            .where(bookmark_tags.c.bookmark_id.in_(bookmark_ids))
+            .order_by(Tag.name)
+        )
+        for bookmark_id, name in rows:
+            names[bookmark_id].append(name)
+    return names
+
+
+def filter_by_tags(query, user_id: int, names: List[str], match_all: bool = True):
+    """
+    Restrict a bookmark query to bookmarks carrying all (or any) of the tags.
+    Runs in the database using the (user_id, name) and (tag_id, bookmark_id) indexes.
+    """
+    matching = (
+        select(bookmark_tags.c.bookmark_id)
+        .join(Tag, Tag.id == bookmark_tags.c.tag_id)
+        .where(Tag.user_id == user_id, Tag.name.in_(names))
+    )
+    if match_all and len(names) > 1:
+        matching = matching.group_by(bookmark_tags.c.bookmark_id).having(func.count() == len(names))
+    return query.filter(Bookmark.id.in_(matching))
+
+
+def tag_counts(db: Session, user_id: int) -> List[Tag]:
+    """
+    The user's tags in use, most used first.
+    """
+    return (
+        db.query(Tag)
+        .filter(Tag.user_id == user_id, Tag.bookmark_count > 0)
+        .order_by(Tag.bookmark_count.desc(), Tag.name)
+        .all()
+    )
@@ -0,0 +1,68 @@
+import hashlib
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Ports that are implied by the scheme and dropped from the canonical form
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only carry tracking information
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid",
+    "mc_cid", "mc_eid", "_hsenc", "_hsmi", "ref_src",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+
+def _is_tracking_param(name: str) -> bool:
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalize a URL so that trivially different spellings of the same page compare equal.
+
+    Lowercases scheme and host, drops default ports, the fragment, trailing
+    slashes and tracking parameters, and sorts the remaining query parameters.
+
+    Args:
+        url: The URL to normalize
+
+    Returns:
+        str: The canonical form of the URL
+
+    Raises:
+        ValueError: If the URL has a non-numeric or out of range port
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+
+    host = parts.hostname or ""
+    if ":" in host:
+        host = f"[{host}]"  # IPv6 literal
+    netloc = host
+    if parts.port is not None and DEFAULT_PORTS.get(scheme) != parts.port:
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username:
+        userinfo = parts.username
+        if parts.password:
+            userinfo = f"{userinfo}:{parts.password}"
+        netloc = f"{userinfo}@{netloc}"
+
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/") or "/"
+
+    query = sorted(
+        (name, value)
+        for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name)
+    )
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def url_hash(url: str) -> bytes:
+    """
+    Fixed-width (32 byte) SHA-256 digest of the canonical form of a URL.
+    """
+    return hashlib.sha256(canonicalize_url(url).encode("utf-8")).digest()
@@ -0,0 +1,66 @@
+"""
+Per-call overhead of event logging.
+
+Compares `log_event` through the queue handler with a synchronous JSON
+handler writing to the same file, from the caller's point of view.
+
+Usage:
+    python -m benchmarks.bench_event_log [--events N] [--max-us MICROSECONDS]
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from app import event_log
+from app.event_log import JsonFormatter, log_event, setup_event_logging, shutdown_event_logging
+
+
+def time_calls(events: int) -> float:
+    """Average microseconds per log_event call."""
+    start = time.perf_counter()
+    for i in range(events):
+        log_event("bookmark.created", user_id=1, bookmark_id=i)
+    return (time.perf_counter() - start) / events * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_event_log")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--max-us", type=float, default=50.0, help="Fail if queued logging is slower than this")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "events.log")
+
+        # Synchronous baseline: format and write in the calling thread
+        handler = logging.FileHandler(path)
+        handler.setFormatter(JsonFormatter())
+        event_log.logger.addHandler(handler)
+        event_log.logger.setLevel(logging.INFO)
+        event_log.logger.propagate = False
+        sync_us = time_calls(args.events)
+        event_log.logger.removeHandler(handler)
+        handler.close()
+
+        # Queue handler drained by the listener thread; the queue is sized so
+        # nothing is dropped and every call pays the full enqueue cost
+        event_log.EVENT_LOG_QUEUE_SIZE = args.events + 1
+        setup_event_logging(logging.FileHandler(path))
+        queued_us = time_calls(args.events)
+        drain_start = time.perf_counter()
+        shutdown_event_logging()
+        drain_s = time.perf_counter() - drain_start
+
+    print(f"synchronous file handler: {sync_us:8.2f} us/event")
+    print(f"queued (log_event):       {queued_us:8.2f} us/event")
+    print(f"background drain after the loop: {drain_s * 1000:.1f} ms")
+    if queued_us > args.max_us:
+        print(f"FAIL: queued logging above {args.max_us} us/event")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,140 @@
+"""
+Per-user query latency on a plain versus a hash partitioned bookmarks table.
+
+Loads the same rows into two scratch tables shaped like `bookmarks` (one
+plain, one partitioned by HASH (user_id)) and times the per-user queries of
+the bookmark API against both. Needs PostgreSQL; the scratch tables are
+dropped afterwards unless --keep is given.
+
+Usage:
+    python -m benchmarks.bench_partitioning --url postgresql://... [--rows N] [--users N]
+        [--partitions N] [--queries N]
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, text
+
+from app.partitioning import partition_ddl
+
+PLAIN = "bench_bookmarks_plain"
+PARTITIONED = "bench_bookmarks_partitioned"
+
+COLUMNS = """
+    id BIGSERIAL,
+    user_id INTEGER NOT NULL,
+    title VARCHAR,
+    url VARCHAR,
+    url_hash BYTEA,
+    created_at TIMESTAMP WITH TIME ZONE
+"""
+
+# The queries behind listing, fetching, duplicate checks and counting
+QUERIES = {
+    "list page": "SELECT id, title, url FROM {table} WHERE user_id = :user_id ORDER BY id LIMIT 50",
+    "get by id": "SELECT id, title, url FROM {table} WHERE id = :id AND user_id = :user_id",
+    "duplicate check": "SELECT id FROM {table} WHERE user_id = :user_id AND url_hash = :url_hash",
+    "count": "SELECT count(*) FROM {table} WHERE user_id = :user_id",
+}
+
+
+def create_tables(conn, partitions: int) -> None:
+    conn.execute(text(f"CREATE TABLE {PLAIN} ({COLUMNS}, PRIMARY KEY (id))"))
+    conn.execute(text(f"CREATE TABLE {PARTITIONED} ({COLUMNS}, PRIMARY KEY (id, user_id)) PARTITION BY HASH (user_id)"))
+    for statement in partition_ddl(PARTITIONED, partitions):
+        conn.execute(text(statement))
+    for table in (PLAIN, PARTITIONED):
+        conn.execute(text(f"CREATE INDEX {table}_user_id_url_hash ON {table} (user_id, url_hash)"))
+
+
+def load_rows(conn, rows: int, users: int, chunk: int = 1_000_000) -> None:
+    """
+    Insert the same rows into both tables, spreading them evenly over users.
+    """
+    for start in range(1, rows + 1, chunk):
+        end = min(start + chunk - 1, rows)
+        for table in (PLAIN, PARTITIONED):
+            conn.execute(text(f"""
+                INSERT INTO {table} (id, user_id, title, url, url_hash, created_at)
+                SELECT g, g % :users + 1, 'Bookmark ' || g, 'https://example.com/' || g,
+                       decode(md5('https://example.com/' || g), 'hex'), now()
+                FROM generate_series(CAST(:start AS bigint), :end) AS g
+            """), {"users": users, "start": start, "end": end})
+        print(f"  loaded {end} rows", flush=True)
+
+
+def time_queries(conn, table: str, rows: int, users: int, queries: int, seed: int) -> dict:
+    """
+    Latency percentiles in milliseconds per query, for random users.
+    """
+    results = {}
+    for name, sql in QUERIES.items():
+        statement = text(sql.format(table=table))
+        rng = random.Random(seed)
+        timings = []
+        for _ in range(queries):
+            row_id = rng.randint(1, rows)
+            params = {
+                "id": row_id,
+                "user_id": row_id % users + 1,
+                "url_hash": hashlib.md5(f"https://example.com/{row_id}".encode()).digest(),
+            }
+            start = time.perf_counter()
+            conn.execute(statement, params).all()
+            timings.append((time.perf_counter() - start) * 1000)
+        quantiles = statistics.quantiles(timings, n=100)
+        results[name] = {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_partitioning")
+    parser.add_argument("--url", default=os.getenv("DATABASE_URL"), help="PostgreSQL URL (default: DATABASE_URL)")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--partitions", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=2000, help="Timed runs of each query per table")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch tables for a second run")
+    args = parser.parse_args(argv)
+
+    if not args.url or not args.url.startswith("postgresql"):
+        parser.error("a PostgreSQL --url is required")
+    engine = create_engine(args.url)
+
+    with engine.begin() as conn:
+        exists = conn.execute(text("SELECT to_regclass(:name)"), {"name": PLAIN}).scalar()
+        if exists is None:
+            print(f"Loading {args.rows} rows for {args.users} users into {args.partitions} partitions")
+            create_tables(conn, args.partitions)
+            load_rows(conn, args.rows, args.users)
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for table in (PLAIN, PARTITIONED):
+            conn.execute(text(f"VACUUM ANALYZE {table}"))
+
+    try:
+        with engine.connect() as conn:
+            rows = conn.execute(text(f"SELECT max(id) FROM {PLAIN}")).scalar()
+            results = {
+                table: time_queries(conn, table, rows, args.users, args.queries, args.seed)
+                for table in (PLAIN, PARTITIONED)
+            }
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE IF EXISTS {PLAIN}, {PARTITIONED}"))
+
+    print(f"{'query':<16} {'table':<12} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name in QUERIES:
+        for table, label in ((PLAIN, "plain"), (PARTITIONED, "partitioned")):
+            timing = results[table][name]
+            print(f"{name:<16} {label:<12} {timing['p50']:8.3f} {timing['p95']:8.3f} {timing['p99']:8.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
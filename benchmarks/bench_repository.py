@@ -0,0 +1,81 @@
+"""
+Per-call overhead of the repository lookups versus equivalent Query chains.
+
+Runs each hot lookup against an in-memory SQLite database, once through
+app.repository (statements built at import, values bound per call) and once
+as the `db.query(...).filter(...).first()` chain the routers used before.
+The database work is the same, so the difference is statement construction
+and compiled cache lookup. Only single-row lookups are compared: loading a
+user's bookmark list is dominated by row processing, which hides the
+difference in noise.
+
+Usage:
+    python -m benchmarks.bench_repository [--calls N] [--bookmarks N]
+"""
+import argparse
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import repository
+from app.database import Base
+from app.models import job, refresh_token, stats  # noqa: F401 (register the remaining tables)
+from app.models.bookmark import Bookmark
+from app.models.user import User
+
+
+def time_calls(db: Session, calls: int, lookup) -> float:
+    """Average microseconds per lookup, with an empty identity map each time."""
+    for _ in range(calls // 10):
+        lookup()
+        db.expunge_all()
+    start = time.perf_counter()
+    for _ in range(calls):
+        lookup()
+        db.expunge_all()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_repository")
+    parser.add_argument("--calls", type=int, default=5000)
+    parser.add_argument("--bookmarks", type=int, default=50, help="Bookmarks of the benchmark user")
+    args = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = Session(engine)
+    user = User(username="bench", email="bench@example.com", hashed_password="x")
+    db.add(user)
+    db.flush()
+    db.add_all(
+        Bookmark(title=f"Bookmark {i}", url=f"https://example.com/{i}", user_id=user.id)
+        for i in range(args.bookmarks)
+    )
+    db.commit()
+    user_id = user.id
+    bookmark_id = args.bookmarks // 2
+
+    lookups = {
+        "user by username": (
+            lambda: db.query(User).filter(User.username == "bench").first(),
+            lambda: repository.get_user_by_username(db, "bench"),
+        ),
+        "bookmark by (id, user_id)": (
+            lambda: db.query(Bookmark).filter(Bookmark.id == bookmark_id, Bookmark.user_id == user_id).first(),
+            lambda: repository.get_bookmark(db, bookmark_id, user_id),
+        ),
+    }
+
+    print(f"{'lookup':<28} {'db.query':>10} {'repository':>11} {'saved':>9}")
+    for name, (chain, cached) in lookups.items():
+        chain_us = time_calls(db, args.calls, chain)
+        cached_us = time_calls(db, args.calls, cached)
+        print(f"{name:<28} {chain_us:8.1f}us {cached_us:9.1f}us {chain_us - cached_us:7.1f}us")
+    db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
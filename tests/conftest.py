@@ -7,6 +7,9 @@ from fastapi.testclient import TestClient
 from app.main import app
 from app.database import Base
 from app.dependencies import get_db
+from app.cache import bookmark_cache
+from app.ratelimit import rate_limiter
+from app import bookmark_events
 
 # Create a test database URL
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -53,5 +56,9 @@ def client(db):
             pass
     
     app.dependency_overrides[get_db] = override_get_db
+    # Test databases are rolled back, so ids repeat between tests
+    bookmark_cache.clear()
+    rate_limiter.backend.reset()
+    bookmark_events.change_broker.reset()
     yield TestClient(app)
     app.dependency_overrides.clear() 
\ No newline at end of file
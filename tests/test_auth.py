@@ -1,9 +1,10 @@
 import pytest
 from sqlalchemy.orm import Session
 from app.models.user import User
-from app.auth.security import get_password_hash, create_access_token
+from app.models.refresh_token import RefreshToken
+from app.auth.security import get_password_hash, create_access_token, hash_refresh_token
 from app.auth.deps import get_current_user
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, UTC
 import time
 from fastapi import HTTPException
 import asyncio
@@ -68,3 +69,88 @@ async def test_token_with_wrong_secret(test_user, db: Session):
     with pytest.raises(HTTPException) as exc_info:
         await get_current_user(wrong_token, db)
     assert exc_info.value.status_code == 401
+
+def login(client, username="authtestuser", password="testpassword"):
+    return client.post("/auth/token", data={"username": username, "password": password})
+
+def test_login_returns_refresh_token(client, test_user):
+    """Test that logging in issues an access and a refresh token"""
+    response = login(client)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["token_type"] == "bearer"
+    assert data["access_token"]
+    assert data["refresh_token"]
+
+def test_login_wrong_password(client, test_user):
+    """Test that a wrong password is rejected"""
+    response = login(client, password="wrong")
+    assert response.status_code == 401
+
+def test_refresh_rotates_tokens(client, test_user):
+    """Test exchanging a refresh token for new tokens"""
+    tokens = login(client).json()
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+    refreshed = response.json()
+    assert refreshed["refresh_token"] != tokens["refresh_token"]
+
+    # The new access token works
+    headers = {"Authorization": f"Bearer {refreshed['access_token']}"}
+    assert client.get("/bookmarks/", headers=headers).status_code == 200
+
+def test_refresh_does_not_check_password(client, test_user, monkeypatch):
+    """Test that renewing tokens skips the bcrypt password check"""
+    tokens = login(client).json()
+    monkeypatch.setattr(User, "verify_password", lambda self, password: pytest.fail("bcrypt called"))
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 200
+
+def test_refresh_token_reuse_revokes_all(client, test_user):
+    """Test that replaying a rotated refresh token revokes the whole family"""
+    first = login(client).json()["refresh_token"]
+    second = client.post("/auth/refresh", json={"refresh_token": first}).json()["refresh_token"]
+
+    assert client.post("/auth/refresh", json={"refresh_token": first}).status_code == 401
+    assert client.post("/auth/refresh", json={"refresh_token": second}).status_code == 401
+
+def test_refresh_unknown_token(client):
+    """Test that an unknown refresh token is rejected"""
+    response = client.post("/auth/refresh", json={"refresh_token": "not-a-token"})
+    assert response.status_code == 401
+
+def test_refresh_expired_token(client, db: Session, test_user):
+    """Test that an expired refresh token is rejected"""
+    tokens = login(client).json()
+    stored = db.query(RefreshToken).filter(
+        RefreshToken.token_hash == hash_refresh_token(tokens["refresh_token"])
+    ).one()
+    stored.expires_at = datetime.now(UTC) - timedelta(seconds=1)
+    db.commit()
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+def test_revoke_refresh_token(client, test_user):
+    """Test that a revoked refresh token can no longer be used"""
+    tokens = login(client).json()
+    assert client.post("/auth/revoke", json={"refresh_token": tokens["refresh_token"]}).status_code == 204
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+
+def test_password_change_revokes_refresh_tokens(client, test_user):
+    """Test that refresh tokens issued before a password change stop working"""
+    tokens = login(client).json()
+    response = client.put(f"/users/users/{test_user.id}", json={"password": "newpassword123"})
+    assert response.status_code == 200
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
+    assert login(client, password="newpassword123").status_code == 200
+
+def test_inactive_user_gets_no_tokens(client, db: Session, test_user):
+    """Test that a deactivated user can neither log in nor refresh"""
+    tokens = login(client).json()
+    test_user.is_active = False
+    db.commit()
+    assert login(client).status_code == 403
+    response = client.post("/auth/refresh", json={"refresh_token": tokens["refresh_token"]})
+    assert response.status_code == 401
@@ -0,0 +1,172 @@
+import json
+
+import pytest
+from sqlalchemy.orm import Session
+from app import bookmark_events
+from app.bookmark_events import EventHistory, InProcessBroker, LocalBus, LocalBusBroker, event_stream, HEARTBEAT
+from app.loadshed import load_shedder
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+
+pytestmark = pytest.mark.sse
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for change event tests"""
+    user = User(
+        email="events@example.com",
+        username="eventsuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+def parse_events(body: str) -> list:
+    """The (id, event, data) of each event in a text/event-stream body"""
+    events = []
+    for block in body.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+def test_history_replay():
+    """Test replaying events after an id, and detecting gaps"""
+    history = EventHistory(size=2)
+    for i in range(3):
+        history.append(1, "bookmark.created", {"id": i})
+    epoch = history.epoch
+    assert [event.id for event in history.since(1, f"{epoch}-1")] == [2, 3]
+    assert history.since(1, f"{epoch}-3") == []
+    # Event 1 has been dropped, and event 4 was never handed out
+    assert history.since(1, f"{epoch}-0") is None
+    assert history.since(1, f"{epoch}-4") is None
+    assert history.since(2, f"{epoch}-0") == []
+
+def test_history_epoch_mismatch():
+    """Test that ids handed out before a restart or reset can't be resumed from"""
+    history = EventHistory()
+    event = history.append(1, "bookmark.created", {"id": 1})
+    assert event.event_id == f"{history.epoch}-1"
+    assert EventHistory().since(1, event.event_id) is None
+    # Ids from before epochs existed
+    assert history.since(1, "1") is None
+    history.clear()
+    assert history.since(1, event.event_id) is None
+    with pytest.raises(ValueError):
+        history.since(1, "abc")
+
+def test_local_bus_fans_out_across_brokers():
+    """Test that an event published on one worker reaches listeners on another"""
+    bus = LocalBus()
+    first, second = LocalBusBroker(bus), LocalBusBroker(bus)
+    received = []
+    second.subscribe(1, received.append)
+    first.subscribe(2, received.append)
+
+    event = first.publish(1, "bookmark.deleted", {"id": 5})
+    assert received == [event]
+    assert second.publish(1, "bookmark.deleted", {"id": 6}).id == 2
+    # The brokers share the bus's numbering, epoch included
+    assert [e.id for e in first.history(1, f"{bus.history.epoch}-0")] == [1, 2]
+
+@pytest.mark.asyncio
+async def test_stream_follows_new_events():
+    """Test that the stream sends published events and heartbeats while idle"""
+    broker = InProcessBroker()
+    stream = event_stream(1, broker=broker, heartbeat=0.05)
+    assert await anext(stream) == HEARTBEAT
+
+    broker.publish(1, "bookmark.created", {"id": 7})
+    broker.publish(2, "bookmark.created", {"id": 8})
+    epoch = broker._history.epoch
+    assert await anext(stream) == f'id: {epoch}-1\nevent: bookmark.created\ndata: {{"id": 7}}\n\n'.encode()
+    assert await anext(stream) == HEARTBEAT
+
+    await stream.aclose()
+    assert broker._listeners == {}
+
+@pytest.mark.asyncio
+async def test_stream_resumes_from_last_event_id():
+    """Test that missed events are replayed, or a reset is sent if they are gone"""
+    broker = InProcessBroker(history_size=2)
+    events = [broker.publish(1, "bookmark.created", {"id": i}) for i in range(3)]
+
+    stream = event_stream(1, last_event_id=events[0].event_id, broker=broker, max_duration=0)
+    assert [chunk async for chunk in stream][1:] == [event.encode() for event in events[1:]]
+
+    stream = event_stream(1, last_event_id=f"{events[0].epoch}-0", broker=broker, max_duration=0)
+    assert [chunk async for chunk in stream] == [HEARTBEAT, b"event: reset\ndata: {}\n\n"]
+
+    # An id from before a restart, even one with a number still in the history
+    stream = event_stream(1, last_event_id=events[0].event_id, broker=InProcessBroker(), max_duration=0)
+    assert [chunk async for chunk in stream] == [HEARTBEAT, b"event: reset\ndata: {}\n\n"]
+
+@pytest.mark.asyncio
+async def test_slow_client_disconnected():
+    """Test that a stream whose buffer overflows ends after draining it"""
+    broker = InProcessBroker()
+    stream = event_stream(1, broker=broker, queue_size=1)
+    await anext(stream)
+    for i in range(3):
+        broker.publish(1, "bookmark.created", {"id": i})
+    assert (await anext(stream)).startswith(f"id: {broker._history.epoch}-1\n".encode())
+    with pytest.raises(StopAsyncIteration):
+        await anext(stream)
+
+def test_events_endpoint(client, auth_headers, monkeypatch):
+    """Test streaming the user's changes made through the API"""
+    monkeypatch.setattr(bookmark_events, "SSE_MAX_STREAM_SECONDS", 0.2)
+    bookmark_id = client.post(
+        "/bookmarks/", json={"title": "A", "url": "https://example.com/a"}, headers=auth_headers
+    ).json()["id"]
+    client.put(f"/bookmarks/{bookmark_id}", json={"title": "B"}, headers=auth_headers)
+    client.delete(f"/bookmarks/{bookmark_id}", headers=auth_headers)
+
+    epoch = bookmark_events.change_broker._history.epoch
+    response = client.get("/bookmarks/events", headers={**auth_headers, "Last-Event-ID": f"{epoch}-0"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert [(event_id, name) for event_id, name, _ in events] == [
+        (f"{epoch}-1", "bookmark.created"), (f"{epoch}-2", "bookmark.updated"), (f"{epoch}-3", "bookmark.deleted")
+    ]
+    assert events[1][2]["title"] == "B"
+    assert events[2][2] == {"id": bookmark_id}
+
+    response = client.get("/bookmarks/events", headers={**auth_headers, "Last-Event-ID": events[1][0]})
+    assert [event_id for event_id, _, _ in parse_events(response.text)] == [f"{epoch}-3"]
+
+    # A plain number, as handed out before ids carried an epoch
+    response = client.get("/bookmarks/events", headers={**auth_headers, "Last-Event-ID": "2"})
+    assert [name for _, name, _ in parse_events(response.text)] == ["reset"]
+
+def test_events_endpoint_validation(client, auth_headers):
+    """Test authentication and Last-Event-ID parsing"""
+    assert client.get("/bookmarks/events").status_code == 401
+    response = client.get("/bookmarks/events", headers={**auth_headers, "Last-Event-ID": "abc"})
+    assert response.status_code == 422
+
+def test_streams_not_load_shed(client, auth_headers, monkeypatch):
+    """Test that event streams bypass the load shedder"""
+    monkeypatch.setattr(bookmark_events, "SSE_MAX_STREAM_SECONDS", 0)
+    monkeypatch.setattr(load_shedder, "in_flight", load_shedder.limit)
+    assert client.get("/bookmarks/", headers=auth_headers).status_code == 503
+    assert client.get("/bookmarks/events", headers=auth_headers).status_code == 200
+
+def test_broker_interface_is_abstract():
+    """Test that a broker must implement the whole interface"""
+    class PublishOnly(bookmark_events.ChangeBroker):
+        def publish(self, user_id, type, data):
+            pass
+
+    with pytest.raises(TypeError):
+        PublishOnly()
@@ -0,0 +1,178 @@
+import threading
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app import repository
+from app.cache import BookmarkCache, LRUCacheBackend, bookmark_cache
+
+pytestmark = pytest.mark.cache
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for cache tests"""
+    user = User(
+        email="cache@example.com",
+        username="cacheuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def test_bookmark(db: Session, test_user):
+    """Create a test bookmark"""
+    bookmark = Bookmark(title="Cached", url="https://example.com/cached", user_id=test_user.id)
+    db.add(bookmark)
+    db.commit()
+    db.refresh(bookmark)
+    return bookmark
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+def rename_behind_cache(db: Session, bookmark: Bookmark, title: str) -> None:
+    """Change a bookmark without going through the API, so nothing is invalidated"""
+    db.execute(update(Bookmark).where(Bookmark.id == bookmark.id).values(title=title))
+    db.commit()
+
+def test_lru_evicts_least_recently_used():
+    """Test eviction by entry count"""
+    cache = LRUCacheBackend(max_entries=2, max_bytes=1000, ttl=60)
+    cache.set((1, 1), b"a")
+    cache.set((1, 2), b"b")
+    cache.get((1, 1))
+    cache.set((1, 3), b"c")
+    assert cache.get((1, 2)) is None
+    assert cache.get((1, 1)) == b"a"
+    assert cache.size() == {"entries": 2, "bytes": 2}
+
+def test_lru_evicts_by_size_and_age():
+    """Test eviction by total bytes and expiry by TTL"""
+    now = [0.0]
+    cache = LRUCacheBackend(max_entries=10, max_bytes=5, ttl=10, clock=lambda: now[0])
+    cache.set((1, 1), b"abc")
+    cache.set((1, 2), b"def")
+    assert cache.get((1, 1)) is None
+    assert cache.get((1, 2)) == b"def"
+    now[0] = 10.0
+    assert cache.get((1, 2)) is None
+    assert cache.size()["bytes"] == 0
+
+def test_lru_delete_user():
+    """Test dropping all entries of one user"""
+    cache = LRUCacheBackend(max_entries=10, max_bytes=1000, ttl=60)
+    cache.set((1, 1), b"a")
+    cache.set((1, 2), b"b")
+    cache.set((2, 1), b"c")
+    cache.delete_user(1)
+    assert cache.size()["entries"] == 1
+    assert cache.get((2, 1)) == b"c"
+
+def test_set_dropped_after_invalidation():
+    """Test that a payload read before an invalidation is not cached after it"""
+    cache = BookmarkCache(LRUCacheBackend(max_entries=10, max_bytes=1000, ttl=60))
+    generation = cache.generation(1, 1)
+    cache.invalidate(1, 1)
+    cache.set(1, 1, {"title": "stale"}, generation)
+    assert cache.get(1, 1) is None
+
+    generation = cache.generation(1, 1)
+    cache.invalidate_user(1)
+    cache.set(1, 1, {"title": "stale"}, generation)
+    assert cache.get(1, 1) is None
+
+    cache.set(1, 1, {"title": "fresh"}, cache.generation(1, 1))
+    assert cache.get(1, 1) == {"title": "fresh"}
+
+def test_read_racing_update_not_cached(client, test_bookmark, auth_headers, monkeypatch):
+    """Test that a read overtaken by an update doesn't cache the old payload"""
+    get_bookmark = repository.get_bookmark
+
+    def read_then_update(db, bookmark_id, user_id):
+        bookmark = get_bookmark(db, bookmark_id, user_id)
+        # An update commits and invalidates while the read is in progress
+        bookmark_cache.invalidate(user_id, bookmark_id)
+        return bookmark
+
+    monkeypatch.setattr(repository, "get_bookmark", read_then_update)
+    assert client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers).status_code == 200
+    assert bookmark_cache.stats()["entries"] == 0
+
+def test_hit_counters_thread_safe():
+    """Test that lookups from several threads are all counted"""
+    cache = BookmarkCache(LRUCacheBackend(max_entries=10, max_bytes=1000, ttl=60))
+    cache.set(1, 1, {"id": 1})
+
+    def lookups():
+        for i in range(2000):
+            cache.get(1, i % 2)
+
+    threads = [threading.Thread(target=lookups) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache.stats()["hits"] == cache.stats()["misses"] == 8000
+
+def test_get_bookmark_is_cached(client, db: Session, test_bookmark, auth_headers):
+    """Test that repeated reads are served from the cache"""
+    assert client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers).json()["title"] == "Cached"
+    rename_behind_cache(db, test_bookmark, "Changed elsewhere")
+    response = client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    assert response.json()["title"] == "Cached"
+    assert bookmark_cache.stats()["hits"] == 1
+    assert bookmark_cache.stats()["misses"] == 1
+
+def test_update_invalidates(client, test_bookmark, auth_headers):
+    """Test that updating a bookmark drops the cached copy"""
+    client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    client.put(f"/bookmarks/{test_bookmark.id}", json={"title": "Updated"}, headers=auth_headers)
+    response = client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    assert response.json()["title"] == "Updated"
+
+def test_delete_invalidates(client, test_bookmark, auth_headers):
+    """Test that a deleted bookmark is not served from the cache"""
+    client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    client.delete(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    response = client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    assert response.status_code == 404
+
+def test_user_deletion_invalidates(client, test_user, test_bookmark, auth_headers):
+    """Test that deleting a user drops their cached bookmarks"""
+    client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    assert bookmark_cache.stats()["entries"] == 1
+    client.delete(f"/users/users/{test_user.id}")
+    assert bookmark_cache.stats()["entries"] == 0
+
+def test_cache_is_per_user(client, db: Session, test_bookmark, auth_headers):
+    """Test that a cached bookmark is not served to another user"""
+    client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    other = User(email="other-cache@example.com", username="othercache", hashed_password="x")
+    db.add(other)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': other.username})}"}
+    assert client.get(f"/bookmarks/{test_bookmark.id}", headers=headers).status_code == 404
+
+def test_cache_metrics(client, db: Session, test_user, test_bookmark, auth_headers):
+    """Test reporting hit ratio and memory footprint to admins"""
+    client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    client.get(f"/bookmarks/{test_bookmark.id}", headers=auth_headers)
+    assert client.get("/metrics/cache", headers=auth_headers).status_code == 403
+    # test_user was detached by the request's principal lookup
+    db.execute(update(User).where(User.id == test_user.id).values(is_admin=True))
+    db.commit()
+    response = client.get("/metrics/cache", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["hit_ratio"] == 0.5
+    assert data["entries"] == 1
+    assert data["bytes"] > 0
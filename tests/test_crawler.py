@@ -0,0 +1,244 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from types import SimpleNamespace
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.auth.security import get_password_hash
+from app import bookmark_events
+from app.crawler import Crawler, MetadataParser, is_public_address
+
+pytestmark = pytest.mark.crawler
+
+PAGE = b"""<html><head>
+<title>
+  Example   Page
+</title>
+<meta name="description" content="An example page">
+</head><body>Hello</body></html>"""
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Local stand-in for the sites bookmarks point to"""
+
+    def do_GET(self):
+        if self.path == "/page":
+            if self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("ETag", '"v1"')
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+        elif self.path == "/moved":
+            self.send_response(301)
+            self.send_header("Location", "/page")
+            self.end_headers()
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def stand_in_server():
+    """Serve StandInHandler on a free local port"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for crawler tests"""
+    user = User(
+        email="crawler@example.com",
+        username="crawleruser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+def fake_resolver(addresses: dict):
+    """A resolver answering from `addresses` (host name to IP addresses)"""
+    async def resolve(host, port):
+        return addresses[host]
+    return resolve
+
+def mock_crawler(handler, **options) -> Crawler:
+    """A crawler on a mock transport whose hosts all resolve to a public address"""
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    async def resolve(host, port):
+        return ["93.184.216.34"]
+    return Crawler(client=client, resolver=resolve, **options)
+
+def add_bookmark(db: Session, user: User, url: str, **fields) -> Bookmark:
+    bookmark = Bookmark(title="Bookmark", url=url, user_id=user.id, **fields)
+    db.add(bookmark)
+    db.commit()
+    return bookmark
+
+def test_metadata_parser():
+    """Test extracting title and description from HTML"""
+    parser = MetadataParser()
+    parser.feed(PAGE.decode())
+    assert parser.title == "Example Page"
+    assert parser.description == "An example page"
+
+@pytest.mark.asyncio
+async def test_crawl_writes_back_results(db: Session, test_user, stand_in_server):
+    """Test that link status, final URL and title are stored"""
+    ok = add_bookmark(db, test_user, f"{stand_in_server}/page")
+    moved = add_bookmark(db, test_user, f"{stand_in_server}/moved", description="Keep me")
+    missing = add_bookmark(db, test_user, f"{stand_in_server}/missing")
+    unreachable = add_bookmark(db, test_user, "http://127.0.0.1:1/")
+
+    stats = await Crawler(batch_size=2, allow_private=True).crawl(db, user_id=test_user.id)
+
+    assert stats.total == 4
+    assert stats.failed == 1
+    assert stats.throughput > 0
+    for bookmark in (ok, moved, missing, unreachable):
+        db.refresh(bookmark)
+    assert ok.link_status == 200
+    assert ok.page_title == "Example Page"
+    assert ok.description == "An example page"
+    assert ok.etag == '"v1"'
+    assert ok.checked_at is not None
+    assert moved.final_url == f"{stand_in_server}/page"
+    assert moved.description == "Keep me"
+    assert missing.link_status == 404
+    assert unreachable.link_status is None
+    assert unreachable.crawl_error
+
+@pytest.mark.asyncio
+async def test_crawl_sends_conditional_requests(db: Session, test_user, stand_in_server):
+    """Test that a stored ETag turns into a 304 that keeps the stored metadata"""
+    bookmark = add_bookmark(db, test_user, f"{stand_in_server}/page")
+    await Crawler(allow_private=True).crawl(db, user_id=test_user.id)
+
+    stats = await Crawler(allow_private=True).crawl(db, user_id=test_user.id)
+
+    assert stats.not_modified == 1
+    db.refresh(bookmark)
+    assert bookmark.link_status == 304
+    assert bookmark.page_title == "Example Page"
+
+@pytest.mark.asyncio
+async def test_busy_host_does_not_hold_global_slots():
+    """Test that requests queued for a busy host leave the global slots to other hosts"""
+    release = asyncio.Event()
+
+    async def handler(request):
+        if request.url.host == "slow.example":
+            await release.wait()
+        return httpx.Response(204)
+
+    crawler = Crawler(concurrency=2, per_host=1, resolver=fake_resolver({
+        "slow.example": ["93.184.216.34"], "fast.example": ["93.184.216.35"]
+    }))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        def fetch(url):
+            return asyncio.create_task(crawler.fetch(client, SimpleNamespace(id=1, url=url, etag=None, last_modified=None)))
+
+        slow = [fetch("http://slow.example/1"), fetch("http://slow.example/2")]
+        await asyncio.sleep(0)
+        # Two slow requests and a concurrency of two: the fast host still gets a slot
+        assert (await asyncio.wait_for(fetch("http://fast.example/"), 1)).status == 204
+        release.set()
+        assert [result.status for result in await asyncio.gather(*slow)] == [204, 204]
+
+def test_public_addresses():
+    """Test telling public from internal addresses"""
+    assert is_public_address("93.184.216.34")
+    assert is_public_address("2606:2800:220:1::1")
+    for address in ("127.0.0.1", "10.1.2.3", "192.168.0.1", "169.254.169.254", "100.64.0.1",
+                    "0.0.0.0", "::1", "fe80::1%eth0", "fd00::1", "::ffff:127.0.0.1", "224.0.0.1"):
+        assert not is_public_address(address), address
+
+@pytest.mark.asyncio
+async def test_internal_addresses_refused():
+    """Test that URLs and redirects pointing at internal hosts are not fetched"""
+    requested = []
+
+    async def handler(request):
+        requested.append(str(request.url))
+        return httpx.Response(302, headers={"Location": "http://169.254.169.254/latest/meta-data/"})
+
+    crawler = Crawler(resolver=fake_resolver({
+        "public.example": ["93.184.216.34"],
+        "internal.example": ["10.0.0.5"],
+        "mixed.example": ["93.184.216.34", "127.0.0.1"],
+    }))
+    async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+        for url in ("http://127.0.0.1/", "http://internal.example/", "http://mixed.example/", "http://public.example/"):
+            result = await crawler.fetch(client, SimpleNamespace(id=1, url=url, etag=None, last_modified=None))
+            assert result.status is None
+            assert result.error.startswith("BlockedAddress"), result.error
+    # Only the public host was contacted; its redirect was not followed
+    assert requested == ["http://public.example/"]
+
+@pytest.mark.asyncio
+async def test_unexpected_errors_recorded(db: Session, test_user):
+    """Test that any error fetching one URL is recorded without ending the crawl"""
+    async def handler(request):
+        if request.url.host == "broken.example":
+            raise RuntimeError("boom")
+        return httpx.Response(200, headers={"Content-Type": "text/html"}, content=PAGE)
+
+    broken = add_bookmark(db, test_user, "http://broken.example/")
+    ok = add_bookmark(db, test_user, "http://ok.example/")
+    stats = await mock_crawler(handler).crawl(db, user_id=test_user.id)
+
+    assert stats.total == 2
+    assert stats.failed == 1
+    for bookmark in (broken, ok):
+        db.refresh(bookmark)
+    assert broken.crawl_error == "RuntimeError: boom"
+    assert ok.page_title == "Example Page"
+
+@pytest.mark.asyncio
+async def test_description_saved_during_fetch_kept(db: Session, test_user):
+    """Test that a description the user saves while the page is fetched is not overwritten"""
+    bookmark = add_bookmark(db, test_user, "http://page.example/")
+
+    async def handler(request):
+        # The user edits the bookmark meanwhile
+        db.execute(update(Bookmark).where(Bookmark.id == bookmark.id).values(description="Mine"))
+        return httpx.Response(200, headers={"Content-Type": "text/html"}, content=PAGE)
+
+    await mock_crawler(handler).crawl(db, user_id=test_user.id)
+    db.refresh(bookmark)
+    assert bookmark.description == "Mine"
+    assert bookmark.page_title == "Example Page"
+
+@pytest.mark.asyncio
+async def test_crawl_publishes_changes(db: Session, test_user):
+    """Test that crawled bookmarks are published as updated"""
+    bookmark_events.change_broker.reset()
+    bookmark = add_bookmark(db, test_user, "http://page.example/")
+
+    async def handler(request):
+        return httpx.Response(200, headers={"Content-Type": "text/html"}, content=PAGE)
+
+    await mock_crawler(handler).crawl(db, user_id=test_user.id)
+    broker = bookmark_events.change_broker
+    [event] = broker.history(test_user.id, f"{broker._history.epoch}-0")
+    assert event.type == "bookmark.updated"
+    assert event.data["id"] == bookmark.id
+    assert event.data["page_title"] == "Example Page"
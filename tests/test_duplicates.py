@@ -0,0 +1,129 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.urls import canonicalize_url, url_hash
+from app.manage import backfill_url_hashes
+
+pytestmark = pytest.mark.bookmarks
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for duplicate detection tests"""
+    user = User(
+        email="dupes@example.com",
+        username="dupesuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def test_bookmark(db: Session, test_user):
+    """Create a test bookmark"""
+    bookmark = Bookmark(
+        title="Docs",
+        description="Python docs",
+        url="https://docs.python.org/3/",
+        user_id=test_user.id
+    )
+    db.add(bookmark)
+    db.commit()
+    db.refresh(bookmark)
+    return bookmark
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.mark.parametrize("variant", [
+    "https://docs.python.org/3",
+    "HTTPS://Docs.Python.org:443/3/",
+    "https://docs.python.org/3/?utm_source=newsletter&utm_medium=email",
+    "https://docs.python.org/3/#tutorial",
+])
+def test_canonicalize_url_variants(variant):
+    """Test that trivially different spellings share a canonical form"""
+    assert canonicalize_url(variant) == "https://docs.python.org/3"
+    assert url_hash(variant) == url_hash("https://docs.python.org/3/")
+
+def test_canonicalize_url_keeps_meaningful_parts():
+    """Test that non-default ports and real query parameters are kept"""
+    assert canonicalize_url("http://example.com:8080/a?b=2&a=1&fbclid=x") == "http://example.com:8080/a?a=1&b=2"
+    assert url_hash("https://example.com/a") != url_hash("https://example.com/b")
+
+def test_url_hash_is_set_on_model(test_bookmark):
+    """Test that assigning a URL keeps the hash column in sync"""
+    assert test_bookmark.url_hash == url_hash("https://docs.python.org/3")
+    test_bookmark.url = "https://example.com/"
+    assert test_bookmark.url_hash == url_hash("https://example.com")
+
+def test_lookup_saved_url(client, test_bookmark, auth_headers):
+    """Test looking up a saved URL under a different spelling"""
+    response = client.get(
+        "/bookmarks/lookup",
+        params={"url": "https://DOCS.python.org/3?utm_campaign=x"},
+        headers=auth_headers
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["saved"] is True
+    assert data["bookmark"]["id"] == test_bookmark.id
+
+def test_lookup_unsaved_url(client, test_bookmark, auth_headers):
+    """Test looking up a URL that is not saved"""
+    response = client.get("/bookmarks/lookup", params={"url": "https://example.org/"}, headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == {"url": "https://example.org/", "saved": False, "bookmark": None}
+
+def test_lookup_invalid_port(client, auth_headers):
+    """Test that a URL with an unparseable port is rejected, not a server error"""
+    for url in ("http://example.com:abc/", "http://example.com:99999/"):
+        response = client.get("/bookmarks/lookup", params={"url": url}, headers=auth_headers)
+        assert response.status_code == 422
+
+def test_create_duplicate_allowed_by_default(client, test_bookmark, auth_headers):
+    """Test that duplicates are stored unless another mode is requested"""
+    bookmark_data = {"title": "Again", "url": "https://docs.python.org/3"}
+    response = client.post("/bookmarks/", json=bookmark_data, headers=auth_headers)
+    assert response.status_code == 201
+    assert response.json()["id"] != test_bookmark.id
+
+def test_create_duplicate_rejected(client, test_bookmark, auth_headers):
+    """Test rejecting a duplicate bookmark"""
+    bookmark_data = {"title": "Again", "url": "https://docs.python.org/3?utm_source=x"}
+    response = client.post("/bookmarks/?on_duplicate=reject", json=bookmark_data, headers=auth_headers)
+    assert response.status_code == 409
+
+def test_create_duplicate_merged(client, test_bookmark, auth_headers):
+    """Test merging a duplicate bookmark into the saved one"""
+    bookmark_data = {"title": "Python 3 docs", "url": "https://docs.python.org/3"}
+    response = client.post("/bookmarks/?on_duplicate=merge", json=bookmark_data, headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["id"] == test_bookmark.id
+    assert data["title"] == "Python 3 docs"
+    assert data["description"] == "Python docs"
+
+def test_update_to_duplicate_rejected(client, db: Session, test_bookmark, auth_headers, monkeypatch):
+    """Test that changing a URL to an already saved one is rejected when duplicates are not allowed"""
+    monkeypatch.setattr("app.api.bookmarks.DUPLICATE_BOOKMARK_MODE", "reject")
+    other = Bookmark(title="Other", url="https://example.com/", user_id=test_bookmark.user_id)
+    db.add(other)
+    db.commit()
+    response = client.put(f"/bookmarks/{other.id}", json={"url": "https://docs.python.org/3"}, headers=auth_headers)
+    assert response.status_code == 409
+
+def test_backfill_url_hashes(db: Session, test_bookmark):
+    """Test hashing URLs of bookmarks stored without a hash"""
+    db.execute(update(Bookmark).where(Bookmark.id == test_bookmark.id).values(url_hash=None))
+    db.commit()
+    assert backfill_url_hashes(db, batch_size=1) == 1
+    db.refresh(test_bookmark)
+    assert test_bookmark.url_hash == url_hash(test_bookmark.url)
@@ -0,0 +1,175 @@
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.main import STREAMING_PATHS
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.event_log import (
+    EventSampler,
+    JsonFormatter,
+    NonBlockingQueueHandler,
+    RequestTimingMiddleware,
+    log_event,
+    parse_sample_rates,
+    setup_event_logging,
+    shutdown_event_logging,
+)
+
+pytestmark = pytest.mark.events
+
+
+class CollectingHandler(logging.Handler):
+    """Keep formatted records in memory"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+    @property
+    def events(self):
+        return [json.loads(line) for line in self.lines]
+
+
+@pytest.fixture
+def events():
+    """Route event logging to an in-memory handler through the queue"""
+    handler = CollectingHandler()
+    setup_event_logging(handler)
+    yield handler
+    shutdown_event_logging()
+
+def flush():
+    """Stop the listener so that all queued events are written"""
+    shutdown_event_logging()
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for event logging tests"""
+    user = User(
+        email="events@example.com",
+        username="eventsuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+def test_events_are_json(events):
+    """Test that events are written as JSON objects with their fields"""
+    log_event("bookmark.created", user_id=1, bookmark_id=2)
+    flush()
+    [event] = events.events
+    assert event["event"] == "bookmark.created"
+    assert event["level"] == "INFO"
+    assert event["user_id"] == 1
+    assert event["bookmark_id"] == 2
+    assert "ts" in event
+
+def test_events_written_by_background_thread(events, monkeypatch):
+    """Test that the calling thread only enqueues"""
+    emitted_in = []
+    monkeypatch.setattr(events, "emit", lambda record: emitted_in.append(threading.get_ident()))
+    log_event("user.created", user_id=1)
+    flush()
+    assert emitted_in and emitted_in[0] != threading.get_ident()
+
+def test_full_queue_drops_instead_of_blocking():
+    """Test that a full queue drops events and counts them"""
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    record = logging.LogRecord("app.events", logging.INFO, "", 0, "event", None, None)
+    handler.emit(record)
+    handler.emit(record)
+    assert handler.dropped == 1
+
+def test_sampling():
+    """Test that sampled events are kept at roughly the configured rate"""
+    sampler = EventSampler(parse_sample_rates("auth.refresh=0.1, request.slow=1"), rng=random.Random(42))
+    kept = sum(sampler.keep("auth.refresh") for _ in range(10_000))
+    assert 800 < kept < 1200
+    assert all(sampler.keep("request.slow") for _ in range(100))
+    assert all(sampler.keep("bookmark.created") for _ in range(100))
+
+def test_formatter_includes_exception():
+    """Test that exceptions are formatted into the event"""
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("app.events", logging.ERROR, "", 0, "job.failed", None, sys.exc_info())
+    assert "ValueError: boom" in json.loads(JsonFormatter().format(record))["exc"]
+
+def test_login_events(client, test_user, events):
+    """Test that logins are logged without leaking passwords"""
+    client.post("/auth/token", data={"username": "eventsuser", "password": "testpassword"})
+    client.post("/auth/token", data={"username": "eventsuser", "password": "wrong"})
+    client.post("/auth/token", data={"username": "s3cret-typed-here", "password": "x"})
+    flush()
+    names = [event["event"] for event in events.events]
+    assert names == ["auth.login.success", "auth.login.failure", "auth.login.failure"]
+    assert "wrong" not in "".join(events.lines)
+    # The submitted username may be a password typed into the wrong field
+    assert "s3cret-typed-here" not in "".join(events.lines)
+    assert events.events[1]["username_digest"] != events.events[2]["username_digest"]
+
+def test_bookmark_events(client, test_user, events):
+    """Test that bookmark writes are logged"""
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': test_user.username})}"}
+    bookmark_id = client.post(
+        "/bookmarks/", json={"title": "t", "url": "https://example.com/"}, headers=headers
+    ).json()["id"]
+    client.put(f"/bookmarks/{bookmark_id}", json={"title": "u"}, headers=headers)
+    client.delete(f"/bookmarks/{bookmark_id}", headers=headers)
+    flush()
+    assert [event["event"] for event in events.events] == ["bookmark.created", "bookmark.updated", "bookmark.deleted"]
+    assert all(event["bookmark_id"] == bookmark_id for event in events.events)
+
+def test_slow_request_event(events):
+    """Test that requests above the threshold are logged"""
+    inner = FastAPI()
+
+    @inner.get("/slow")
+    async def slow():
+        return {"ok": True}
+
+    TestClient(RequestTimingMiddleware(inner, threshold_ms=-1)).get("/slow")
+    flush()
+    [event] = events.events
+    assert event["event"] == "request.slow"
+    assert event["level"] == "WARNING"
+    assert event["path"] == "/slow"
+    assert event["status"] == 200
+
+def test_streams_not_logged_as_slow(events):
+    """Test that long-lived streams, exports included, are not logged as slow"""
+    inner = FastAPI()
+
+    @inner.get("/bookmarks/export")
+    async def export():
+        return {"ok": True}
+
+    TestClient(RequestTimingMiddleware(inner, threshold_ms=-1, exempt_paths=STREAMING_PATHS)).get("/bookmarks/export")
+    flush()
+    assert events.events == []
+
+def test_fast_request_not_logged(events):
+    """Test that requests below the threshold are not logged"""
+    inner = FastAPI()
+
+    @inner.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    TestClient(RequestTimingMiddleware(inner, threshold_ms=60_000)).get("/fast")
+    flush()
+    assert events.events == []
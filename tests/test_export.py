@@ -0,0 +1,113 @@
+import csv
+import gzip
+import io
+import json
+
+import pytest
+from sqlalchemy.orm import Session
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.export import encode_bookmarks, gzip_stream, iter_bookmark_rows
+from app.importer import parse_bookmarks
+from app.tags import set_bookmark_tags
+
+pytestmark = pytest.mark.bookmarks
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user with a few bookmarks"""
+    user = User(
+        email="export@example.com",
+        username="exportuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    bookmarks = [
+        Bookmark(title="First", description="Has <markup> & more", url="https://example.com/1", user_id=user.id),
+        Bookmark(title="Second, with comma", url="https://example.com/2", user_id=user.id),
+        Bookmark(title="Third", description="Line\nbreak", url="https://example.com/3", user_id=user.id),
+    ]
+    db.add_all(bookmarks)
+    db.flush()
+    set_bookmark_tags(db, bookmarks[1], ["news"])
+    set_bookmark_tags(db, bookmarks[2], ["python", "r&d"])
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+def test_export_ndjson(client, auth_headers):
+    """Test exporting bookmarks as newline delimited JSON"""
+    response = client.get("/bookmarks/export?format=ndjson", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert 'filename="bookmarks.ndjson"' in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert [row["title"] for row in rows] == ["First", "Second, with comma", "Third"]
+    assert rows[2]["description"] == "Line\nbreak"
+    assert [row["tags"] for row in rows] == [[], ["news"], ["python", "r&d"]]
+
+def test_export_csv(client, auth_headers):
+    """Test exporting bookmarks as CSV"""
+    response = client.get("/bookmarks/export?format=csv", headers=auth_headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == 3
+    assert rows[1]["title"] == "Second, with comma"
+    assert rows[2]["description"] == "Line\nbreak"
+    assert rows[2]["tags"] == "python,r&d"
+
+def test_export_html(client, auth_headers):
+    """Test exporting bookmarks as a Netscape bookmark file"""
+    response = client.get("/bookmarks/export?format=html", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.text.startswith("<!DOCTYPE NETSCAPE-Bookmark-file-1>")
+    assert '<DT><A HREF="https://example.com/1">First</A>' in response.text
+    assert "<DD>Has &lt;markup&gt; &amp; more" in response.text
+    assert '<DT><A HREF="https://example.com/3" TAGS="python,r&amp;d">Third</A>' in response.text
+
+def test_export_gzip(client, auth_headers):
+    """Test that the export can be compressed on the fly"""
+    response = client.get("/bookmarks/export?format=ndjson&gzip=true", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.text.splitlines()) == 3
+
+def test_export_only_own_bookmarks(client, db: Session, test_user):
+    """Test that other users' bookmarks are not exported"""
+    other = User(email="other-export@example.com", username="otherexport", hashed_password="x")
+    db.add(other)
+    db.commit()
+    token = create_access_token(data={"sub": other.username})
+    response = client.get("/bookmarks/export?format=ndjson", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.text == ""
+
+def test_export_is_chunked(db: Session, test_user):
+    """Test that encoders and compression produce a lazy stream"""
+    chunks = encode_bookmarks(iter_bookmark_rows(db, test_user.id), "csv")
+    compressed = b"".join(gzip_stream(chunks))
+    assert gzip.decompress(compressed).decode().startswith("id,title,description,url,tags")
+
+@pytest.mark.parametrize("format", ["ndjson", "csv", "html"])
+def test_export_import_round_trip(db: Session, test_user, format):
+    """Test that an export read back by the importer keeps every bookmark with its tags"""
+    data = b"".join(encode_bookmarks(iter_bookmark_rows(db, test_user.id), format))
+    imported = [
+        {"title": row["title"], "url": row["url"], "description": row.get("description"), "tags": row.get("tags")}
+        for row in parse_bookmarks(data, format)
+    ]
+    # Netscape bookmark files keep descriptions on one line
+    third_description = "Line break" if format == "html" else "Line\nbreak"
+    assert imported == [
+        {"title": "First", "url": "https://example.com/1", "description": "Has <markup> & more", "tags": []},
+        {"title": "Second, with comma", "url": "https://example.com/2", "description": None, "tags": ["news"]},
+        {"title": "Third", "url": "https://example.com/3", "description": third_description, "tags": ["python", "r&d"]},
+    ]
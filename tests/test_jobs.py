@@ -0,0 +1,382 @@
+import json
+from datetime import datetime, UTC
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+from app import bookmark_events, job_files
+from app.job_files import LocalJobFileStore
+from app.jobs import HANDLERS, JobContext, LeaseLost, Worker, cancel_job, claim_job, enqueue, retry_delay
+from app.importer import parse_bookmarks
+from app.models.bookmark import Bookmark
+from app.models.job import Job
+from app.models.stats import UserStats
+from app.models.tag import Tag
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+
+pytestmark = pytest.mark.jobs
+
+BOOKMARK_FILE = b"""<!DOCTYPE NETSCAPE-Bookmark-file-1>
+<TITLE>Bookmarks</TITLE>
+<DL><p>
+    <DT><H3>Folder</H3>
+    <DL><p>
+        <DT><A HREF="https://example.com/a" TAGS="python,web">Example &amp; A</A>
+        <DD>First one
+        <DT><A HREF="https://example.com/b">B</A>
+        <DT><A HREF="https://EXAMPLE.com/a?utm_source=feed">Same as A</A>
+        <DT><A HREF="not a url">Broken</A>
+    </DL><p>
+</DL><p>
+"""
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for job tests"""
+    user = User(
+        email="jobs@example.com",
+        username="jobsuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(autouse=True)
+def file_store(tmp_path, monkeypatch):
+    """Keep job files in a temporary directory"""
+    monkeypatch.setattr(job_files, "store", LocalJobFileStore(str(tmp_path)))
+    return tmp_path
+
+@pytest.fixture
+def worker(db: Session):
+    """A worker using its own sessions inside the test transaction"""
+    def session_factory():
+        return Session(bind=db.connection(), join_transaction_mode="create_savepoint")
+    return Worker(session_factory=session_factory, poll_interval=0)
+
+def run_jobs(worker, db: Session) -> int:
+    """Run all due jobs and make the test session see their changes"""
+    processed = worker.run(burst=True)
+    db.expire_all()
+    return processed
+
+def test_parse_formats():
+    """Test that all export formats can be read back"""
+    html = list(parse_bookmarks(BOOKMARK_FILE, "html"))
+    assert [item["url"] for item in html] == [
+        "https://example.com/a", "https://example.com/b", "https://EXAMPLE.com/a?utm_source=feed", "not a url"
+    ]
+    assert html[0] == {"title": "Example & A", "url": "https://example.com/a", "description": "First one", "tags": ["python", "web"]}
+    assert html[1]["description"] is None
+
+    csv = list(parse_bookmarks(b"id,title,description,url\n1,A,,https://example.com/a\n", "csv"))
+    assert csv == [{"title": "A", "url": "https://example.com/a", "description": None, "tags": []}]
+
+    ndjson = list(parse_bookmarks(b'{"title": "A", "url": "https://example.com/a"}\n\nnot json\n', "ndjson"))
+    assert ndjson == [{"title": "A", "url": "https://example.com/a"}, {}]
+
+def test_parse_html_in_chunks(monkeypatch):
+    """Test that entities and tags split between read chunks are parsed intact"""
+    monkeypatch.setattr("app.importer.HTML_CHUNK_CHARS", 7)
+    assert list(parse_bookmarks(BOOKMARK_FILE, "html"))[0]["title"] == "Example & A"
+
+def test_import_job(client, db: Session, worker, test_user, auth_headers, file_store):
+    """Test importing a bookmark file in the background"""
+    response = client.post(
+        "/jobs/import?format=html",
+        files={"file": ("bookmarks.html", BOOKMARK_FILE, "text/html")},
+        headers=auth_headers
+    )
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] == "queued"
+    assert job["kind"] == "import_bookmarks"
+
+    assert run_jobs(worker, db) == 1
+    job = client.get(f"/jobs/{job['id']}", headers=auth_headers).json()
+    assert job["status"] == "succeeded"
+    assert job["progress"] == job["total"] == 4
+    assert job["result"] == {"imported": 2, "duplicates": 1, "invalid": 1}
+    # The upload is removed once the job has finished
+    assert list(file_store.iterdir()) == []
+
+    bookmarks = client.get("/bookmarks/", headers=auth_headers).json()
+    assert {bookmark["title"]: bookmark["tags"] for bookmark in bookmarks} == {
+        "Example & A": ["python", "web"], "B": []
+    }
+    tags = client.get("/bookmarks/tags", headers=auth_headers).json()
+    assert {tag["name"]: tag["count"] for tag in tags} == {"python": 1, "web": 1}
+    assert client.get("/bookmarks/stats", headers=auth_headers).json()["total"] == 2
+
+def test_import_resumes_after_checkpoint(db: Session, worker, test_user, monkeypatch):
+    """Test that a retried import skips the rows an earlier attempt committed"""
+    monkeypatch.setattr("app.jobs.JOB_BATCH_SIZE", 1)
+    data = b"".join(
+        json.dumps({"title": str(i), "url": f"https://example.com/{i}"}).encode() + b"\n" for i in range(3)
+    )
+    name = job_files.new_file_name("import")
+    job_files.store.write(name, [data])
+    job = enqueue(db, "import_bookmarks", user_id=test_user.id, payload={"format": "ndjson"}, input_file=name)
+    # As if an earlier attempt died after committing the first row
+    db.add(Bookmark(title="0", url="https://example.com/0", user_id=test_user.id))
+    db.execute(update(Job).where(Job.id == job.id).values(progress=1, result={"imported": 1}))
+    db.commit()
+
+    run_jobs(worker, db)
+    job = db.get(Job, job.id)
+    assert job.status == "succeeded"
+    assert job.result == {"imported": 3, "duplicates": 0, "invalid": 0}
+    assert job.progress == job.total == 3
+    assert db.query(Bookmark).filter(Bookmark.user_id == test_user.id).count() == 3
+
+def test_import_too_large(client, test_user, auth_headers, monkeypatch, file_store):
+    """Test that an oversized upload is refused and nothing is kept"""
+    monkeypatch.setattr("app.api.jobs.JOB_MAX_UPLOAD_BYTES", 100)
+    monkeypatch.setattr("app.api.jobs.UPLOAD_CHUNK_BYTES", 64)
+    response = client.post(
+        "/jobs/import?format=html",
+        files={"file": ("bookmarks.html", BOOKMARK_FILE, "text/html")},
+        headers=auth_headers
+    )
+    assert response.status_code == 413
+    assert list(file_store.iterdir()) == []
+    assert client.get("/jobs/", headers=auth_headers).json() == []
+
+def test_export_job(client, db: Session, worker, test_user, auth_headers):
+    """Test exporting to a file in the job file store"""
+    for i in range(3):
+        client.post("/bookmarks/", json={"title": str(i), "url": f"https://example.com/{i}"}, headers=auth_headers)
+    job_id = client.post("/jobs/export?format=ndjson", headers=auth_headers).json()["id"]
+
+    response = client.get(f"/jobs/{job_id}/output", headers=auth_headers)
+    assert response.status_code == 409
+
+    run_jobs(worker, db)
+    job = client.get(f"/jobs/{job_id}", headers=auth_headers).json()
+    assert job["result"]["exported"] == 3
+    response = client.get(f"/jobs/{job_id}/output", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["0", "1", "2"]
+
+def test_delete_account_job(client, db: Session, worker, test_user, auth_headers, monkeypatch):
+    """Test deleting a user and their bookmarks in batches"""
+    monkeypatch.setattr("app.jobs.JOB_BATCH_SIZE", 2)
+    for i in range(5):
+        client.post(
+            "/bookmarks/", json={"title": str(i), "url": f"https://example.com/{i}", "tags": ["t"]}, headers=auth_headers
+        )
+    user_id = test_user.id
+    first = client.post("/jobs/delete-account", headers=auth_headers).json()
+    again = client.post("/jobs/delete-account", headers=auth_headers).json()
+    assert again["id"] == first["id"]
+
+    run_jobs(worker, db)
+    job = db.get(Job, first["id"])
+    assert job.status == "succeeded"
+    assert job.result == {"deleted_bookmarks": 5}
+    assert db.get(User, user_id) is None
+    assert db.query(Bookmark).filter(Bookmark.user_id == user_id).count() == 0
+
+def test_delete_account_removes_jobs(client, db: Session, worker, test_user, auth_headers, file_store):
+    """Test that the user's other jobs and their files go with the account"""
+    client.post("/bookmarks/", json={"title": "A", "url": "https://example.com/a"}, headers=auth_headers)
+    export_id = client.post("/jobs/export", headers=auth_headers).json()["id"]
+    run_jobs(worker, db)
+    assert db.get(Job, export_id).output_file is not None
+    user_id = test_user.id
+
+    job_id = client.post("/jobs/delete-account", headers=auth_headers).json()["id"]
+    run_jobs(worker, db)
+    assert db.get(Job, job_id).status == "succeeded"
+    assert [job.id for job in db.query(Job).filter(Job.user_id == user_id)] == [job_id]
+    assert list(file_store.iterdir()) == []
+
+def test_failed_deletion_reactivates_user(client, db: Session, worker, test_user, auth_headers, monkeypatch):
+    """Test that a deletion out of attempts gives the account back, so it can be retried"""
+    client.post("/bookmarks/", json={"title": "A", "url": "https://example.com/a"}, headers=auth_headers)
+
+    def broken(db, ids):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr("app.jobs.release_tags_of_bookmarks", broken)
+    job = enqueue(db, "delete_user", user_id=test_user.id, max_attempts=1)
+    run_jobs(worker, db)
+    assert db.get(Job, job.id).status == "failed"
+    assert db.get(User, test_user.id).is_active
+
+    response = client.post("/jobs/delete-account", headers=auth_headers)
+    assert response.status_code == 202
+    assert response.json()["id"] != job.id
+
+def test_cancelled_deletion_keeps_counts(client, db: Session, worker, test_user, auth_headers, monkeypatch):
+    """Test that statistics and tag counts match the bookmarks a cancelled deletion leaves"""
+    monkeypatch.setattr("app.jobs.JOB_BATCH_SIZE", 2)
+    for i in range(5):
+        client.post(
+            "/bookmarks/", json={"title": str(i), "url": f"https://example.com/{i}", "tags": ["t"]}, headers=auth_headers
+        )
+    checkpoint = JobContext.checkpoint
+
+    def cancel_after_two_batches(ctx, progress, **kwargs):
+        if progress == 4:
+            # As if cancelled through the API meanwhile
+            cancel_job(ctx.db, ctx.job)
+        checkpoint(ctx, progress, **kwargs)
+
+    monkeypatch.setattr(JobContext, "checkpoint", cancel_after_two_batches)
+    job_id = client.post("/jobs/delete-account", headers=auth_headers).json()["id"]
+    run_jobs(worker, db)
+    assert db.get(Job, job_id).status == "cancelled"
+
+    user = db.get(User, test_user.id)
+    assert user.is_active
+    assert db.query(Bookmark).filter(Bookmark.user_id == user.id).count() == 1
+    assert db.get(UserStats, user.id).bookmark_count == 1
+    assert db.query(Tag).filter(Tag.user_id == user.id, Tag.name == "t").one().bookmark_count == 1
+    assert client.get("/bookmarks/stats", headers=auth_headers).json()["total"] == 1
+
+def test_inactive_user_rejected(client, db: Session, test_user, auth_headers):
+    """Test that the tokens of a deactivated user are refused"""
+    assert client.get("/bookmarks/", headers=auth_headers).status_code == 200
+    db.execute(update(User).where(User.id == test_user.id).values(is_active=False))
+    db.commit()
+    response = client.get("/bookmarks/", headers=auth_headers)
+    assert response.status_code == 403
+    assert response.json()["detail"] == "Inactive user"
+
+def test_retry_with_backoff(db: Session, worker, monkeypatch):
+    """Test that a failed attempt is retried later and can then succeed"""
+    calls = []
+
+    def flaky(ctx):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("temporary")
+        return {"ok": True}
+
+    monkeypatch.setitem(HANDLERS, "flaky", flaky)
+    job = enqueue(db, "flaky")
+
+    assert worker.run_once() == "queued"
+    db.expire_all()
+    assert job.attempts == 1
+    assert job.error == "RuntimeError: temporary"
+    assert job.run_at.replace(tzinfo=UTC) > datetime.now(UTC)
+    # Not due yet
+    assert worker.run_once() is None
+
+    db.execute(update(Job).where(Job.id == job.id).values(run_at=datetime.now(UTC)))
+    db.commit()
+    assert worker.run_once() == "succeeded"
+    db.expire_all()
+    assert job.attempts == 2
+    assert job.result == {"ok": True}
+    assert job.error is None
+
+def test_retry_delay_grows():
+    """Test exponential backoff with jitter"""
+    assert 5 <= retry_delay(1) <= 10
+    assert 40 <= retry_delay(4) <= 80
+
+def test_fails_after_max_attempts(db: Session, worker, monkeypatch):
+    """Test that a job is failed once it runs out of attempts"""
+    def broken(ctx):
+        raise ValueError("bad input")
+
+    monkeypatch.setitem(HANDLERS, "broken", broken)
+    job = enqueue(db, "broken", max_attempts=1)
+    assert worker.run_once() == "failed"
+    db.expire_all()
+    assert job.status == "failed"
+    assert job.finished_at is not None
+
+def test_cancel_queued_job(client, db: Session, test_user, auth_headers):
+    """Test that a queued job is cancelled immediately"""
+    job_id = client.post("/jobs/export", headers=auth_headers).json()["id"]
+    response = client.post(f"/jobs/{job_id}/cancel", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json()["status"] == "cancelled"
+    response = client.post(f"/jobs/{job_id}/cancel", headers=auth_headers)
+    assert response.status_code == 409
+
+def test_cancel_running_job(db: Session, worker, monkeypatch):
+    """Test that a running job stops at its next checkpoint"""
+    def steps(ctx):
+        for step in range(1, 4):
+            if step == 2:
+                # As if cancelled through the API meanwhile
+                cancel_job(ctx.db, ctx.job)
+            ctx.checkpoint(step)
+
+    monkeypatch.setitem(HANDLERS, "steps", steps)
+    job = enqueue(db, "steps")
+    assert worker.run_once() == "cancelled"
+    db.expire_all()
+    assert job.progress == 2
+
+def test_expired_lease_is_taken_over(db: Session, worker, monkeypatch):
+    """Test that the job of a worker that stopped reporting progress is run again"""
+    monkeypatch.setitem(HANDLERS, "noop", lambda ctx: None)
+    job = enqueue(db, "noop")
+    crashed = claim_job(db, "crashed-worker", lease_seconds=-1)
+    assert crashed.id == job.id
+
+    assert worker.run_once() == "succeeded"
+    db.expire_all()
+    assert job.attempts == 2
+
+def test_lease_lost_at_checkpoint(db: Session, monkeypatch):
+    """Test that a worker whose job was taken over stops without writing"""
+    monkeypatch.setitem(HANDLERS, "noop", lambda ctx: None)
+    enqueue(db, "noop")
+    job = claim_job(db, "slow-worker", lease_seconds=-1)
+    assert claim_job(db, "other-worker").id == job.id
+    with pytest.raises(LeaseLost):
+        JobContext(db, job, "slow-worker").checkpoint(1)
+
+def test_job_claimed_once(db: Session, monkeypatch):
+    """Test that a job leased by one worker is not handed to another"""
+    monkeypatch.setitem(HANDLERS, "noop", lambda ctx: None)
+    enqueue(db, "noop")
+    assert claim_job(db, "worker-1") is not None
+    assert claim_job(db, "worker-2") is None
+
+def test_jobs_of_other_users_hidden(client, db: Session, auth_headers):
+    """Test that jobs can only be seen by their user"""
+    other = User(email="other@example.com", username="otherjobs", hashed_password=get_password_hash("x"))
+    db.add(other)
+    db.commit()
+    job = enqueue(db, "export_bookmarks", user_id=other.id, payload={"format": "csv"})
+    assert client.get(f"/jobs/{job.id}", headers=auth_headers).status_code == 404
+    assert client.get("/jobs/", headers=auth_headers).json() == []
+
+def test_job_changes_published(client, db: Session, worker, test_user, auth_headers):
+    """Test that bookmarks imported and deleted by jobs reach the change event streams"""
+    data = b"".join(
+        json.dumps({"title": str(i), "url": f"https://example.com/{i}", "tags": ["t"]}).encode() + b"\n"
+        for i in range(2)
+    )
+    client.post("/jobs/import?format=ndjson", files={"file": ("b.ndjson", data)}, headers=auth_headers)
+    run_jobs(worker, db)
+    client.post("/jobs/delete-account", headers=auth_headers)
+    user_id = test_user.id
+    run_jobs(worker, db)
+
+    broker = bookmark_events.change_broker
+    events = broker.history(user_id, f"{broker._history.epoch}-0")
+    assert [(event.type, event.data.get("title"), event.data.get("tags")) for event in events[:2]] == [
+        ("bookmark.created", "0", ["t"]), ("bookmark.created", "1", ["t"])
+    ]
+    assert [(event.type, event.data) for event in events[2:]] == [
+        ("bookmark.deleted", {"id": events[0].data["id"]}), ("bookmark.deleted", {"id": events[1].data["id"]})
+    ]
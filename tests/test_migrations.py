@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.pool import StaticPool
+from app.database import Base
+from app.migrations import upgrade_schema
+
+pytestmark = pytest.mark.db
+
+# The tables as the first release created them
+LEGACY_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR, username VARCHAR,"
+    " hashed_password VARCHAR, is_active BOOLEAN)",
+    "CREATE TABLE bookmarks (id INTEGER PRIMARY KEY, title VARCHAR, description VARCHAR,"
+    " url VARCHAR, user_id INTEGER REFERENCES users (id))",
+    "INSERT INTO users (id, email, username, hashed_password, is_active) VALUES (1, 'a@example.com', 'a', 'x', 1)",
+    "INSERT INTO bookmarks (id, title, url, user_id) VALUES (1, 'A', 'https://example.com/', 1)",
+]
+
+@pytest.fixture
+def legacy_engine():
+    """A database created by the first release, upgraded the way the app starts"""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    with engine.begin() as conn:
+        for statement in LEGACY_SCHEMA:
+            conn.exec_driver_sql(statement)
+    Base.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+def test_upgrade_adds_missing_columns(legacy_engine):
+    """Test that columns added to existing tables are created, once"""
+    assert upgrade_schema(legacy_engine)
+    inspector = inspect(legacy_engine)
+    for table in ("users", "bookmarks"):
+        columns = {column["name"] for column in inspector.get_columns(table)}
+        assert set(Base.metadata.tables[table].c.keys()) <= columns
+    assert "ix_bookmarks_user_id_url_hash" in {index["name"] for index in inspector.get_indexes("bookmarks")}
+    assert upgrade_schema(legacy_engine) == []
+
+def test_upgrade_fills_existing_rows(legacy_engine):
+    """Test that existing users are no administrators after the upgrade"""
+    upgrade_schema(legacy_engine)
+    with legacy_engine.connect() as conn:
+        assert conn.execute(text("SELECT is_admin FROM users WHERE id = 1")).scalar() == 0
+
+def test_upgrade_fresh_database():
+    """Test that a database created by create_all needs no upgrade"""
+    engine = create_engine("sqlite://", poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    assert upgrade_schema(engine) == []
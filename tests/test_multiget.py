@@ -0,0 +1,150 @@
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.cache import bookmark_cache
+from app.models.user import User
+from app.schemas.bookmark import Bookmark, SparseBookmark
+from app.auth.security import get_password_hash, create_access_token
+
+pytestmark = pytest.mark.bookmarks
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for multi-get tests"""
+    user = User(
+        email="multiget@example.com",
+        username="multigetuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def bookmark_ids(client, auth_headers):
+    """Create a few bookmarks through the API"""
+    ids = []
+    for i in range(4):
+        response = client.post(
+            "/bookmarks/",
+            json={"title": f"Bookmark {i}", "url": f"https://example.com/{i}", "tags": ["even" if i % 2 == 0 else "odd"]},
+            headers=auth_headers
+        )
+        ids.append(response.json()["id"])
+    bookmark_cache.clear()
+    return ids
+
+@pytest.fixture
+def statements(db: Session):
+    """Record the SQL statements executed on the test connection"""
+    executed = []
+    connection = db.connection()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(connection, "before_cursor_execute", record)
+    yield executed
+    event.remove(connection, "before_cursor_execute", record)
+
+def bookmark_queries(statements):
+    return [s for s in statements if s.lstrip().startswith("SELECT") and "FROM bookmarks" in s]
+
+def test_multi_get_in_requested_order(client, auth_headers, bookmark_ids):
+    """Test fetching several bookmarks by id in one request"""
+    wanted = [bookmark_ids[2], bookmark_ids[0]]
+    response = client.get(f"/bookmarks/?ids={wanted[0]},{wanted[1]}", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert [bookmark["id"] for bookmark in data] == wanted
+    assert data[0]["title"] == "Bookmark 2"
+    assert data[0]["tags"] == ["even"]
+
+def test_multi_get_uses_one_query(client, auth_headers, bookmark_ids, statements):
+    """Test that all ids are resolved by a single bookmark query"""
+    client.get(f"/bookmarks/?ids={','.join(map(str, bookmark_ids))}", headers=auth_headers)
+    [query] = bookmark_queries(statements)
+    assert " IN " in query
+
+def test_multi_get_serves_cached_bookmarks(client, auth_headers, bookmark_ids, statements):
+    """Test that bookmarks in the cache are not queried again"""
+    client.get(f"/bookmarks/?ids={bookmark_ids[0]},{bookmark_ids[1]}", headers=auth_headers)
+    statements.clear()
+    response = client.get(f"/bookmarks/?ids={bookmark_ids[1]},{bookmark_ids[0]}", headers=auth_headers)
+    assert [bookmark["id"] for bookmark in response.json()] == [bookmark_ids[1], bookmark_ids[0]]
+    assert bookmark_queries(statements) == []
+
+def test_multi_get_skips_unknown_and_foreign_ids(client, db: Session, auth_headers, bookmark_ids):
+    """Test that ids of missing or other users' bookmarks are left out"""
+    other = User(email="othermulti@example.com", username="othermulti", hashed_password=get_password_hash("x"))
+    db.add(other)
+    db.commit()
+    other_headers = {"Authorization": f"Bearer {create_access_token(data={'sub': 'othermulti'})}"}
+    foreign = client.post("/bookmarks/", json={"title": "x", "url": "https://other.com/"}, headers=other_headers).json()["id"]
+
+    response = client.get(f"/bookmarks/?ids={bookmark_ids[0]},999999,{foreign}", headers=auth_headers)
+    assert [bookmark["id"] for bookmark in response.json()] == [bookmark_ids[0]]
+
+def test_multi_get_with_tag_filter(client, auth_headers, bookmark_ids):
+    """Test combining ids with a tag filter"""
+    response = client.get(f"/bookmarks/?ids={','.join(map(str, bookmark_ids))}&tag=odd", headers=auth_headers)
+    assert [bookmark["id"] for bookmark in response.json()] == [bookmark_ids[1], bookmark_ids[3]]
+
+def test_invalid_ids(client, auth_headers):
+    """Test that malformed or too many ids are rejected"""
+    assert client.get("/bookmarks/?ids=1,abc", headers=auth_headers).status_code == 422
+    too_many = ",".join(str(i) for i in range(501))
+    assert client.get(f"/bookmarks/?ids={too_many}", headers=auth_headers).status_code == 422
+
+def test_sparse_fields(client, auth_headers, bookmark_ids):
+    """Test that only the requested fields are returned"""
+    response = client.get("/bookmarks/?fields=id,url", headers=auth_headers)
+    assert response.status_code == 200
+    assert response.json() == [{"id": i, "url": f"https://example.com/{n}"} for n, i in enumerate(bookmark_ids)]
+
+def test_sparse_fields_narrow_select(client, auth_headers, bookmark_ids, statements):
+    """Test that unrequested columns are not selected"""
+    client.get("/bookmarks/?fields=url", headers=auth_headers)
+    [query] = bookmark_queries(statements)
+    assert "bookmarks.url" in query
+    assert "bookmarks.title" not in query
+    assert "bookmarks.description" not in query
+
+def test_sparse_fields_with_tags(client, auth_headers, bookmark_ids):
+    """Test that tags can be requested as a field"""
+    response = client.get("/bookmarks/?fields=title,tags&tag=even", headers=auth_headers)
+    assert response.json() == [
+        {"title": "Bookmark 0", "tags": ["even"]},
+        {"title": "Bookmark 2", "tags": ["even"]},
+    ]
+
+def test_sparse_fields_with_ids(client, auth_headers, bookmark_ids):
+    """Test combining a multi-get with sparse fields, including cached bookmarks"""
+    client.get(f"/bookmarks/{bookmark_ids[1]}", headers=auth_headers)
+    response = client.get(f"/bookmarks/?ids={bookmark_ids[1]},{bookmark_ids[0]}&fields=title", headers=auth_headers)
+    assert response.json() == [{"title": "Bookmark 1"}, {"title": "Bookmark 0"}]
+
+def test_unknown_field(client, auth_headers):
+    """Test that unknown fields are rejected"""
+    response = client.get("/bookmarks/?fields=id,password", headers=auth_headers)
+    assert response.status_code == 422
+
+def test_full_listing_unchanged(client, auth_headers, bookmark_ids):
+    """Test that bookmarks without fields= still carry every field"""
+    [first, *_] = client.get("/bookmarks/", headers=auth_headers).json()
+    assert set(first) == {
+        "id", "user_id", "title", "description", "url", "tags", "created_at",
+        "link_status", "final_url", "page_title", "checked_at",
+    }
+
+def test_sparse_schema_follows_bookmark():
+    """Test that every Bookmark field can be selected, and none is required"""
+    assert set(SparseBookmark.model_fields) == set(Bookmark.model_fields)
+    assert not any(field.is_required() for field in SparseBookmark.model_fields.values())
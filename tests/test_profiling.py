@@ -0,0 +1,175 @@
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.profiling import StackSampler, request_profiler, stack_sampler
+
+pytestmark = pytest.mark.profiling
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a regular test user"""
+    user = User(
+        email="profiling@example.com",
+        username="profilinguser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def admin_user(db: Session):
+    """Create an admin user"""
+    user = User(
+        email="admin@example.com",
+        username="adminuser",
+        hashed_password=get_password_hash("testpassword"),
+        is_admin=True
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for the regular user"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def admin_headers(admin_user):
+    """Create authentication headers for the admin"""
+    token = create_access_token(data={"sub": admin_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture(autouse=True)
+def reset_profiling():
+    """Restore the runtime profiling state after each test"""
+    interval = stack_sampler.interval
+    yield
+    stack_sampler.interval = interval
+    request_profiler.enabled = True
+    request_profiler.clear()
+    stack_sampler.stop()
+    stack_sampler.reset()
+
+def test_admin_routes_require_admin(client, auth_headers):
+    """Test that regular users cannot use the admin routes"""
+    assert client.get("/admin/profiling").status_code == 401
+    assert client.get("/admin/profiling", headers=auth_headers).status_code == 403
+
+def test_profile_request_with_header(client, admin_headers):
+    """Test that an admin can profile a request"""
+    response = client.get("/bookmarks/", headers={**admin_headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    profile_id = response.headers["X-Profile-Id"]
+
+    [summary] = client.get("/admin/profiles", headers=admin_headers).json()
+    assert summary["id"] == profile_id
+    assert summary["route"] == "GET /bookmarks/"
+
+    report = client.get(f"/admin/profiles/{profile_id}", headers=admin_headers)
+    assert report.status_code == 200
+    # The app's own frames show up among the top functions
+    assert "app/repository.py" in report.text
+    assert "get_user_by_username" in report.text
+    assert "cumulative" in report.text
+
+def test_profile_request_with_query_flag(client, admin_headers):
+    """Test that the query flag works like the header"""
+    response = client.get("/bookmarks/tags?profile=1", headers=admin_headers)
+    assert "X-Profile-Id" in response.headers
+
+def test_profile_flag_ignored_for_regular_users(client, auth_headers):
+    """Test that only admins get profiled"""
+    response = client.get("/bookmarks/", headers={**auth_headers, "X-Profile": "1"})
+    assert response.status_code == 200
+    assert "X-Profile-Id" not in response.headers
+    assert request_profiler.list() == []
+
+def test_unknown_profile(client, admin_headers):
+    """Test reading a profile that does not exist"""
+    assert client.get("/admin/profiles/missing", headers=admin_headers).status_code == 404
+
+def test_disable_on_demand_profiling(client, admin_headers):
+    """Test switching on-demand profiling off at runtime"""
+    response = client.put("/admin/profiling", json={"on_demand": False}, headers=admin_headers)
+    assert response.json()["on_demand"] is False
+    response = client.get("/bookmarks/", headers={**admin_headers, "X-Profile": "1"})
+    assert "X-Profile-Id" not in response.headers
+
+def test_toggle_sampler(client, admin_headers):
+    """Test starting and stopping the stack sampler at runtime"""
+    response = client.put(
+        "/admin/profiling", json={"sampler": True, "sampler_interval_ms": 5}, headers=admin_headers
+    )
+    assert response.json() == {"on_demand": True, "sampler": True, "sampler_interval_ms": 5}
+    assert stack_sampler.running
+    response = client.put("/admin/profiling", json={"sampler": False}, headers=admin_headers)
+    assert response.json()["sampler"] is False
+    assert not stack_sampler.running
+
+def test_sampler_attributes_stacks_to_routes():
+    """Test that samples taken inside an endpoint are counted for its route"""
+    inner = FastAPI()
+    sampler = StackSampler()
+
+    def busy_work():
+        sampler.sample_once()
+
+    @inner.get("/busy")
+    def busy():
+        busy_work()
+        return {"ok": True}
+
+    sampler.attach(inner)
+    TestClient(inner).get("/busy")
+
+    result = sampler.top()
+    assert result["routes"] == {"GET /busy": 1}
+    [top] = result["stacks"]
+    assert top["stack"][0] == "GET /busy"
+    assert top["stack"][1].endswith(":test_sampler_attributes_stacks_to_routes.<locals>.busy")
+    assert any(frame.endswith("busy_work") for frame in top["stack"])
+    assert sampler.folded().startswith("GET /busy;")
+
+def test_sampler_ignores_threads_outside_endpoints():
+    """Test that idle threads don't produce samples"""
+    sampler = StackSampler()
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait)
+    thread.start()
+    try:
+        sampler.sample_once()
+    finally:
+        stop.set()
+        thread.join()
+    assert sampler.samples == 1
+    assert sampler.stacks == {}
+
+def test_sampler_bounds_distinct_stacks():
+    """Test that new stacks are dropped once the limit is reached"""
+    inner = FastAPI()
+    sampler = StackSampler(max_stacks=1)
+
+    @inner.get("/a")
+    def a():
+        sampler.sample_once()
+
+    @inner.get("/b")
+    def b():
+        sampler.sample_once()
+
+    sampler.attach(inner)
+    client = TestClient(inner)
+    client.get("/a")
+    client.get("/b")
+    assert len(sampler.stacks) == 1
+    assert sampler.dropped == 1
@@ -0,0 +1,168 @@
+import time
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import TimeoutError as PoolTimeout
+from sqlalchemy.orm import Session
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app import dependencies, ratelimit
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.ratelimit import InMemoryRateLimitBackend, RateLimitBackend, RateLimiter
+from app.loadshed import AdaptiveConcurrencyLimiter, LoadSheddingMiddleware, load_shedder
+
+pytestmark = pytest.mark.ratelimit
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for rate limit tests"""
+    user = User(
+        email="ratelimit@example.com",
+        username="ratelimituser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def strict_limiter(monkeypatch):
+    """Allow a burst of two requests and practically no refill"""
+    limiter = RateLimiter(InMemoryRateLimitBackend(), per_minute=1, burst=2)
+    monkeypatch.setattr(ratelimit, "rate_limiter", limiter)
+    return limiter
+
+def test_token_bucket_refills():
+    """Test that a drained bucket refills at the configured rate"""
+    now = [0.0]
+    backend = InMemoryRateLimitBackend(clock=lambda: now[0])
+    assert backend.consume("k", rate=1.0, capacity=2) == 0.0
+    assert backend.consume("k", rate=1.0, capacity=2) == 0.0
+    assert backend.consume("k", rate=1.0, capacity=2) == pytest.approx(1.0)
+    now[0] = 1.0
+    assert backend.consume("k", rate=1.0, capacity=2) == 0.0
+
+def test_idle_buckets_evicted():
+    """Test that buckets which have refilled to capacity are dropped"""
+    now = [0.0]
+    backend = InMemoryRateLimitBackend(clock=lambda: now[0], sweep_interval=10.0)
+    backend.consume("idle", rate=1.0, capacity=2)
+    now[0] = 9.0
+    backend.consume("busy", rate=1.0, capacity=2)
+    backend.consume("busy", rate=1.0, capacity=2)
+    now[0] = 10.0
+    backend.consume("new", rate=1.0, capacity=2)
+    assert set(backend._buckets) == {"busy", "new"}
+
+def test_rate_limit_returns_429(client, auth_headers, strict_limiter):
+    """Test that requests beyond the burst are rejected with Retry-After"""
+    assert client.get("/bookmarks/", headers=auth_headers).status_code == 200
+    assert client.get("/bookmarks/", headers=auth_headers).status_code == 200
+    response = client.get("/bookmarks/", headers=auth_headers)
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+def test_rate_limit_is_per_user(client, db: Session, auth_headers, strict_limiter):
+    """Test that one user's requests do not use up another user's bucket"""
+    for _ in range(3):
+        client.get("/bookmarks/", headers=auth_headers)
+    other = User(email="other@example.com", username="otheruser", hashed_password="x")
+    db.add(other)
+    db.commit()
+    token = create_access_token(data={"sub": other.username})
+    response = client.get("/bookmarks/", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+
+def test_custom_backend_is_used(client, auth_headers, monkeypatch):
+    """Test that a shared backend stand-in can replace the in-process buckets"""
+    class DenyAllBackend(RateLimitBackend):
+        def __init__(self):
+            self.keys = []
+
+        def consume(self, key, rate, capacity):
+            self.keys.append(key)
+            return 5.0
+
+        def reset(self):
+            self.keys.clear()
+
+    backend = DenyAllBackend()
+    monkeypatch.setattr(ratelimit, "rate_limiter", RateLimiter(backend, per_minute=60, burst=1))
+    response = client.get("/bookmarks/", headers=auth_headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "5"
+    assert backend.keys and backend.keys[0].startswith("user:")
+
+def test_limiter_shrinks_and_recovers():
+    """Test that the concurrency limit backs off under DB pool pressure"""
+    limiter = AdaptiveConcurrencyLimiter(min_limit=2, max_limit=10, pool_wait_threshold=0.1, loop_lag_threshold=0.1)
+    for _ in range(20):
+        limiter.record_pool_wait(1.0)
+    assert limiter.overloaded
+    assert limiter.limit == 2
+    for _ in range(40):
+        limiter.record_pool_wait(0.0)
+    assert not limiter.overloaded
+    assert limiter.limit == 10
+
+def test_pool_timeout_recorded(monkeypatch):
+    """Test that a connection checkout that times out still feeds the limiter"""
+    class ExhaustedPoolSession:
+        def connection(self):
+            time.sleep(0.05)
+            raise PoolTimeout("QueuePool limit reached")
+
+        def close(self):
+            pass
+
+    limiter = AdaptiveConcurrencyLimiter(min_limit=2, max_limit=10, pool_wait_threshold=0.001)
+    monkeypatch.setattr(dependencies, "SessionLocal", ExhaustedPoolSession)
+    monkeypatch.setattr(dependencies, "load_shedder", limiter)
+    with pytest.raises(PoolTimeout):
+        next(dependencies.get_db())
+    assert limiter.pool_wait > 0
+    assert limiter.overloaded
+
+def test_load_shedding_returns_503():
+    """Test that requests beyond the concurrency limit get 503 with Retry-After"""
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=1, retry_after=3)
+    inner = FastAPI()
+
+    @inner.get("/")
+    async def index():
+        return {"ok": True}
+
+    shedding_client = TestClient(LoadSheddingMiddleware(inner, limiter))
+    assert shedding_client.get("/").status_code == 200
+    assert limiter.in_flight == 0
+
+    # Simulate a request that is still being served
+    limiter.in_flight = 1
+    response = shedding_client.get("/")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
+    assert limiter.shed_count == 1
+
+def test_load_metrics_admin_only(client, db: Session, test_user, auth_headers):
+    """Test that the limiter state is only reported to admins"""
+    assert client.get("/metrics/load", headers=auth_headers).status_code == 403
+    # test_user was detached by the request's principal lookup
+    db.execute(update(User).where(User.id == test_user.id).values(is_admin=True))
+    db.commit()
+    response = client.get("/metrics/load", headers=auth_headers)
+    assert response.status_code == 200
+    assert "in_flight" in response.json()
+
+def test_export_not_load_shed(client, auth_headers, monkeypatch):
+    """Test that streaming exports don't hold a concurrency slot"""
+    monkeypatch.setattr(load_shedder, "in_flight", load_shedder.limit)
+    assert client.get("/bookmarks/", headers=auth_headers).status_code == 503
+    assert client.get("/bookmarks/export", headers=auth_headers).status_code == 200
@@ -0,0 +1,59 @@
+import pytest
+from sqlalchemy.orm import Session
+from app import repository
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.auth.security import get_password_hash
+from app.tags import set_bookmark_tags
+
+pytestmark = pytest.mark.db
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for repository tests"""
+    user = User(
+        email="repository@example.com",
+        username="repositoryuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def bookmarks(db: Session, test_user):
+    """Three bookmarks of the test user, the first two tagged"""
+    items = [Bookmark(title=str(i), url=f"https://example.com/{i}", user_id=test_user.id) for i in range(3)]
+    db.add_all(items)
+    db.flush()
+    set_bookmark_tags(db, items[0], ["a", "b"])
+    set_bookmark_tags(db, items[1], ["a"])
+    db.commit()
+    return items
+
+def test_user_lookups(db: Session, test_user):
+    """Test finding users by username, email and id"""
+    assert repository.get_user_by_username(db, "repositoryuser") is test_user
+    assert repository.get_user_by_email(db, "repository@example.com") is test_user
+    assert repository.get_user(db, test_user.id) is test_user
+    assert repository.get_user_by_username(db, "missing") is None
+
+def test_get_bookmark_scoped_to_user(db: Session, test_user, bookmarks):
+    """Test that a bookmark is only found for its owner"""
+    assert repository.get_bookmark(db, bookmarks[1].id, test_user.id) is bookmarks[1]
+    assert repository.get_bookmark(db, bookmarks[1].id, test_user.id + 1) is None
+
+def test_list_bookmarks(db: Session, test_user, bookmarks):
+    """Test listing by user, ids and tags"""
+    ids = [bookmark.id for bookmark in bookmarks]
+    assert repository.list_bookmarks(db, test_user.id) == bookmarks
+    assert repository.list_bookmarks(db, test_user.id, ids=[ids[2], ids[0]]) == [bookmarks[0], bookmarks[2]]
+    assert repository.list_bookmarks(db, test_user.id, tags=["a", "b"]) == [bookmarks[0]]
+    assert repository.list_bookmarks(db, test_user.id, tags=["a", "b"], match_all=False) == bookmarks[:2]
+    assert repository.list_bookmarks(db, test_user.id + 1) == []
+
+def test_find_duplicate(db: Session, test_user, bookmarks):
+    """Test finding a bookmark by canonical URL, optionally excluding one"""
+    assert repository.find_duplicate(db, test_user.id, "https://EXAMPLE.com/1?utm_source=feed") is bookmarks[1]
+    assert repository.find_duplicate(db, test_user.id, "https://example.com/1", exclude_id=bookmarks[1].id) is None
@@ -0,0 +1,143 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+from app.api.bookmarks import list_bookmarks, get_bookmark
+from app.auth.deps import get_current_user
+from app.models.bookmark import Bookmark
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.schemas.bookmark import TagMode
+from app.singleflight import SingleFlight, reads
+
+pytestmark = pytest.mark.coalescing
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user with a bookmark"""
+    user = User(
+        email="flight@example.com",
+        username="flightuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.add(Bookmark(title="Shared", url="https://example.com/shared", user_id=user.id))
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_execution():
+    """Test that followers get the leader's result without running the function"""
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return {"value": 42}
+
+    tasks = [asyncio.create_task(flight.do("key", slow)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*tasks)
+
+    assert len(calls) == 1
+    assert all(result == {"value": 42} for result in results)
+    assert flight.stats()["leaders"] == 1
+    assert flight.stats()["followers"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_does_not_cancel_followers():
+    """Test that followers of a cancelled leader run the read themselves"""
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return len(calls)
+
+    leader = asyncio.create_task(flight.do("key", slow))
+    await asyncio.sleep(0.05)
+    followers = [asyncio.create_task(flight.do("key", slow)) for _ in range(2)]
+    await asyncio.sleep(0.05)
+    leader.cancel()
+    await asyncio.sleep(0.05)
+    release.set()
+
+    assert await asyncio.gather(*followers) == [2, 2]
+    assert leader.cancelled()
+    assert len(calls) == 2
+    assert flight.stats()["in_flight"] == 0
+
+@pytest.mark.asyncio
+async def test_different_keys_are_not_coalesced():
+    """Test that distinct reads run separately"""
+    flight = SingleFlight()
+    results = await asyncio.gather(flight.do("a", lambda: "a"), flight.do("b", lambda: "b"))
+    assert results == ["a", "b"]
+    assert flight.stats()["followers"] == 0
+
+@pytest.mark.asyncio
+async def test_exception_is_shared():
+    """Test that followers receive the leader's exception"""
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def failing():
+        release.wait(5)
+        raise ValueError("boom")
+
+    tasks = [asyncio.create_task(flight.do("key", failing)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    release.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+@pytest.mark.asyncio
+async def test_sequential_calls_are_not_cached():
+    """Test that a finished flight does not serve later calls"""
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert await flight.do("key", lambda: next(counter)) == 0
+    assert await flight.do("key", lambda: next(counter)) == 1
+
+@pytest.mark.asyncio
+async def test_list_bookmarks_coalesced(db: Session, test_user):
+    """Test that concurrent identical list requests share a query"""
+    before = reads.stats()
+    results = await asyncio.gather(*(
+        list_bookmarks(tag=None, tag_mode=TagMode.all, db=db, current_user=test_user)
+        for _ in range(3)
+    ))
+    after = reads.stats()
+    assert all(result == results[0] for result in results)
+    assert results[0][0]["title"] == "Shared"
+    assert after["leaders"] - before["leaders"] == 1
+    assert after["followers"] - before["followers"] == 2
+
+@pytest.mark.asyncio
+async def test_get_bookmark_not_found_coalesced(db: Session, test_user):
+    """Test that followers of a failed lookup also get 404"""
+    results = await asyncio.gather(
+        *(get_bookmark(bookmark_id=999999, db=db, current_user=test_user) for _ in range(2)),
+        return_exceptions=True
+    )
+    assert all(isinstance(result, HTTPException) and result.status_code == 404 for result in results)
+
+@pytest.mark.asyncio
+async def test_principal_lookup_coalesced(db: Session, test_user):
+    """Test that concurrent authentications of one user share a query"""
+    token = create_access_token(data={"sub": test_user.username})
+    before = reads.stats()
+    users = await asyncio.gather(*(get_current_user(token, db) for _ in range(4)))
+    after = reads.stats()
+    assert all(user.id == test_user.id for user in users)
+    assert after["followers"] - before["followers"] == 3
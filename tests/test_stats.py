@@ -0,0 +1,134 @@
+from datetime import datetime, UTC
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.models.stats import UserStats, DomainCount, ActivityBucket
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.stats import domain_of, get_stats, rebuild_stats
+
+pytestmark = pytest.mark.stats
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for statistics tests"""
+    user = User(
+        email="stats@example.com",
+        username="statsuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def bookmarks(client, auth_headers):
+    """Create bookmarks on a few domains through the API"""
+    ids = []
+    for url in [
+        "https://www.example.com/a",
+        "https://example.com/b",
+        "https://example.com/c",
+        "https://python.org/",
+    ]:
+        response = client.post("/bookmarks/", json={"title": url, "url": url}, headers=auth_headers)
+        assert response.status_code == 201
+        ids.append(response.json()["id"])
+    return ids
+
+def test_domain_of():
+    """Test that domains are grouped without www and case"""
+    assert domain_of("https://WWW.Example.com/path") == "example.com"
+    assert domain_of("http://sub.example.com:8080/") == "sub.example.com"
+    assert domain_of(None) == ""
+
+def test_stats_after_create(client, auth_headers, bookmarks):
+    """Test that creating bookmarks updates the statistics"""
+    response = client.get("/bookmarks/stats", headers=auth_headers)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 4
+    assert data["top_domains"] == [
+        {"domain": "example.com", "count": 3},
+        {"domain": "python.org", "count": 1},
+    ]
+    assert data["added_recently"] == 4
+    assert data["activity"] == [{"day": datetime.now(UTC).date().isoformat(), "count": 4}]
+
+def test_stats_top_limit(client, auth_headers, bookmarks):
+    """Test that the number of domains can be limited"""
+    response = client.get("/bookmarks/stats?top=1", headers=auth_headers)
+    assert [item["domain"] for item in response.json()["top_domains"]] == ["example.com"]
+
+def test_stats_after_url_change(client, auth_headers, bookmarks):
+    """Test that changing a URL moves the bookmark to the new domain"""
+    client.put(f"/bookmarks/{bookmarks[3]}", json={"url": "https://example.com/d"}, headers=auth_headers)
+    data = client.get("/bookmarks/stats", headers=auth_headers).json()
+    assert data["total"] == 4
+    assert data["top_domains"] == [{"domain": "example.com", "count": 4}]
+
+def test_stats_after_delete(client, auth_headers, bookmarks):
+    """Test that deleting bookmarks updates the statistics"""
+    for bookmark_id in bookmarks[2:]:
+        client.delete(f"/bookmarks/{bookmark_id}", headers=auth_headers)
+    data = client.get("/bookmarks/stats", headers=auth_headers).json()
+    assert data["total"] == 2
+    assert data["top_domains"] == [{"domain": "example.com", "count": 2}]
+    assert data["added_recently"] == 2
+
+def test_stats_empty(client, auth_headers):
+    """Test the statistics of a user without bookmarks"""
+    data = client.get("/bookmarks/stats", headers=auth_headers).json()
+    assert data == {"total": 0, "top_domains": [], "added_recently": 0, "activity": []}
+
+def test_stats_require_auth(client):
+    """Test that statistics require authentication"""
+    response = client.get("/bookmarks/stats")
+    assert response.status_code == 401
+
+def test_rebuild_matches_incremental(client, db: Session, test_user, auth_headers, bookmarks):
+    """Test that rebuilding from the bookmarks gives the maintained result"""
+    client.put(f"/bookmarks/{bookmarks[0]}", json={"url": "https://python.org/x"}, headers=auth_headers)
+    client.delete(f"/bookmarks/{bookmarks[1]}", headers=auth_headers)
+    incremental = get_stats(db, test_user.id)
+
+    assert rebuild_stats(db, user_id=test_user.id) == 1
+    assert get_stats(db, test_user.id) == incremental
+
+def test_rebuild_repairs_drift(db: Session, test_user, bookmarks):
+    """Test that a rebuild corrects aggregates that no longer match the bookmarks"""
+    db.get(UserStats, test_user.id).bookmark_count = 100
+    db.commit()
+    rebuild_stats(db)
+    assert get_stats(db, test_user.id)["total"] == 4
+
+def test_rebuild_commits_per_user(db: Session, test_user, bookmarks, monkeypatch):
+    """Test that a full rebuild writes each user in its own transaction"""
+    idle = User(email="idle-stats@example.com", username="idlestats", hashed_password="x")
+    db.add(idle)
+    db.flush()
+    db.add(UserStats(user_id=idle.id, bookmark_count=7))
+    db.commit()
+
+    commits = []
+    commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: (commits.append(1), commit()))
+    assert rebuild_stats(db, batch_size=1) == 2
+    assert len(commits) == 2
+    assert get_stats(db, test_user.id)["total"] == 4
+    assert db.get(UserStats, idle.id) is None
+
+def test_user_deletion_removes_stats(client, db: Session, test_user, bookmarks):
+    """Test that deleting a user removes their statistics"""
+    response = client.delete(f"/users/users/{test_user.id}")
+    assert response.status_code == 204
+    for model in (UserStats, DomainCount, ActivityBucket):
+        assert db.execute(select(model).where(model.user_id == test_user.id)).first() is None
@@ -0,0 +1,110 @@
+import pytest
+from sqlalchemy.orm import Session
+from app.models.tag import Tag, bookmark_tags
+from app.models.user import User
+from app.auth.security import get_password_hash, create_access_token
+from app.tags import normalize_tags
+
+pytestmark = pytest.mark.bookmarks
+
+@pytest.fixture
+def test_user(db: Session):
+    """Create a test user for tagging tests"""
+    user = User(
+        email="tags@example.com",
+        username="tagsuser",
+        hashed_password=get_password_hash("testpassword")
+    )
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    return user
+
+@pytest.fixture
+def auth_headers(test_user):
+    """Create authentication headers for test requests"""
+    token = create_access_token(data={"sub": test_user.username})
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def tagged_bookmarks(client, auth_headers):
+    """Create bookmarks with overlapping tags through the API"""
+    ids = {}
+    for title, tags in [("a", ["python", "web"]), ("b", ["python"]), ("c", ["Web ", "rust"])]:
+        response = client.post(
+            "/bookmarks/",
+            json={"title": title, "url": f"https://example.com/{title}", "tags": tags},
+            headers=auth_headers
+        )
+        assert response.status_code == 201
+        ids[title] = response.json()["id"]
+    return ids
+
+def tag_cloud(client, auth_headers):
+    response = client.get("/bookmarks/tags", headers=auth_headers)
+    assert response.status_code == 200
+    return {item["name"]: item["count"] for item in response.json()}
+
+def titles(response):
+    assert response.status_code == 200
+    return sorted(bookmark["title"] for bookmark in response.json())
+
+def test_normalize_tags():
+    """Test that tag names are normalized and deduplicated"""
+    assert normalize_tags([" Python ", "python", "Web  Dev", ""]) == ["python", "web dev"]
+
+def test_create_bookmark_with_tags(client, tagged_bookmarks, auth_headers):
+    """Test that tags are returned normalized and sorted"""
+    response = client.get(f"/bookmarks/{tagged_bookmarks['c']}", headers=auth_headers)
+    assert response.json()["tags"] == ["rust", "web"]
+
+def test_filter_by_all_tags(client, tagged_bookmarks, auth_headers):
+    """Test filtering bookmarks carrying all given tags"""
+    response = client.get("/bookmarks/?tag=python&tag=web", headers=auth_headers)
+    assert titles(response) == ["a"]
+
+def test_filter_by_any_tag(client, tagged_bookmarks, auth_headers):
+    """Test filtering bookmarks carrying any of the given tags"""
+    response = client.get("/bookmarks/?tag=python&tag=rust&tag_mode=any", headers=auth_headers)
+    assert titles(response) == ["a", "b", "c"]
+
+def test_filter_by_unknown_tag(client, tagged_bookmarks, auth_headers):
+    """Test that an unknown tag matches nothing"""
+    response = client.get("/bookmarks/?tag=unknown", headers=auth_headers)
+    assert titles(response) == []
+
+def test_tag_counts_follow_writes(client, tagged_bookmarks, auth_headers):
+    """Test that tag counts are maintained on create, update and delete"""
+    assert tag_cloud(client, auth_headers) == {"python": 2, "web": 2, "rust": 1}
+
+    response = client.put(
+        f"/bookmarks/{tagged_bookmarks['b']}",
+        json={"tags": ["rust", "cli"]},
+        headers=auth_headers
+    )
+    assert response.json()["tags"] == ["cli", "rust"]
+    assert tag_cloud(client, auth_headers) == {"python": 1, "web": 2, "rust": 2, "cli": 1}
+
+    client.delete(f"/bookmarks/{tagged_bookmarks['a']}", headers=auth_headers)
+    assert tag_cloud(client, auth_headers) == {"web": 1, "rust": 2, "cli": 1}
+
+def test_update_without_tags_keeps_them(client, tagged_bookmarks, auth_headers):
+    """Test that updating other fields leaves the tags alone"""
+    response = client.put(f"/bookmarks/{tagged_bookmarks['a']}", json={"title": "renamed"}, headers=auth_headers)
+    assert response.json()["tags"] == ["python", "web"]
+
+def test_tags_are_per_user(client, db: Session, tagged_bookmarks):
+    """Test that other users neither see nor filter by someone else's tags"""
+    other = User(email="other-tags@example.com", username="othertags", hashed_password="x")
+    db.add(other)
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': other.username})}"}
+    assert tag_cloud(client, headers) == {}
+    assert titles(client.get("/bookmarks/?tag=python", headers=headers)) == []
+
+def test_user_deletion_removes_tags(client, db: Session, test_user, tagged_bookmarks):
+    """Test that deleting a user removes their tags and associations"""
+    response = client.delete(f"/users/users/{test_user.id}")
+    assert response.status_code == 204
+    assert db.query(Tag).count() == 0
+    assert db.execute(bookmark_tags.select()).first() is None